@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+bench_orchestrator.py - Benchmarks of the cost of HEPscore orchestration itself
+
+Times the hot paths of hepscore that do not depend on the benchmark
+containers, through its public interface and the fake runtime: configuration
+loading and validation, container log capture, result processing over many
+runs, and summary output writing.  Each
+measurement is the best of several repeats.  Results are appended to a
+JSON-lines history file, and compared with the previous results of the same
+host, so that regressions are caught:
+
+    $ python benchmarks/bench_orchestrator.py --check
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from hepscore import __version__
+from hepscore.config import config_path, dump_yaml, read_yaml
+from hepscore.hepscore import HEPscore
+
+HISTORY = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                       'hepscore', 'bench_history.jsonl')
+
+
+def best_of(repeats, func, setup=None):
+    """Return the shortest time, in seconds, of repeats calls of func(setup())"""
+    times = []
+    for _ in range(repeats):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def fake_config(benchmarks=1, repetitions=3, args=None):
+    """Return a configuration using the fake runtime"""
+    return {'hepscore_benchmark':
+            {'benchmarks': {'bmk%d-bmk' % n: {'version': 'v1.0', 'ref_scores': {'sc': 10.0},
+                                              'args': dict(args or {})}
+                            for n in range(benchmarks)},
+             'settings': {'name': 'bench', 'reference_machine': 'none',
+                          'registry': 'oras://registry.example/hep-workloads',
+                          'method': 'geometric_mean', 'repetitions': repetitions,
+                          'container_exec': 'fake'}}}
+
+
+def bench_config(workdir, repeats):
+    """Load and validate the default configuration, uncached and cached"""
+    default = read_yaml(config_path + "/hepscore-default.yaml")
+    conffiles = []
+
+    def new_conffile():
+        # A configuration not seen before is neither parsed nor validated yet
+        config = copy.deepcopy(default)
+        config['hepscore_benchmark']['settings']['name'] = 'bench%d' % len(conffiles)
+        conffiles.append(workdir + '/bench%d.yaml' % len(conffiles))
+        with open(conffiles[-1], 'w') as yam:
+            yam.write(dump_yaml(config))
+        return conffiles[-1]
+
+    def load(conffile):
+        HEPscore(read_yaml(conffile), workdir)
+
+    cold = best_of(repeats, load, new_conffile)
+    return {'config_load_validate_s': cold,
+            'config_load_validate_cached_s': best_of(repeats, load, lambda: conffiles[-1])}
+
+
+def bench_log_capture(workdir, repeats, lines=200000):
+    """Run a benchmark streaming high-volume output to the logs"""
+    config = fake_config(repetitions=1, args={'lines': lines})
+
+    def setup():
+        return HEPscore(copy.deepcopy(config), tempfile.mkdtemp(dir=workdir))
+
+    seconds = best_of(repeats, lambda hs: hs.run(), setup)
+    return {'log_capture_s': seconds, 'log_capture_lines_per_s': lines / seconds}
+
+
+def bench_proc_results(workdir, repeats, runs=500):
+    """Resume a benchmark whose many runs are complete, processing their summaries"""
+    config = fake_config(repetitions=runs)
+    config['hepscore_benchmark']['options'] = {'resume': True}
+    summary = {'app': {}, 'run_info': {},
+               'report': {'wl-scores': {'sc': 12.5},
+                          'wl-stats': {'avg': 0.2, 'median': 0.2, 'min': 0.19, 'max': 0.21,
+                                       'count': 64}}}
+    for run in range(runs):
+        os.makedirs(workdir + '/bmk0-bmk/run%d' % run)
+        with open(workdir + '/bmk0-bmk/run%d/bmk0-bmk_summary.json' % run, 'w') as jfile:
+            json.dump(summary, jfile)
+
+    def setup():
+        return HEPscore(copy.deepcopy(config), workdir)
+
+    return {'proc_results_%d_runs_s' % runs: best_of(repeats, lambda hs: hs.run(), setup)}
+
+
+def bench_write_output(workdir, repeats, benchmarks=50, runs=20):
+    """Write the summary output of a large configuration"""
+    hs = HEPscore(fake_config(benchmarks, runs), workdir)
+    report = {'wl-scores': {'sc': 12.5}, 'log': ['line %d' % n for n in range(50)]}
+    for bench_conf in hs.confobj['benchmarks'].values():
+        for run in range(runs):
+            bench_conf['run%d' % run] = {'start_at': time.ctime(), 'end_at': time.ctime(),
+                                         'duration': 100, 'report': report}
+    hs.results = [1.0]
+
+    results = {}
+    for outtype in ('json', 'yaml'):
+        results['write_output_' + outtype + '_s'] = best_of(
+            repeats, lambda _: hs.write_output(outtype, workdir + '/out.' + outtype))
+    return results
+
+
+BENCHMARKS = (bench_config, bench_log_capture, bench_proc_results, bench_write_output)
+
+
+def git_commit():
+    """Return the current git commit of the source tree, or None"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+                              ).stdout.decode().strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, history, threshold):
+    """Return the timings at least threshold (fraction) slower than the recent median
+
+    Args:
+        results (dict): timings of this run
+        history (list[dict]): previous entries of the same host, oldest first
+        threshold (float): allowed relative slowdown
+
+    Returns:
+        list[str]: descriptions of the regressions
+    """
+    regressions = []
+    for key, val in results.items():
+        if not key.endswith('_s'):
+            continue
+        previous = sorted(entry['results'][key] for entry in history[-5:]
+                          if key in entry['results'])
+        if not previous:
+            continue
+        reference = previous[len(previous) // 2]
+        if val > reference * (1 + threshold):
+            regressions.append("%s: %.4fs, %.0f%% slower than %.4fs"
+                               % (key, val, (val / reference - 1) * 100, reference))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HEPscore orchestration overhead")
+    parser.add_argument("-r", "--repeats", type=int, default=5,
+                        help="repeats of each measurement, the best is kept (default 5).")
+    parser.add_argument("--history", default=HISTORY,
+                        help="JSON-lines file results are appended to (default %(default)s).")
+    parser.add_argument("--no-save", action='store_true',
+                        help="do not append the results to the history.")
+    parser.add_argument("--check", action='store_true',
+                        help="exit with status 1 if a timing regressed.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default 0.2).")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    results = {}
+    for bench in BENCHMARKS:
+        workdir = tempfile.mkdtemp(prefix='hepscore-bench-')
+        try:
+            results.update(bench(workdir, args.repeats))
+        finally:
+            shutil.rmtree(workdir)
+
+    for key, val in results.items():
+        print("%-32s %12.4f" % (key, val))
+
+    host = platform.node()
+    history = []
+    if os.path.isfile(args.history):
+        with open(args.history) as hfile:
+            history = [entry for entry in map(json.loads, hfile) if entry.get('host') == host]
+
+    regressions = compare(results, history, args.threshold)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+
+    if not args.no_save:
+        entry = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'host': host,
+                 'commit': git_commit(), 'hepscore_ver': __version__,
+                 'python': platform.python_version(), 'results': results}
+        if os.path.dirname(args.history):
+            os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        with open(args.history, 'a') as hfile:
+            hfile.write(json.dumps(entry) + '\n')
+
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
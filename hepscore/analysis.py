@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+analysis.py - Analysis of the runs of each benchmark
+
+Each run of a workload reports under 'wl-stats' the min, median, avg, max and
+count of the scores of its concurrent copies.  A wide spread of the copy
+scores of a run points to contention or throttling during that run, and a
+run score far from those of the other runs to a perturbed run: such runs are
+flagged.  The run scores of each workload are summarised by their median and
+a confidence interval estimated from their median absolute deviation (MAD),
+which a single bad run barely moves.
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import math
+from hepscore.scoring import median_tuple
+
+# Modified z-score (0.6745 * deviation / MAD) above which a run score is an outlier
+OUTLIER_Z = 3.5
+# Smallest MAD, relative to the median, used to find outliers: runs within a
+# few percent of the median are never outliers
+MIN_RELATIVE_MAD = 0.01
+# Confidence level of the intervals, and its two-sided normal quantile
+CONFIDENCE = 0.95
+_Z_CONFIDENCE = 1.96
+# Scale of the MAD estimating the standard deviation, for normal distributions
+_MAD_SIGMA = 1.4826
+# Standard error of the median, relative to that of the mean, for normal distributions
+_MEDIAN_SE = math.sqrt(math.pi / 2)
+# Copy spread above which a run is flagged as perturbed: the copy scores of the
+# unperturbed runs of some workloads, eg atlas-gen-bmk, spread by half their median
+COPY_SPREAD_THRESHOLD = 1.0
+# Name under which the CMS workloads report the statistics of their only sub-score
+THROUGHPUT_STATS = 'throughput_score'
+
+
+def copy_stats(stats):
+    """Return the copy statistics of the wl-stats of a run report, by sub-score
+
+    Workloads with a single sub-score report its statistics directly: they
+    are returned under the key None.
+
+    Args:
+        stats (dict): 'wl-stats' of a run report
+
+    Returns:
+        dict: statistics ('min', 'median', 'avg', 'max', 'count') by sub-score
+    """
+    if not isinstance(stats, dict):
+        return {}
+    if 'median' in stats:
+        return {None: stats}
+    return {sub_score: val for sub_score, val in stats.items()
+            if isinstance(val, dict) and 'median' in val}
+
+
+def score_stats(stats, sub_score):
+    """Return the copy statistics of sub_score in the wl-stats of a run report
+
+    Statistics reported directly, or as the THROUGHPUT_STATS, are those of
+    the only sub-score of the workload.
+
+    Args:
+        stats (dict): 'wl-stats' of a run report
+        sub_score (str): name of the sub-score
+
+    Returns:
+        dict: statistics ('min', 'median', 'avg', 'max', 'count'), or {} if not reported
+    """
+    sub_stats = copy_stats(stats)
+    for key in (sub_score, None, THROUGHPUT_STATS):
+        if key in sub_stats:
+            return sub_stats[key]
+    return {}
+
+
+def copy_spread(stats):
+    """Return the largest relative spread, (max - min) / median, of the copy scores of a run
+
+    Args:
+        stats (dict): 'wl-stats' of a run report
+
+    Returns:
+        float: the spread, or None if no statistics are reported
+    """
+    spreads = []
+    for sub_stats in copy_stats(stats).values():
+        try:
+            median = float(sub_stats['median'])
+            if median > 0:
+                spreads.append((float(sub_stats['max']) - float(sub_stats['min'])) / median)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return max(spreads) if spreads else None
+
+
+def median_abs_deviation(scores, median):
+    """Return the median absolute deviation of scores from their median"""
+    return median_tuple({i: abs(score - median) for i, score in enumerate(scores)})[0]
+
+
+def outliers(scores):
+    """Return the keys of the run scores that are outliers among scores
+
+    Args:
+        scores (dict): run scores, by run index
+
+    Returns:
+        list: run indexes of outliers; none with fewer than three runs
+    """
+    if len(scores) < 3:
+        return []
+    median = median_tuple(scores)[0]
+    mad = max(median_abs_deviation(scores.values(), median), MIN_RELATIVE_MAD * abs(median))
+    if mad == 0:
+        return []
+    return sorted(i for i, score in scores.items()
+                  if 0.6745 * abs(score - median) / mad > OUTLIER_Z)
+
+
+def robust_interval(scores):
+    """Return the median of run scores, and its confidence interval
+
+    The standard error of the median is estimated from the MAD of scores,
+    assuming normally distributed scores.
+
+    Args:
+        scores (dict): run scores, by run index
+
+    Returns:
+        dict: 'median', 'mad', and the 'interval' [low, high] at CONFIDENCE level,
+        None with fewer than two runs
+    """
+    median = median_tuple(scores)[0]
+    mad = median_abs_deviation(scores.values(), median)
+    interval = None
+    if len(scores) > 1:
+        half_width = _Z_CONFIDENCE * _MEDIAN_SE * _MAD_SIGMA * mad / math.sqrt(len(scores))
+        interval = [round(median - half_width, 4), round(median + half_width, 4)]
+    return {'median': round(median, 4), 'mad': round(mad, 4), 'interval': interval,
+            'confidence': CONFIDENCE}
+
+
+def analyse_runs(scores, stats, spread_threshold=COPY_SPREAD_THRESHOLD):
+    """Flag the perturbed runs of a benchmark
+
+    Args:
+        scores (dict): run scores, by run index
+        stats (dict): 'wl-stats' of the run reports, by run index
+        spread_threshold (float, optional): copy spread above which a run is flagged
+
+    Returns:
+        2-tuple (dict, dict): copy spread of each run reporting wl-stats, and the
+        list of reasons each flagged run is flagged for ('copy_spread' and/or
+        'outlier'), both by run index
+    """
+    spreads = {}
+    flagged = {}
+    for i in scores:
+        spread = copy_spread(stats.get(i))
+        if spread is None:
+            continue
+        spreads[i] = spread
+        if spread > spread_threshold:
+            flagged.setdefault(i, []).append('copy_spread')
+    for i in outliers(scores):
+        flagged.setdefault(i, []).append('outlier')
+    return spreads, flagged
+
+
+def reject_flagged(scores, flagged):
+    """Return the run scores of a benchmark left once its flagged runs are rejected
+
+    Args:
+        scores (dict): run scores, by run index
+        flagged (dict): reasons each flagged run is flagged for, by run index
+
+    Returns:
+        dict: run scores of the runs not flagged, by run index, or scores if
+        all runs are flagged
+    """
+    if len(flagged) >= len(scores):
+        return scores
+    return {i: score for i, score in scores.items() if i not in flagged}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+archive.py - Compression and archiving of benchmark results
+
+Run logs, the global log and the result files of benchmark runs are compressed
+with zstd when the zstandard module is installed, and with gzip otherwise.
+Compressed logs are appended to: both formats decompress concatenated frames
+as a whole, so that a resumed run can compress its logs into the same file.
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import gzip
+import os
+import shutil
+import tarfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Extension of compressed files
+EXTENSION = '.gz' if zstandard is None else '.zst'
+
+
+def _open(path, mode):
+    """Open path for compressed writing, in mode 'wb' or 'ab'"""
+    if zstandard is None:
+        return gzip.open(path, mode)
+    return zstandard.ZstdCompressor().stream_writer(open(path, mode))
+
+
+def compress_file(path):
+    """Compress the file at path, appending to path + EXTENSION, and remove it
+
+    Returns:
+        str: path of the compressed file
+    """
+    outpath = path + EXTENSION
+    with open(path, mode='rb') as infile, _open(outpath, 'ab') as outfile:
+        shutil.copyfileobj(infile, outfile, 2 ** 20)
+    os.remove(path)
+    return outpath
+
+
+def archive_dir(path, keep=()):
+    """Archive the contents of the directory at path into it, and remove them
+
+    The archive is named after the directory, e.g. run0/run0.tar.zst.
+
+    Args:
+        path (str): directory to archive
+        keep (list[str], optional): names of the entries of path left in place
+
+    Returns:
+        str: path of the archive, or None if there was nothing to archive
+    """
+    outpath = os.path.join(path, os.path.basename(path) + '.tar' + EXTENSION)
+    entries = sorted(entry for entry in os.listdir(path)
+                     if entry not in keep and os.path.join(path, entry) != outpath)
+    if not entries:
+        return None
+    with _open(outpath, 'wb') as outfile:
+        with tarfile.open(fileobj=outfile, mode='w|') as tar:
+            for entry in entries:
+                tar.add(os.path.join(path, entry), arcname=entry)
+    for entry in entries:
+        entry = os.path.join(path, entry)
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            shutil.rmtree(entry)
+        else:
+            os.remove(entry)
+    return outpath
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+campaign.py - Benchmark campaigns over many hosts, through a shared directory
+
+A coordinator creates a campaign directory, on a filesystem shared by the
+hosts, holding a queue of the configured benchmarks for each host:
+
+    DIR/campaign.json           configuration and hosts of the campaign
+    DIR/queue/HOST/pending/     benchmarks still to run on HOST
+    DIR/queue/HOST/running/     benchmarks claimed by a worker of HOST
+    DIR/results/HOST/           summaries of the benchmarks run on HOST
+    DIR/work/HOST/              result directories of the benchmarks
+    DIR/reports/HOST.json       HEPscore output aggregated for HOST
+
+A worker on each host claims the benchmarks queued for it one at a time, by
+renaming them into running/ (an atomic operation, so that each is claimed
+by a single worker), runs them with HEPscore, and writes back their summary.
+The coordinator then aggregates the summaries of each host into a HEPscore
+output, scored with HEPscore.gen_score().
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import copy
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import time
+from hepscore import __version__
+from hepscore.hepscore import HEPscore, config_hash, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_FILE = 'campaign.json'
+
+
+def task_name(index, benchmark):
+    """Return the queue entry name of the index-th benchmark, sorting in configuration order"""
+    return '%03d_%s' % (index, benchmark)
+
+
+def create(path, config, hosts):
+    """Create a campaign in directory path, queueing the benchmarks of config for hosts.
+
+    Args:
+        path (str): campaign directory, created if needed
+        config (dict): HEPscore configuration, with a 'hepscore_benchmark' key
+        hosts (list[str]): names of the hosts, as given to their workers
+
+    Returns:
+        Campaign: the new campaign
+
+    Raises:
+        ValueError: if path already holds a campaign, or a host name is invalid
+    """
+    if os.path.exists(os.path.join(path, CAMPAIGN_FILE)):
+        raise ValueError("A campaign already exists in " + path)
+    for host in hosts:
+        if re.match(r'^[a-zA-Z0-9\-_][a-zA-Z0-9\-_.]*$', host) is None:
+            raise ValueError("Invalid host name " + host)
+
+    # Validates the configuration, and drops the benchmarks commented out
+    confobj = HEPscore(copy.deepcopy(config), path).confobj
+
+    for host in hosts:
+        os.makedirs(os.path.join(path, 'queue', host, 'pending'), exist_ok=True)
+        os.makedirs(os.path.join(path, 'queue', host, 'running'), exist_ok=True)
+        os.makedirs(os.path.join(path, 'results', host), exist_ok=True)
+        for i, benchmark in enumerate(confobj['benchmarks']):
+            write_json_atomic(os.path.join(path, 'queue', host, 'pending',
+                                           task_name(i, benchmark) + '.json'),
+                              {'benchmark': benchmark, 'host': host})
+    write_json_atomic(os.path.join(path, CAMPAIGN_FILE),
+                      {'created_at': time.ctime(), 'hosts': list(hosts),
+                       'config': {'hepscore_benchmark': confobj}})
+    logger.info("Created campaign of %d benchmarks on %d hosts in %s",
+                len(confobj['benchmarks']), len(hosts), path)
+    return Campaign(path)
+
+
+class Campaign():
+    """Campaign directory, shared by the coordinator and the workers."""
+
+    def __init__(self, path):
+        """Open the campaign in directory path.
+
+        Args:
+            path (str): campaign directory
+
+        Raises:
+            OSError: if path does not hold a campaign
+        """
+        self.path = os.path.abspath(path)
+        with open(os.path.join(self.path, CAMPAIGN_FILE)) as cfile:
+            meta = json.load(cfile)
+        self.hosts = meta['hosts']
+        self.config = meta['config']
+
+    def _dir(self, *parts):
+        return os.path.join(self.path, *parts)
+
+    def tasks(self):
+        """Return the queue entry names of the benchmarks, in configuration order"""
+        return [task_name(i, benchmark) for i, benchmark
+                in enumerate(self.config['hepscore_benchmark']['benchmarks'])]
+
+    def claim(self, host):
+        """Claim the next benchmark queued for host.
+
+        Returns:
+            str: queue entry name of the benchmark, or None if none is pending
+        """
+        pending = self._dir('queue', host, 'pending')
+        for entry in sorted(os.listdir(pending)):
+            try:
+                os.rename(os.path.join(pending, entry),
+                          self._dir('queue', host, 'running', entry))
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+            return entry[:-len('.json')]
+        return None
+
+    def run_task(self, host, task):
+        """Run a benchmark claimed for host, and write back its summary.
+
+        Args:
+            host (str): host name
+            task (str): queue entry name of the benchmark
+
+        Returns:
+            float: benchmark score, or -1 on failure
+        """
+        benchmark = task.split('_', 1)[1]
+        config = copy.deepcopy(self.config)
+        confobj = config['hepscore_benchmark']
+        confobj['benchmarks'] = {benchmark: confobj['benchmarks'][benchmark]}
+
+        workdir = self._dir('work', host, task)
+        # Left over by a worker that did not complete the benchmark
+        if os.path.isdir(workdir):
+            shutil.rmtree(workdir)
+        os.makedirs(workdir)
+
+        result = {'benchmark': benchmark, 'host': host,
+                  'worker': platform.node() + ':' + str(os.getpid()),
+                  'resultsdir': workdir}
+        try:
+            hep_score = HEPscore(config, workdir)
+            hep_score.run()
+            score = hep_score.results[0] if hep_score.results else -1
+        except SystemExit as err:
+            # HEPscore exits on fatal errors: fail the benchmark, not the worker
+            logger.error("%s exited with status %s on %s", benchmark, err.code, host)
+            score = -1
+            result['error'] = "exit status %s" % err.code
+
+        # HEPscore reports into the configuration it was given
+        result.update({'score': score,
+                       'environment': confobj.get('environment', {}),
+                       'wl-scores': confobj.get('wl-scores', {}).get(benchmark),
+                       'conf': confobj['benchmarks'][benchmark]})
+        write_json_atomic(self._dir('results', host, task + '.json'), result)
+        os.remove(self._dir('queue', host, 'running', task + '.json'))
+        return score
+
+    def requeue(self, hosts=None):
+        """Return the benchmarks claimed by workers to the queue of their host.
+
+        For benchmarks left running by workers that died: it must not be used while
+        workers are still running them.
+
+        Args:
+            hosts (list[str], optional): hosts to requeue the benchmarks of (default all)
+
+        Returns:
+            int: number of benchmarks requeued
+        """
+        count = 0
+        for host in hosts or self.hosts:
+            running = self._dir('queue', host, 'running')
+            for entry in os.listdir(running):
+                os.rename(os.path.join(running, entry),
+                          self._dir('queue', host, 'pending', entry))
+                count += 1
+        return count
+
+    def status(self):
+        """Return the number of 'pending', 'running' and 'done' benchmarks of each host"""
+        status = {}
+        for host in self.hosts:
+            status[host] = {
+                'pending': len(os.listdir(self._dir('queue', host, 'pending'))),
+                'running': len(os.listdir(self._dir('queue', host, 'running'))),
+                'done': len([entry for entry in os.listdir(self._dir('results', host))
+                             if entry.endswith('.json')])}
+        return status
+
+    def host_report(self, host):
+        """Aggregate the benchmark summaries of host into a scored HEPscore output.
+
+        Args:
+            host (str): host name
+
+        Returns:
+            dict: HEPscore output, with status 'incomplete' and the 'missing'
+            benchmarks if some are still to run
+        """
+        hep_score = HEPscore(copy.deepcopy(self.config), self._dir('reports'))
+        confobj = hep_score.confobj
+        confobj['app_info'] = {'config_hash': config_hash(confobj),
+                               'hepscore_ver': __version__,
+                               'campaign': self.path, 'campaign_host': host}
+        confobj['wl-scores'] = {}
+
+        missing = []
+        for task in self.tasks():
+            benchmark = task.split('_', 1)[1]
+            try:
+                with open(self._dir('results', host, task + '.json')) as rfile:
+                    record = json.load(rfile)
+            except (OSError, ValueError):
+                missing.append(benchmark)
+                continue
+            # The worker's report of the benchmark, stripped as in the output of a
+            # local run, whose _proc_results() removes the ref_scores
+            bench_conf = record['conf']
+            bench_conf.pop('ref_scores', None)
+            confobj['benchmarks'][benchmark] = bench_conf
+            if 'environment' not in confobj:
+                confobj['environment'] = record['environment']
+            confobj['environment']['end_at'] = record['environment'].get('end_at')
+            hep_score.results.append(record['score'])
+            hep_score.weights.append(bench_conf.get('weight', 1.0))
+            if record['wl-scores'] is not None:
+                confobj['wl-scores'][benchmark] = record['wl-scores']
+            if record['score'] < 0 and 'error' not in confobj:
+                confobj['error'] = benchmark
+
+        if missing:
+            confobj['missing'] = missing
+            confobj['score'] = -1
+            confobj['status'] = 'incomplete'
+        elif 'error' in confobj:
+            confobj['score'] = -1
+            confobj['status'] = 'failed'
+        else:
+            hep_score.gen_score()
+        return confobj
+
+    def collect(self):
+        """Aggregate and score the results of each host, writing reports/HOST.json.
+
+        Returns:
+            dict: HEPscore output of each host
+        """
+        os.makedirs(self._dir('reports'), exist_ok=True)
+        reports = {}
+        for host in self.hosts:
+            reports[host] = self.host_report(host)
+            write_json_atomic(self._dir('reports', host + '.json'), reports[host])
+        return reports
+
+
+def work(path, host=None):
+    """Run the benchmarks queued for host in the campaign at path, until none are left.
+
+    Several workers may serve the same host; each benchmark is run by one of them.
+
+    Args:
+        path (str): campaign directory
+        host (str, optional): host name in the campaign (default: the node name)
+
+    Returns:
+        int: number of benchmarks run
+
+    Raises:
+        ValueError: if host is not part of the campaign
+    """
+    campaign = Campaign(path)
+    host = host or platform.node()
+    if host not in campaign.hosts:
+        raise ValueError("Host %s is not part of the campaign in %s" % (host, path))
+
+    count = 0
+    while True:
+        task = campaign.claim(host)
+        if task is None:
+            break
+        logger.info("Running %s for %s", task.split('_', 1)[1], host)
+        campaign.run_task(host, task)
+        count += 1
+    logger.info("No benchmarks left for %s: %d run by this worker", host, count)
+    return count
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+config.py - HEPscore configuration files
+
+Kept apart from the benchmark orchestration, so that listing and printing
+configurations does not import it.  The built-in configurations are
+described in an index, etc/index.json, so that they can be listed without
+parsing them: regenerate it with 'python -m hepscore.config' whenever they
+change.  Entries are checked against the SHA-256 digest of their file when
+read, and stale or missing ones are computed from the file instead.
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import sys
+import yaml
+
+logger = logging.getLogger(__name__)
+
+config_path = '/'.join(os.path.split(__file__)[:-1]) + "/etc"
+INDEX = config_path + '/index.json'
+
+# Rough needs of a workload, after those of HEPscore23, which runs 7 workloads
+# 3 times: ~20 GB of image cache, and 320 MB of output per core
+IMAGE_CACHE_GB = 20.0 / 7
+OUTPUT_MB_PER_CORE_RUN = 320.0 / 21
+
+# libyaml-based loader and dumper, when PyYAML is built with them
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+SafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# Parsed configuration files, by SHA-256 digest of their contents
+_parsed_confs = {}
+# Metadata of the built-in configurations, by name
+_conf_index = None
+
+
+def list_named_confs():
+    """Return list of available built-in configurations
+
+    Returns:
+        list (strings): built-in configuration names
+    """
+    return([cf[:-5] for cf in os.listdir(config_path) if cf.endswith('.yaml')])
+
+
+def named_conf(name):
+    """Given a built-in configuraton name, return full path
+
+    Args:
+        name (string): configuration name
+
+    Returns:
+            string: full path of name
+    """
+    return(config_path + '/' + name + '.yaml')
+
+
+def config_hash(confobj):
+    """Return the SHA-256 hex digest of a configuration, ignoring its 'options'"""
+    conf_hash = hashlib.sha256()
+    hashable_conf = {k: v for k, v in confobj.items() if k not in 'options'}
+    conf_hash.update(json.dumps(hashable_conf, sort_keys=True).encode('utf-8'))
+    return conf_hash.hexdigest()
+
+
+def read_yaml(file):
+    """Read a YAML file into a dict
+
+    Files are parsed once per process: reading a file with the same contents
+    again returns a copy of the data parsed first.
+
+    Args:
+        file (string): path to YAML file
+
+    Returns:
+            dict: YAML data
+    """
+    # Read config yaml
+    try:
+        with open(file, 'rb') as yam:
+            data = yam.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in _parsed_confs:
+            _parsed_confs[digest] = yaml.load(data, Loader=SafeLoader)
+        active_config = copy.deepcopy(_parsed_confs[digest])
+    except OSError as err:
+        logger.error("Cannot read YAML configuration file %s", file)
+        logger.error(err)
+        sys.exit(1)
+    except yaml.YAMLError as exc:
+        logger.error("Failed to parse config YAML.")
+        if hasattr(exc, 'problem_mark'):
+            logger.error("Error at line: %s column: %s",
+                         exc.problem_mark.line+1,
+                         exc.problem_mark.column+1)
+        sys.exit(1)
+
+    return(active_config)
+
+
+def dump_yaml(obj):
+    """Return obj as a YAML document, keeping the order of its keys"""
+    return yaml.dump(obj, Dumper=SafeDumper, sort_keys=False)
+
+
+def conf_metadata(path):
+    """Return the index entry of a configuration file
+
+    Needs are estimated from those of HEPscore23: image cache space (none for
+    dir:// registries), output space per core, and the cores needed to run
+    a copy of each workload, from their 'threads' args.
+
+    Args:
+        path (str): path to the configuration file
+
+    Returns:
+        dict: 'name', 'file_hash', 'config_hash' (as recorded in the outputs of
+        runs without overrides), 'settings_name', 'registry', 'arch' (None if
+        not restricted), 'workloads' (their versions, by name), 'repetitions'
+        and 'needs'
+    """
+    with open(path, 'rb') as yam:
+        data = yam.read()
+    confobj = yaml.load(data, Loader=SafeLoader)['hepscore_benchmark']
+    confobj['benchmarks'] = {bmk: bmk_conf for bmk, bmk_conf in confobj['benchmarks'].items()
+                             if bmk[0] != '.'}
+    settings = confobj['settings']
+    benchmarks = confobj['benchmarks']
+    runs = settings.get('max_repetitions', settings['repetitions'])
+
+    image_cache = IMAGE_CACHE_GB * len(benchmarks)
+    if settings['registry'].startswith('dir://'):
+        image_cache = 0.0
+    cores = max([int(bmk_conf.get('args', {}).get('threads', 1))
+                 for bmk_conf in benchmarks.values()] or [1])
+    return {'name': os.path.basename(path)[:-len('.yaml')],
+            'file_hash': hashlib.sha256(data).hexdigest(),
+            'config_hash': config_hash(confobj),
+            'settings_name': settings['name'],
+            'registry': settings['registry'],
+            'arch': settings.get('arch'),
+            'workloads': {bmk: bmk_conf['version'] for bmk, bmk_conf in benchmarks.items()},
+            'repetitions': runs,
+            'needs': {'cores': cores, 'image_cache_gb': round(image_cache, 1),
+                      'output_mb_per_core': round(OUTPUT_MB_PER_CORE_RUN * runs
+                                                  * len(benchmarks))}}
+
+
+def build_index():
+    """Return the index of the built-in configurations: their metadata, by name"""
+    return {name: conf_metadata(named_conf(name)) for name in sorted(list_named_confs())}
+
+
+def conf_index(arch=None):
+    """Return the metadata of the built-in configurations, by name
+
+    Entries of the index are used if the digest of their file still matches.
+
+    Args:
+        arch (str, optional): only return the configurations supporting this
+                              architecture, eg 'aarch64'
+
+    Returns:
+        dict: conf_metadata() of each configuration, by name
+    """
+    global _conf_index  # pylint: disable=global-statement
+    if _conf_index is None:
+        try:
+            with open(INDEX, mode='r') as ifile:
+                index = json.load(ifile)
+        except (OSError, ValueError):
+            logger.debug("No valid configuration index at %s", INDEX)
+            index = {}
+
+        _conf_index = {}
+        for name in sorted(list_named_confs()):
+            path = named_conf(name)
+            entry = index.get(name)
+            try:
+                with open(path, 'rb') as yam:
+                    if entry is None or \
+                            entry['file_hash'] != hashlib.sha256(yam.read()).hexdigest():
+                        logger.debug("Index entry of %s is stale", name)
+                        entry = conf_metadata(path)
+            except (OSError, KeyError, TypeError, yaml.YAMLError) as err:
+                logger.warning("Skipping invalid built-in configuration %s: %s", name, err)
+                continue
+            _conf_index[name] = entry
+
+    return {name: entry for name, entry in _conf_index.items()
+            if arch is None or entry['arch'] is None or arch in entry['arch']}
+
+
+def write_index(path=INDEX):
+    """Write the index of the built-in configurations to path"""
+    with open(path, mode='w') as ifile:
+        json.dump(build_index(), ifile, indent=2)
+        ifile.write('\n')
+
+
+if __name__ == '__main__':
+    write_index()
+    print("Wrote " + INDEX)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+events.py - JSON-lines log of the progress of HEPscore runs
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import json
+import time
+
+
+class EventLog():
+    """HEPscore hook appending each event it is called with to a JSON-lines file.
+
+    Each line is a JSON object holding the 'time' of the event (seconds since
+    the epoch), its 'event' name and its info.  Lines are written as events
+    happen, so that the file can be followed while benchmarks run, eg with
+    'tail -f'.  'phase_start' events are not logged: the 'phase_end' events
+    hold the phase durations.
+    """
+
+    skip = ('phase_start',)
+
+    def __init__(self, path):
+        """Open the event log at path, appending to it if it exists.
+
+        Raises:
+            OSError: if the file cannot be opened
+        """
+        self.path = path
+        # Line buffered, so that each event is written as a single line
+        self._file = open(path, mode='a', buffering=1)
+
+    def __call__(self, event, info):
+        if event in self.skip or self._file.closed:
+            return
+        record = {'time': round(time.time(), 3), 'event': event}
+        record.update(info)
+        self._file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+def read_events(path):
+    """Return the events of a JSON-lines event log, skipping a partly written last line"""
+    events = []
+    with open(path) as efile:
+        for line in efile:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
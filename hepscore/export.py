@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+export.py - Columnar export of the runs of many HEPscore results
+
+One record is exported per run and sub-score of each workload, with its
+host, score and statistics, for analysis across a fleet.  Records are
+written as Parquet or Arrow IPC files when pyarrow is installed; Arrow IPC
+files are uncompressed, so that they can be memory-mapped.  CSV is written
+otherwise.
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import csv
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from hepscore.analysis import score_stats
+from hepscore.store import find_outputs, is_hepscore_output, result_record
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Exported columns, and their types
+COLUMNS = [('path', str), ('host', str), ('cpu_model', str), ('config_hash', str),
+           ('hepscore_ver', str), ('start_at', str), ('workload', str), ('run', int),
+           ('sub_score', str), ('score', float), ('reference', float),
+           ('stats_min', float), ('stats_median', float), ('stats_avg', float),
+           ('stats_max', float), ('stats_count', int), ('duration', float)]
+
+# Formats, by file name extension
+FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.csv': 'csv'}
+
+
+def _count(val):
+    """Return the copy count val as an int, or None if it is not a number"""
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return None
+
+
+def run_records(obj, path=None):
+    """Yield a record for each run and sub-score of each workload of a HEPscore output
+
+    The duration of a run is its monotonic 'container_start' and 'run' phase
+    time when recorded, and its whole-second 'duration' otherwise.
+
+    Args:
+        obj (dict): HEPscore output
+        path (str, optional): path of the output, recorded in each record
+
+    Yields:
+        tuple: values of COLUMNS
+    """
+    result = result_record(obj)
+    context = (path, result['host'], result['cpu_model'], result['config_hash'],
+               result['hepscore_ver'], result['start_at'])
+    for workload, bench_conf in obj['benchmarks'].items():
+        if not isinstance(bench_conf, dict):
+            continue
+        ref_scores = dict(bench_conf.get('ref_scores', {}))
+        for sub_score, val in obj.get('wl-scores', {}).get(workload, {}).items():
+            if sub_score.endswith('_ref'):
+                ref_scores.setdefault(sub_score[:-len('_ref')], val)
+        for runstr, run in bench_conf.items():
+            if re.match(r'^run[0-9]+$', runstr) is None or 'report' not in run:
+                continue
+            scores = run['report'].get('wl-scores', {})
+            stats = run['report'].get('wl-stats', {})
+            phases = run.get('phases', {})
+            if 'run' in phases:
+                duration = phases['run'] + phases.get('container_start', 0.0)
+            else:
+                duration = run.get('duration')
+            for sub_score, score in scores.items():
+                sub_stats = score_stats(stats, sub_score)
+                yield context + (workload, int(runstr[3:]), sub_score, score,
+                                 ref_scores.get(sub_score), sub_stats.get('min'),
+                                 sub_stats.get('median'), sub_stats.get('avg'),
+                                 sub_stats.get('max'), _count(sub_stats.get('count')),
+                                 duration)
+
+
+def output_records(path):
+    """Return the run records of the HEPscore output at path, or [] if it is not one"""
+    try:
+        with open(path) as jfile:
+            obj = json.load(jfile)
+    except (OSError, ValueError) as err:
+        logger.warning("Skipping %s: %s", path, err)
+        return []
+    if not is_hepscore_output(obj):
+        return []
+    return list(run_records(obj, path))
+
+
+def collect(paths, jobs=None):
+    """Collect the run records of the HEPscore outputs under paths, as columns
+
+    Outputs are parsed by a pool of jobs processes.
+
+    Args:
+        paths (list[str]): output files, or directories to search
+        jobs (int, optional): number of processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict: list of values of each of COLUMNS, by name
+    """
+    outputs = sorted(find_outputs(paths))
+    columns = {name: [] for name, _ in COLUMNS}
+    if not outputs:
+        return columns
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunksize = max(1, len(outputs) // (4 * (jobs or os.cpu_count() or 1)))
+        for records in pool.map(output_records, outputs, chunksize=chunksize):
+            for record in records:
+                for (name, _), val in zip(COLUMNS, record):
+                    columns[name].append(val)
+    return columns
+
+
+def arrow_table(columns):
+    """Return columns as a pyarrow Table, with the types of COLUMNS"""
+    types = {str: pyarrow.string(), int: pyarrow.int64(), float: pyarrow.float64()}
+    return pyarrow.table([pyarrow.array(columns[name], type=types[ctype])
+                          for name, ctype in COLUMNS],
+                         names=[name for name, _ in COLUMNS])
+
+
+def write_csv(columns, outfile):
+    """Write columns to outfile as CSV, with a header"""
+    with open(outfile, mode='w', newline='') as cfile:
+        writer = csv.writer(cfile)
+        writer.writerow([name for name, _ in COLUMNS])
+        writer.writerows(zip(*(columns[name] for name, _ in COLUMNS)))
+
+
+def write(columns, outfile, fmt=None):
+    """Write columns to outfile, as Parquet, Arrow IPC or CSV
+
+    Without pyarrow, CSV is written instead of Parquet or Arrow IPC, to
+    outfile with its extension replaced by .csv.
+
+    Args:
+        columns (dict): columns returned by collect()
+        outfile (str): path of the file to write
+        fmt (str, optional): 'parquet', 'arrow' or 'csv'. Defaults to the format
+                             of the extension of outfile, or 'csv'.
+
+    Returns:
+        str: path of the file written
+    """
+    if fmt is None:
+        fmt = FORMATS.get(os.path.splitext(outfile)[1].lower(), 'csv')
+    if fmt != 'csv' and pyarrow is None:
+        outfile = os.path.splitext(outfile)[0] + '.csv'
+        logger.warning("pyarrow is not installed: writing CSV to %s instead of %s",
+                       outfile, fmt)
+        fmt = 'csv'
+
+    if fmt == 'parquet':
+        pyarrow.parquet.write_table(arrow_table(columns), outfile)
+    elif fmt == 'arrow':
+        table = arrow_table(columns)
+        with pyarrow.OSFile(outfile, 'wb') as sink:
+            with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        write_csv(columns, outfile)
+    return outfile
+
+
+def export(paths, outfile, fmt=None, jobs=None):
+    """Export the run records of the HEPscore outputs under paths to outfile
+
+    Returns:
+        2-tuple (str path of the file written, int number of records)
+    """
+    columns = collect(paths, jobs)
+    return write(columns, outfile, fmt), len(columns['path'])
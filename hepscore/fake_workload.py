@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+fake_workload.py - Stand-in for a benchmark container, run by the 'fake' runtime
+
+Writes a benchmark summary JSON without doing any work, so that HEPscore
+orchestration (scheduling, retries, log capture, result processing) can be
+exercised and timed on hosts without a container engine.  Its behaviour is
+set with benchmark 'args', eg:
+
+    atlas-gen-bmk:
+      version: v2.1
+      ref_scores:
+        gen: 100
+      args:
+        delay: 5
+        score: 120
+        lines: 1000
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+
+def parse_cpuset(cpuset):
+    """Return the CPU ids of a cpuset list, eg "0-3,8\""""
+    cpus = set()
+    for part in cpuset.split(','):
+        lo, _, hi = part.partition('-')
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="HEPscore fake benchmark workload")
+    parser.add_argument("IMAGE", help="benchmark image name, eg registry/atlas-gen-bmk:v2.1")
+    parser.add_argument("--resultsdir", required=True, help="directory to write results to.")
+    parser.add_argument("--summary", required=True, help="summary JSON file name.")
+    parser.add_argument("--ref-scores", default='{}',
+                        help="JSON reference scores: one sub-score is reported for each.")
+    parser.add_argument("--cpus", help="cpuset to run on.")
+    parser.add_argument("--delay", type=float, default=0,
+                        help="seconds to run for (default 0).")
+    parser.add_argument("--score", type=float, default=100,
+                        help="sub-scores, as a percentage of the reference scores (default 100).")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="random variation of the scores of each run, in percent "
+                             "(default 0).")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="number of workload copies reported (default 1).")
+    parser.add_argument("--lines", type=int, default=0,
+                        help="lines of output to print (default 0).")
+    parser.add_argument("--exit-code", type=int, default=0,
+                        help="exit status; no summary is written unless 0 (default 0).")
+    # Options passed to all benchmarks, eg -W and --mop
+    return parser.parse_known_args(args)[0]
+
+
+def main(args=None):
+    args = parse_args(sys.argv[1:] if args is None else args)
+
+    if args.cpus:
+        os.sched_setaffinity(0, parse_cpuset(args.cpus))
+
+    for line in range(args.lines):
+        print("fake workload output line " + str(line))
+    time.sleep(args.delay)
+    if args.exit_code != 0:
+        print("fake workload failed", file=sys.stderr)
+        return args.exit_code
+
+    scores = {}
+    stats = {}
+    for sub_bmk, ref in json.loads(args.ref_scores).items():
+        factor = args.score / 100.0 * (1 + random.uniform(-1, 1) * args.jitter / 100.0)
+        copies = [ref * factor / args.copies] * args.copies
+        scores[sub_bmk] = round(sum(copies), 4)
+        stats[sub_bmk] = {'avg': copies[0], 'median': copies[0], 'min': copies[0],
+                          'max': copies[0], 'count': args.copies}
+    if len(stats) == 1:
+        stats = list(stats.values())[0]
+
+    summary = {'app': {'containment': 'fake', 'description': 'HEPscore fake workload',
+                       'version': args.IMAGE.rsplit(':', 1)[-1]},
+               'run_info': {'copies': args.copies, 'threads_per_copy': 1,
+                            'events_per_thread': 1},
+               'report': {'wl-scores': scores, 'wl-stats': stats}}
+    with open(os.path.join(args.resultsdir, args.summary), mode='w') as jfile:
+        json.dump(summary, jfile)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,131 +8,208 @@ the top-level directory of this distribution.
 """
 
 
+import collections
+import asyncio
+import contextlib
 import glob
-import hashlib
 import json
 import logging
 import math
 import multiprocessing
-import operator
 import os
 import re
 import shutil
-import stat
 import subprocess
 import sys
+import tarfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 from hepscore import __version__
+from hepscore.analysis import (COPY_SPREAD_THRESHOLD, analyse_runs, reject_flagged,
+                               robust_interval)
+from hepscore.archive import archive_dir, compress_file
+# Configuration files, also provided here for compatibility
+from hepscore.config import (config_hash, config_path, dump_yaml,  # noqa: F401
+                             list_named_confs, named_conf, read_yaml)
+from hepscore.events import EventLog
+from hepscore.planner import (disk_shortfalls, estimate, order_longest_first, peak_needs,
+                              run_history)
+from hepscore.resultcache import RESULT_CACHE, ResultCache, cache_key
+from hepscore.runtime import RUNTIMES, cpuset_string
+from hepscore.scoring import median_tuple, weighted_geometric_mean
+from hepscore.telemetry import TelemetrySampler, read_memory
 
 logger = logging.getLogger(__name__)
 
-config_path = '/'.join(os.path.split(__file__)[:-1]) + "/etc"
+# Lines of container output displayed when a run fails
+LOG_TAIL_LINES = 10
+# Longest line of container output captured
+STREAM_LIMIT = 2 ** 20
 
-def list_named_confs():
-    """Return list of available built-in configurations
-
-    Returns:
-        list (strings): built-in configuration names
-    """
-    return([cf[:-5] for cf in os.listdir(config_path) if cf.endswith('.yaml')])
+# Digests (see config_hash) of the configurations that passed validate_conf
+_valid_confs = set()
 
 
-def named_conf(name):
-    """Given a built-in configuraton name, return full path
+def read_summary(path, scorekey='wl-scores'):
+    """Read a benchmark summary JSON, checking it contains the required keys
 
     Args:
-        name (string): configuration name
+        path (str): path to the summary JSON
+        scorekey (str): key of the scores in the summary report
 
     Returns:
-            string: full path of name
+        dict: summary data, or None if unreadable or incomplete
     """
-    return(config_path + '/' + name + '.yaml')
-
-
-def read_yaml(file):
-    """Read a YAML file into a dict
+    try:
+        with open(path, mode='r') as jfile:
+            jscore = json.load(jfile)
+    except OSError:
+        logger.error("Failure reading from %s", path)
+        return None
+    except json.JSONDecodeError as loc:
+        logger.error("Malformed JSON: %s", loc.msg)
+        return None
+
+    json_required_keys = ['app', 'run_info', 'report']
+    key_issue = False
+    for k in json_required_keys:
+        kstr = k
+        if k not in jscore.keys():
+            key_issue = True
+        elif k == 'report':
+            if (not isinstance(jscore[k], dict)) or scorekey not in jscore[k].keys():
+                key_issue = True
+                kstr = k + '[' + scorekey + ']'
+        if key_issue:
+            logger.error("Required key '%s' not in JSON!", kstr)
+
+    if key_issue:
+        return None
+
+    return jscore
+
+
+def write_json_atomic(path, obj):
+    """Write obj as JSON to path, replacing any previous file atomically
+
+    Raises:
+        OSError: if the file cannot be written
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, mode='w') as jfile:
+        json.dump(obj, jfile)
+    os.replace(tmp_path, path)
 
-    Args:
-        file (string): path to YAML file
 
-    Returns:
-            dict: YAML data
-    """
-    # Read config yaml
+def cpu_model():
+    """Return the CPU model name reported in /proc/cpuinfo, or None"""
     try:
-        with open(file, 'r') as yam:
-            active_config = yaml.safe_load(yam)
-    except OSError as err:
-        logger.error("Cannot read YAML configuration file %s", file)
-        logger.error(err)
-        sys.exit(1)
-    except yaml.YAMLError as exc:
-        logger.error("Failed to parse config YAML.")
-        if hasattr(exc, 'problem_mark'):
-            logger.error("Error at line: %s column: %s",
-                         exc.problem_mark.line+1,
-                         exc.problem_mark.column+1)
-        sys.exit(1)
-
-    return(active_config)
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return None
 
 
-def median_tuple(vals):
-    """Return median of vals
+def repetition_bounds(settings):
+    """Return the minimum and maximum number of runs of each benchmark.
 
     Args:
-        vals (dict): A dict of benchmark scores
+        settings (dict): 'settings' section of the configuration
 
     Returns:
-        2-tuple (result final, result run): [description]
+        3-tuple (int, int, float): minimum and maximum runs, and the relative
+        spread of run scores below which no further runs are needed
     """
-    sorted_vals = sorted(vals.items(), key=operator.itemgetter(1))
+    runs = int(settings['repetitions'])
+    return (int(settings.get('min_repetitions', runs)),
+            int(settings.get('max_repetitions', runs)),
+            float(settings.get('spread_threshold', 0.02)))
 
-    med_ind = int(len(sorted_vals) / 2)
-    if len(sorted_vals) % 2 == 1:
-        return sorted_vals[med_ind][::-1]
-    val1 = sorted_vals[med_ind - 1][1]
-    val2 = sorted_vals[med_ind][1]
-    return ((val1 + val2) / 2.0), (sorted_vals[med_ind - 1][0], sorted_vals[med_ind][0])
 
-
-def weighted_geometric_mean(vals, weights=None):
-    """Return geometric mean of floats, with optional weighting
+def run_score(scores, ref_scores):
+    """Return the score of a benchmark run: the geometric mean of its sub-scores,
+    relative to their reference scores
 
     Args:
-        vals (list[float]): List of float(scores)
-        weights (list[float], optional): [description]. Defaults to None.
+        scores (dict): sub-scores reported by the run
+        ref_scores (dict): reference score of each sub-score
 
     Returns:
-        float: the weighted geometric mean
+        float: the run score
+
+    Raises:
+        KeyError: If a sub-score in ref_scores is not reported
     """
+    sub_results = []
+    for sub_bmk in ref_scores.keys():
+        if sub_bmk not in scores:
+            raise KeyError(sub_bmk)
+        sub_results.append(round(float(scores[sub_bmk]) / ref_scores[sub_bmk], 4))
 
-    if weights is None:
-        weights = []
-        for i in vals:
-            weights.append(1.0)
+    return round(weighted_geometric_mean(sub_results), 4)
 
-    if len(vals) != len(weights):
-        return 0
 
-    # Ensure we're dealing with floats
-    vals = [float(x) for x in vals]
-    weights = [float(x) for x in weights]
+def available_cpus():
+    """Return the CPUs this process is allowed to run on
 
-    total_weight = sum(weights)
-    if total_weight == 0:
-        return 0
+    Returns:
+        list (int): sorted CPU ids
+    """
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(multiprocessing.cpu_count()))
 
-    weighted_vals = [vals[i] ** weights[i] for i in range(len(vals))]
 
-    total_val = 1
-    for val in weighted_vals:
-        total_val *= val
+def partition_cpus(cpus, nparts):
+    """Split a list of CPUs into disjoint, contiguous sets
 
-    weighted_gmean = total_val ** (1.0 / total_weight)
+    Args:
+        cpus (list[int]): CPU ids to partition
+        nparts (int): number of sets requested
 
-    return weighted_gmean
+    Returns:
+        list (list[int]): at most nparts non-empty CPU sets
+    """
+    nparts = max(1, min(nparts, len(cpus)))
+    size, extra = divmod(len(cpus), nparts)
+    parts = []
+    start = 0
+    for i in range(nparts):
+        end = start + size + (1 if i < extra else 0)
+        parts.append(cpus[start:end])
+        start = end
+    return parts
+
+
+def cancel_tasks(loop):
+    """Cancel all pending tasks of an asyncio event loop"""
+    if hasattr(asyncio, 'all_tasks'):
+        tasks = asyncio.all_tasks(loop)
+    else:
+        tasks = asyncio.Task.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+
+
+async def terminate_process(proc, grace=10):
+    """Terminate an asyncio subprocess, killing it if still running after grace seconds"""
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), grace)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        logger.warning("Process %d did not terminate - killing it", proc.pid)
+        proc.kill()
+        await proc.wait()
 
 
 class HEPscore():
@@ -145,14 +222,37 @@ class HEPscore():
     clean_files = False
     userns = False
     addarch = False
+    resume = False
+    parallelism = 1
+    prefetch = True
+    log_flush_interval = 1.0
+    telemetry = False
+    telemetry_interval = 10.0
+    incremental_output = False
+    result_cache = False
+    result_cache_ttl = 86400.0
+    result_cache_dir = RESULT_CACHE
+    copy_spread_threshold = COPY_SPREAD_THRESHOLD
+    reject_flagged_runs = False
+    preflight = 'warn'
+    compress_logs = False
+    archive_results = False
 
     scache = ""
     unpack = ""
     registry = ""
     confobj = {}
-    results = []
-    weights = []
     score = -1
+    _pulls = None
+    _puller = None
+    _cleanups = None
+    _cleaner = None
+    _loop = None
+    _cancelled = False
+    runtime = None
+    _events = None
+    _cache = None
+    _order = None
 
     def __init__(self, config, resultsdir):
         """HEPSCORE: a HEP benchmark SCORE generator.
@@ -172,10 +272,15 @@ class HEPscore():
         self.resultsdir = os.path.abspath(resultsdir)
         self.confobj = config['hepscore_benchmark']
         self.settings = self.confobj['settings']
+        self.results = []
+        self.weights = []
+        self.history = []
+        self.phases = {}
+        self._hooks = []
+        self._progress = {}
 
         if 'container_exec' in self.settings:
-            if self.settings['container_exec'] in (
-                    "singularity", "docker"):
+            if self.settings['container_exec'] in RUNTIMES:
                 self.cec = self.settings['container_exec']
             else:
                 logger.error("%s not understood. Stopping", self.settings['container_exec'])
@@ -184,23 +289,99 @@ class HEPscore():
             logger.warning("Container not specified on commandline or in config - assuming %s",
                            self.cec)
 
-        if 'addarch' in self.settings:
-            self.addarch = self.settings['addarch']
+        for setting in ('addarch', 'parallelism', 'prefetch', 'log_flush_interval',
+                        'telemetry', 'telemetry_interval', 'incremental_output',
+                        'result_cache', 'result_cache_ttl', 'preflight', 'compress_logs',
+                        'archive_results', 'copy_spread_threshold', 'reject_flagged_runs'):
+            if setting in self.settings:
+                setattr(self, setting, self.settings[setting])
+
+        if 'result_cache_dir' in self.settings:
+            self.result_cache_dir = os.path.expanduser(self.settings['result_cache_dir'])
+
+        if 'history' in self.settings:
+            self.history = [os.path.expanduser(path) for path in self.settings['history']]
 
         if 'clean' in self.confobj.get('options', {}):
             self.clean = self.confobj['options']['clean']
-            if self.cec == 'singularity':
-                # Set absolute path location for scache
-                self.scache = os.path.abspath(self.resultsdir + '/scache')
         if 'clean_files' in self.confobj.get('options', {}):
             self.clean_files = self.confobj['options']['clean_files']
 
         if 'userns' in self.confobj.get('options', {}):
             self.userns = self.confobj['options']['userns']
 
+        if 'resume' in self.confobj.get('options', {}):
+            self.resume = self.confobj['options']['resume']
+
+        self.runtime = RUNTIMES[self.cec](userns=self.userns)
+        if self.clean and self.runtime.family == 'singularity':
+            # Set absolute path location for scache
+            self.scache = os.path.abspath(self.resultsdir + '/scache')
+
         self.confobj.pop('options', None)
-        self.validate_conf()
-        self.registry = self._gen_reg_path()
+        with self._phase('config'):
+            self.validate_conf()
+            self.registry = self._gen_reg_path()
+
+        if self.result_cache:
+            self._cache = ResultCache(self.result_cache_dir, float(self.result_cache_ttl))
+
+    def add_hook(self, hook):
+        """Register a callback notified of the orchestration phases and progress.
+
+        hook(event, info) is called with event 'phase_start' and 'phase_end' around
+        each timed phase: 'config', 'engine_probe', 'preflight', 'image_fetch',
+        'container_start', 'run', 'results_parse', 'cleanup' and 'output_write'.
+        info holds the 'phase', and the 'benchmark' and 'run' it belongs to (or
+        None); on 'phase_end' also its 'elapsed' time in seconds.  The 'cleanup'
+        of each benchmark runs in the background: it is only notified with
+        'phase_end', once all benchmarks are done.  Progress is notified with
+        the 'start', 'benchmark_start', 'run_end', 'retry', 'benchmark_end',
+        'end', 'score' and 'output' events.  Exceptions raised by hooks are logged and ignored.
+
+        Args:
+            hook (callable): callback taking the event name and info dict
+        """
+        self._hooks.append(hook)
+
+    def _emit(self, event, **info):
+        """Call the registered hooks with event and info"""
+        for hook in self._hooks:
+            try:
+                hook(event, info)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Hook %s failed on %s", hook, event)
+
+    @contextlib.contextmanager
+    def _phase(self, phase, benchmark=None, run=None):
+        """Time the enclosed block on the monotonic clock, as phase of benchmark run"""
+        self._emit('phase_start', phase=phase, benchmark=benchmark, run=run)
+        starttime = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(phase, time.monotonic() - starttime, benchmark, run)
+
+    def record_phase(self, phase, elapsed, benchmark=None, run=None):
+        """Record elapsed seconds spent in phase, and notify the hooks.
+
+        Times are summed per phase: over the whole execution under 'phases' in
+        'app_info', and under 'phases' of the benchmark, or of its run.
+
+        Args:
+            phase (str): phase name
+            elapsed (float): seconds spent in the phase
+            benchmark (str, optional): benchmark the phase belongs to
+            run (int, optional): run of benchmark the phase belongs to
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+        if benchmark is not None:
+            target = self.confobj['benchmarks'][benchmark]
+            if run is not None:
+                target = target.setdefault('run' + str(run), {})
+            phases = target.setdefault('phases', {})
+            phases[phase] = round(phases.get(phase, 0.0) + elapsed, 6)
+        self._emit('phase_end', phase=phase, benchmark=benchmark, run=run, elapsed=elapsed)
 
     def _gen_reg_path(self, reg_url=None):
         uri = None
@@ -224,54 +405,86 @@ class HEPscore():
             logger.error("Invalid URI specification in registry path: %s", reg_url)
             sys.exit(1)
 
-        if self.cec == 'docker' and uri != 'docker':
-            logger.error("Only docker registry URI (docker://) supported for Docker runs.")
+        if uri not in self.runtime.registry_uris:
+            logger.error("Only %s registry URIs supported for %s runs.",
+                         ', '.join(u + '://' for u in self.runtime.registry_uris), self.cec)
             sys.exit(1)
-        return reg_path if (self.cec == 'docker' or uri == 'dir') else reg_url
+        return self.runtime.registry(uri, reg_url, reg_path)
 
-    def _proc_results(self, benchmark):
-
-        results = {}
+    def _summary_name(self, benchmark):
+        """Return the file name of the summary JSON of each run of benchmark"""
         bench_conf = self.confobj['benchmarks'][benchmark]
-        runs = int(self.confobj['settings']['repetitions'])
-
         if 'results_file' in bench_conf:
-            benchmark_summary = bench_conf['results_file']
-        else:
-            benchmark_summary = benchmark + '_summary.json'
+            return bench_conf['results_file']
+        return benchmark + '_summary.json'
 
-        gpaths = sorted(glob.glob(self.resultsdir + "/" + benchmark + "/run*/" + benchmark_summary))
+    def _run_summaries(self, benchmark):
+        """Return the summary JSON paths of the runs of benchmark, by run index"""
+        gpaths = glob.glob(self.resultsdir + "/" + benchmark + "/run*/" +
+                           self._summary_name(benchmark))
         logger.debug("Looking for results in %s", gpaths)
-        i = -1
+        # Index runs by their directory: failed runs leave no summary behind
+        run_paths = {}
         for gpath in gpaths:
-            i += 1
-            logger.debug("Opening file %s", gpath)
+            rundir = os.path.basename(os.path.dirname(gpath))
+            if re.match(r'^run[0-9]+$', rundir) is not None:
+                run_paths[int(rundir[3:])] = gpath
+        return run_paths
 
-            try:
-                with open(gpath, mode='r') as jfile:
-                    lines = jfile.read()
-                    jscore = json.loads(lines)
-            except OSError:
-                logger.error("Failure reading from %s", gpath)
-                continue
-            except json.JSONDecodeError as loc:
-                logger.error("Malformed JSON: %s", loc.msg)
-                continue
+    def _repetition_bounds(self):
+        return repetition_bounds(self.confobj['settings'])
+
+    def _score_run(self, benchmark, jscore, runstr):
+        """Return the score of a run of benchmark, from its summary
+
+        Args:
+            benchmark (str): benchmark name
+            jscore (dict): run summary, as returned by read_summary()
+            runstr (str): run name, for error messages
+
+        Returns:
+            float: run score, or None if a sub-score is missing
+        """
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        try:
+            return run_score(jscore['report'][self.scorekey], bench_conf['ref_scores'])
+        except KeyError as sub_bmk:
+            logger.error("Sub-score not reported for %s in %s!", sub_bmk.args[0], runstr)
+            return None
+
+    def _score_spread(self, benchmark):
+        """Return the relative spread, (max - min) / median, of the run scores of benchmark
+
+        Returns:
+            float: the spread, or None with fewer than two valid runs
+        """
+        scores = {}
+        for i, gpath in self._run_summaries(benchmark).items():
+            jscore = read_summary(gpath, self.scorekey)
+            if jscore is not None:
+                score = self._score_run(benchmark, jscore, 'run' + str(i))
+                if score is not None:
+                    scores[i] = score
+
+        if len(scores) < 2:
+            return None
+        median = median_tuple(scores)[0]
+        if median <= 0:
+            return None
+        return (max(scores.values()) - min(scores.values())) / median
+
+    def _proc_results(self, benchmark):
+
+        results = {}
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        min_runs, max_runs, _ = self._repetition_bounds()
 
-            json_required_keys = ['app', 'run_info', 'report']
-            key_issue = False
-            for k in json_required_keys:
-                kstr = k
-                if k not in jscore.keys():
-                    key_issue = True
-                elif k == 'report':
-                    if (not isinstance(jscore[k], dict)) or self.scorekey not in jscore[k].keys():
-                        key_issue = True
-                        kstr = k + '[' + self.scorekey + ']'
-                if key_issue:
-                    logger.error("Required key '%s' not in JSON!", kstr)
-
-            if key_issue:
+        first_run = True
+        for i, gpath in sorted(self._run_summaries(benchmark).items()):
+            logger.debug("Opening file %s", gpath)
+
+            jscore = read_summary(gpath, self.scorekey)
+            if jscore is None:
                 continue
 
             runstr = 'run' + str(i)
@@ -279,38 +492,31 @@ class HEPscore():
                 bench_conf[runstr] = {}
             bench_conf[runstr]['report'] = jscore['report']
 
-            if i == 0:
+            if first_run:
                 bench_conf['app'] = jscore['app']
                 bench_conf['run_info'] = jscore['run_info']
+                first_run = False
 
-            sub_results = []
-            for sub_bmk in bench_conf['ref_scores'].keys():
-                if sub_bmk not in jscore['report'][self.scorekey]:
-                    logger.error("Sub-score not reported for %s in %s!",
-                                 sub_bmk, runstr)
-                    key_issue = True
-                    continue
-                sub_score = float(jscore['report'][self.scorekey][sub_bmk])
-                sub_score = sub_score / bench_conf['ref_scores'][sub_bmk]
-                sub_score = round(sub_score, 4)
-                sub_results.append(sub_score)
-
-            if key_issue:
+            score = self._score_run(benchmark, jscore, runstr)
+            if score is None:
                 continue
 
-            score = weighted_geometric_mean(sub_results)
-
-            results[i] = round(score, 4)
+            results[i] = score
             logger.debug(results[i])
 
         if len(results) == 0:
             logger.warning("No results: fail")
             return -1
 
-        if len(results) != runs:
-            logger.error("Expected %d scores, got %d!", runs, len(results))
+        if not min_runs <= len(results) <= max_runs:
+            if min_runs == max_runs:
+                logger.error("Expected %d scores, got %d!", min_runs, len(results))
+            else:
+                logger.error("Expected %d to %d scores, got %d!", min_runs, max_runs,
+                             len(results))
             return -1
 
+        results = self._analyse_runs(benchmark, results)
         final_result, final_run = median_tuple(results)
 
         # Insert wl-score from chosen run
@@ -341,134 +547,314 @@ class HEPscore():
 
         return final_result
 
-    def _container_rm(self, image):
+    def _analyse_runs(self, benchmark, results):
+        """Flag the perturbed runs of benchmark, recording its 'analysis' in the report
+
+        Runs are flagged for the spread of their copy scores ('copy_spread'), or
+        for a score far from those of the other runs ('outlier').  With the
+        reject_flagged_runs setting, flagged runs are left out of the score,
+        unless all runs are flagged.
+
+        Args:
+            benchmark (str): benchmark name
+            results (dict): run scores, by run index
+
+        Returns:
+            dict: run scores to compute the benchmark score from, by run index
+        """
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        stats = {i: bench_conf['run' + str(i)]['report'].get('wl-stats') for i in results}
+        spreads, flagged = analyse_runs(results, stats, float(self.copy_spread_threshold))
+        for i, reasons in sorted(flagged.items()):
+            logger.warning("%s run%d flagged: %s", benchmark, i, ', '.join(reasons))
+
+        rejected = []
+        if self.reject_flagged_runs and flagged:
+            kept = reject_flagged(results, flagged)
+            if kept is results:
+                logger.warning("All %s runs flagged: none rejected", benchmark)
+            else:
+                rejected = sorted(flagged)
+                results = kept
+                logger.warning("Rejected %s runs %s", benchmark, rejected)
+
+        analysis = robust_interval(results)
+        analysis['copy_spread'] = {'run' + str(i): round(spread, 4)
+                                   for i, spread in sorted(spreads.items())}
+        analysis['flagged'] = {'run' + str(i): reasons for i, reasons in sorted(flagged.items())}
+        analysis['rejected'] = ['run' + str(i) for i in rejected]
+        bench_conf['analysis'] = analysis
+        if analysis['interval'] is not None:
+            logger.info("%s median run score %s, %d%% confidence interval %s", benchmark,
+                        analysis['median'], round(analysis['confidence'] * 100),
+                        analysis['interval'])
+        return results
+
+    def _container_rm(self, image, benchmark):
         if self.clean is False:
             return False
 
+        command = self.runtime.rm_command(image)
         try:
-            if self.cec == 'docker':
-                logger.info("Deleting Docker image %s", image)
-                command = "docker rmi -f " + image
+            if command is not None:
+                logger.info("Deleting %s image %s", self.cec, image)
                 logger.debug(command)
-                command = command.split(' ')
                 ret = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
                 ret.wait()
-            elif self.cec == 'singularity' and self.scache != "":
-                if os.path.abspath(self.scache) != '/' and \
-                        self.scache.endswith("/scache") and \
-                        self.scache.find(self.resultsdir) == 0:
-                    logger.debug("Removing temporary singularity cache %s", self.scache)
-                    shutil.rmtree(self.scache)
-                else:
-                    logger.error("Invalid cache path specified - skipping cleanup")
-                    return False
-        except subprocess.SubprocessError:
-            logger.error("Failed to clean docker images!")
+            elif self.runtime.family == 'singularity' and self.scache != "":
+                return self._scache_rm(self.scache + '/' + benchmark)
+        except (subprocess.SubprocessError, OSError):
+            logger.error("Failed to clean %s images!", self.cec)
             return False
-        except shutil.Error:
-            logger.error("Failed to cleanup singularity cache at %s", self.scache)
+
+        return True
+
+    def _scache_rm(self, path):
+        if os.path.abspath(self.scache) != '/' and \
+                self.scache.endswith("/scache") and \
+                self.scache.find(self.resultsdir) == 0 and \
+                self.scache in (path, os.path.dirname(path)):
+            logger.debug("Removing temporary singularity cache %s", path)
+            try:
+                shutil.rmtree(path)
+            except (shutil.Error, OSError):
+                logger.error("Failed to cleanup singularity cache at %s", path)
+                return False
+        else:
+            logger.error("Invalid cache path specified - skipping cleanup")
             return False
 
         return True
 
-    def check_userns(self):
-        """Checks for user namespace support for Singularity.
+    def _finish_files(self, image, benchmark, mock):
+        """Remove the image of benchmark, and compress or archive the files of its runs.
 
-        Returns:
-            bool: singularity namespace support
+        With 'archive_results', the files of each run but its summary JSON are
+        archived in its directory; otherwise, with 'compress_logs', the
+        container logs of each run are compressed.
         """
-        proc_muns = "/proc/sys/user/max_user_namespaces"
-        dockerenv = "/.dockerenv"
-        podmanenv = "/run/.containerenv"
+        self._container_rm(image, benchmark)
+        if mock or not (self.archive_results or self.compress_logs):
+            return
 
-        if os.path.isfile(dockerenv) or os.path.isfile(podmanenv):
-            logger.debug("%s running inside of Docker. Not enabling user namespaces.",
-                         self.__class__)
-            return False
+        summary = self._summary_name(benchmark)
+        for rundir in sorted(glob.glob(self.resultsdir + "/" + benchmark + "/run*")):
+            try:
+                if self.archive_results:
+                    archive_dir(rundir, keep=[summary])
+                else:
+                    for log in glob.glob(rundir + "/*_logs"):
+                        compress_file(log)
+            except (OSError, tarfile.TarError) as err:
+                logger.error("Failed to compress the results in %s: %s", rundir, err)
 
+    def _compress_log(self, log):
+        """Compress the global log, once all benchmarks are done writing to it"""
         try:
-            with open(proc_muns, mode='r') as userns_file:
-                max_usrns = int(userns_file.read())
-            return bool(max_usrns)
-        except OSError:
-            logger.debug("Cannot open/read from %s, assuming user namespace support disabled",
-                         proc_muns)
-            return False
+            compress_file(log)
+        except OSError as err:
+            logger.error("Failed to compress %s: %s", log, err)
 
-    def _get_usernamespace_flag(self):
-        """User namespace flag needed to support nested singularity."""
-        if self.cec == "singularity" and self.userns is True:
-            if self.check_userns():
-                logger.debug("System supports user namespaces, enabling in singularity call")
-                return "-u "
-        return ""
+    def _in_background(self, benchmark, func, *args):
+        """Run func(*args) in the background, as the 'cleanup' phase of benchmark
 
-    def check_unsquash(self):
-        """Check if --unsquash is supported"""
-        if self.cec != "docker" and 'apptainer_version' in self.confobj['environment']:
-            hcmd = "singularity run --help".split()
-            hout = subprocess.Popen(hcmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            for line in hout.stdout.readlines():
-                if '--unsquash' in line.decode('utf-8'):
-                    return True
+        Cleanups run in a pool of threads, at the lowest scheduling priority where
+        threads have their own (Linux), so that they barely slow down the
+        benchmarks running meanwhile.
+        """
+        def task():
+            native_id = getattr(threading, 'get_native_id', None)
+            if native_id is not None and hasattr(os, 'setpriority'):
+                try:
+                    os.setpriority(os.PRIO_PROCESS, native_id(), 19)
+                except OSError:
+                    pass
+            starttime = time.monotonic()
+            func(*args)
+            return time.monotonic() - starttime
+
+        if self._cleaner is None:
+            self._cleanups = []
+            self._cleaner = ThreadPoolExecutor(max_workers=2)
+        self._cleanups.append((benchmark, self._cleaner.submit(task)))
+
+    def _join_background(self):
+        """Wait for the background cleanups, and record the time they took"""
+        if self._cleaner is None:
+            return
+        for benchmark, future in self._cleanups:
+            self.record_phase('cleanup', future.result(), benchmark)
+        self._cleaner.shutdown(wait=True)
+        self._cleanups = self._cleaner = None
 
-            return False
+    def check_userns(self):
+        """Checks for user namespace support for Singularity.
 
-    def _get_unsquash_flag(self):
-        """If we're running in apptainer that supports it, pass --unsquash"""
-        if self.check_userns() and self.check_unsquash():
-            logger.debug("Enabling --unsquash flag in singularity call")
-            return "--unsquash "
-        else:
-            return ""
+        Returns:
+            bool: singularity namespace support
+        """
+        return self.runtime.check_userns()
+
+    def check_unsquash(self):
+        """Check if --unsquash is supported"""
+        return self.runtime.family == 'singularity' and self.runtime.unsquash()
 
     def get_version(self):
         """Report version of containment choice.
 
         Returns:
-            str: Version as reported by containment (eg `singularity --version`)
+            list[str]: implementation (eg 'apptainer') and version, as reported by
+            containment (eg `singularity --version`)
         """
-        commands = {'docker': "docker --version",
-                    'singularity': "singularity --version"}
-        command = commands[self.cec].split(' ')
+        return self.runtime.version()
 
+    def _benchmark_image(self, benchmark):
+        """Return the full image name (registry path, name and tag) of benchmark"""
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        bmark_registry = self.registry
+
+        # Allow registry overrides in the benchmark configuration
+        if 'registry' in bench_conf.keys():
+            bmark_registry = self._gen_reg_path(bench_conf['registry'])
+
+        bcver = bench_conf['version']
+        if self.addarch and self.runtime.family == "singularity" and \
+                bmark_registry.find("docker://") != 0:
+            bcver = bcver + "_" + self.confobj['environment']['arch']
+
+        return bmark_registry + '/' + benchmark + ':' + bcver
+
+    def _container_env(self, benchmark):
+        """Return the environment for container commands run for benchmark"""
+        env = os.environ.copy()
+        if self.runtime.family == 'singularity' and self.scache != "":
+            # Each benchmark gets its own cache, so that it can be cleaned while
+            # other images are being fetched or run
+            cache = self.scache + '/' + benchmark
+            try:
+                os.makedirs(cache, exist_ok=True)
+            except OSError:
+                logger.error("Failed to create Singularity cache dir %s", cache)
+                sys.exit(1)
+            env['SINGULARITY_CACHEDIR'] = env['APPTAINER_CACHEDIR'] = cache
+        return env
+
+    def _pull_image(self, benchmark):
+        """Fetch the image of benchmark into the local container cache.
+
+        Returns:
+            dict: pull metadata (start time, duration and status)
+        """
+        image = self._benchmark_image(benchmark)
+        pull = {'start_at': time.ctime()}
+        starttime = time.monotonic()
+        pulldir = self.resultsdir + '/pull_' + benchmark
+
+        command = self.runtime.pull_command(image, pulldir)
+        if command is None:
+            pull['status'] = 'local'
+            pull['duration'] = 0
+            return pull
+        if pulldir not in command:
+            pulldir = None
+
+        logger.debug("Fetching image: %s", command)
+        env = self._container_env(benchmark)
         try:
-            cmdf = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            engimpl = self.cec
-            for line in cmdf.stdout.readlines():
-                dline = line.decode('utf-8')
-                dline_ver = re.sub(r'^[^0-9]*', '', dline)
-                if len(dline_ver) > 0 and dline_ver[0].isdigit():
-                    if self.cec == 'singularity':
-                        if 'apptainer' in dline:
-                            engimpl = 'apptainer'
-                    elif self.cec == 'docker':
-                        helpout = subprocess.Popen(['docker', '--help'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                        for hline in helpout.stdout.readlines():
-                            if 'podman' in hline.decode('utf-8'):
-                                engimpl = 'podman'
-                                break
-                    return [engimpl, str(dline_ver.strip('\n'))]
-
-        except subprocess.SubprocessError:
-            logger.error("Error fetching %s version", self.cec)
-        except OSError:
-            logger.error("Could not locate %s on the system. Please check your path!", self.cec)
-        return ['unknown', '0.0']
+            if pulldir is not None:
+                os.makedirs(pulldir, exist_ok=True)
+            cmdf = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, env=env)
+            output = cmdf.communicate()[0]
+            if cmdf.returncode == 0:
+                pull['status'] = 'success'
+            else:
+                pull['status'] = 'failed'
+                logger.warning("Failed to fetch %s, it will be fetched on first run", image)
+                logger.debug(output.decode('utf-8', errors='replace'))
+        except (subprocess.SubprocessError, OSError):
+            pull['status'] = 'failed'
+            logger.warning("Failed to execute: %s", ' '.join(command))
+        finally:
+            if pulldir is not None:
+                shutil.rmtree(pulldir, ignore_errors=True)
+
+        pull['duration'] = round(time.monotonic() - starttime, 3)
+        return pull
+
+    def _prefetch(self, benchmarks):
+        """Start fetching images for benchmarks in the background, in order"""
+        if self.prefetch is False:
+            return
+        if self._pulls is None:
+            self._pulls = {}
+            self._puller = ThreadPoolExecutor(max_workers=1)
+        for benchmark in benchmarks:
+            if benchmark not in self._pulls:
+                self._pulls[benchmark] = self._puller.submit(self._pull_image, benchmark)
+
+    async def _await_image(self, benchmark):
+        """Wait for the image of benchmark to be fetched, and record the pull"""
+        if self.prefetch is False:
+            return
+        self._prefetch([benchmark])
+        future = self._pulls[benchmark]
+        prefetched = future.done()
+        starttime = time.monotonic()
+        pull = await asyncio.wrap_future(future)
+        pull['prefetched'] = prefetched
+        pull['wait'] = round(time.monotonic() - starttime, 3)
+        self.confobj['benchmarks'][benchmark]['image_pull'] = pull
+        logger.info("Image for %s %s, fetched in %ss", benchmark,
+                    'prefetched' if prefetched else 'ready', pull['duration'])
+
+    def _run_async(self, coro):
+        """Run coroutine coro to completion on a new event loop, and return its result"""
+        loop = asyncio.new_event_loop()
+        # Needed for the child watcher of subprocesses on older Pythons
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            self._loop = None
+            asyncio.set_event_loop(None)
+            loop.close()
 
-    def _run_benchmark(self, benchmark, mock):
+    def cancel(self):
+        """Cancel the benchmarks being run, terminating their containers.
+
+        Benchmarks not yet started are skipped, and cancelled benchmarks fail.
+        Safe to call from other threads and from signal handlers.
+        """
+        self._cancelled = True
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(cancel_tasks, loop)
+
+    def _run_benchmark(self, benchmark, mock, cpus=None):
+        """Run all repetitions of benchmark.
+
+        Args:
+            benchmark (str): benchmark name
+            mock (bool): Replay prior results rather than running containers
+            cpus (list[int], optional): CPUs to pin the containers to
+
+        Returns:
+            float: benchmark score, or -1 on failure
+        """
+        return self._run_async(self._run_benchmark_async(benchmark, mock, cpus))
+
+    async def _run_benchmark_async(self, benchmark, mock, cpus=None):
 
         bench_conf = self.confobj['benchmarks'][benchmark]
         options_string = " -W"
-        output_logs = ['']
         bmark_keys = ''
-        bmark_registry = self.registry
-        bmark_reg_url = self.confobj['settings']['registry']
         result = 0
-        gpu_flag = ""
-        cmdf = None
 
-        runs = int(self.confobj['settings']['repetitions'])
+        min_runs, max_runs, threshold = self._repetition_bounds()
+        runs = min_runs
+        adaptive = max_runs > min_runs
         log = self.resultsdir + "/" + self.confobj['settings']['name'] + ".log"
 
         if 'retries' in self.confobj['settings']:
@@ -477,22 +863,61 @@ class HEPscore():
             retries = 0
         successful_runs = 0
         retry_count = 0
+        i = 0
+
+        if self.resume and not mock:
+            saved = self._progress.get(benchmark, {})
+            for key, val in saved.get('conf', {}).items():
+                bench_conf.setdefault(key, val)
+            if saved.get('complete', False):
+                result = self._proc_results(benchmark)
+                if result >= 0:
+                    logger.info("%s already complete: skipping", benchmark)
+                    return result
+            # Keep the runs with valid results, and continue after the last run
+            for gpath in self._run_summaries(benchmark).values():
+                if read_summary(gpath, self.scorekey) is not None:
+                    successful_runs += 1
+            for rundir in glob.glob(self.resultsdir + "/" + benchmark + "/run*"):
+                run = os.path.basename(rundir)[3:]
+                if run.isdigit():
+                    i = max(i, int(run) + 1)
+            if successful_runs > 0:
+                logger.info("Resuming %s with %d valid runs", benchmark, successful_runs)
+
+        repetition_mode = bench_conf.get('repetition_mode',
+                                         self.confobj['settings'].get('repetition_mode',
+                                                                      'sequential'))
+
+        cache_fields = None
+        if self._cache is not None and not mock:
+            cache_fields = self._cache_fields(benchmark, repetition_mode)
+            if successful_runs == 0:
+                result = self._restore_cached(benchmark, cache_fields, i)
+                if result is not None:
+                    return result
 
-        # Allow registry overrides in the benchmark configuration
         if 'registry' in bench_conf.keys():
-            bmark_reg_url = bench_conf['registry']
-            bmark_registry = self._gen_reg_path(bench_conf['registry'])
-            logger.info("Overriding registry for this container: %s", bmark_reg_url)
+            logger.info("Overriding registry for this container: %s", bench_conf['registry'])
 
-        bcver = bench_conf['version']
-        if self.addarch and self.cec == "singularity" and \
-                bmark_registry.find("docker://") != 0:
-            bcver = bcver + "_" + self.confobj['environment']['arch']
+        benchmark_name = self._benchmark_image(benchmark)
 
         tmp = "Executing " + str(runs) + " run"
-        if runs > 1:
+        if runs > 1 or adaptive:
             tmp += 's'
-        logger.info("%s of %s", tmp, benchmark + " [" + bcver + "]")
+            if adaptive:
+                tmp += " (up to " + str(max_runs) + ")"
+            if repetition_mode == 'concurrent':
+                tmp += ' concurrently'
+        if adaptive:
+            bench_conf['adaptive'] = {'min_repetitions': min_runs,
+                                      'max_repetitions': max_runs,
+                                      'spread_threshold': threshold,
+                                      'spread': None,
+                                      'converged': False}
+        logger.info("%s of %s", tmp, benchmark + " [" + benchmark_name.rsplit(':', 1)[1] + "]")
+        self._emit('benchmark_start', benchmark=benchmark, image=benchmark_name, runs=runs,
+                   max_runs=max_runs)
 
         if 'args' in bench_conf.keys():
             bmark_keys = bench_conf['args'].keys()
@@ -500,11 +925,8 @@ class HEPscore():
         if self.clean_files is True:
             options_string += " --mop all"
 
-        if 'gpu' in bench_conf and bench_conf['gpu'] is True:
-            if self.cec == 'singularity':
-                gpu_flag = "--nv "
-            else:
-                gpu_flag = "--gpus all "
+        if cpus is not None:
+            logger.info("Pinning %s to CPUs %s", benchmark, cpuset_string(cpus))
 
         for option in bmark_keys:
             bad_args = ["mop", "resultsdir", "--mop", "--resultsdir", "-m", "-w", "-W"]
@@ -525,135 +947,363 @@ class HEPscore():
                     options_string = options_string + ' ' + option_arg
 
         try:
-            lfile = open(log, mode='a')
+            # Unbuffered, so that each chunk of lines is appended in a single write
+            lfile = open(log, mode='ab', buffering=0)
         except OSError:
             logger.error("failure to open %s", log)
             return -1
 
-        benchmark_name = bmark_registry + '/' + benchmark + ':' + bcver
         benchmark_complete = benchmark_name + options_string
         self.confobj['settings']['replay'] = mock
 
-        if self.cec == 'singularity' and self.scache != "":
-            logger.debug("Creating singularity cache %s", self.scache)
-            try:
-                os.makedirs(self.scache)
-                os.environ['SINGULARITY_CACHEDIR'] = os.environ['APPTAINER_CACHEDIR'] = self.scache
-            except OSError:
-                logger.error("Failed to create Singularity cache dir %s", self.scache)
-                sys.exit(1)
+        env = self._container_env(benchmark)
 
-        for i in range(runs + retries):
-            if successful_runs == runs:
-                break
+        try:
+            if not mock:
+                with self._phase('image_fetch', benchmark):
+                    await self._await_image(benchmark)
 
-            run_dir = self.resultsdir + "/" + benchmark + "/run" + str(i)
-            log_filepath = run_dir + "/" + self.cec + "_logs"
+            while True:
+                if successful_runs >= runs:
+                    if not adaptive or runs >= max_runs:
+                        break
+                    spread = self._score_spread(benchmark)
+                    bench_conf['adaptive']['spread'] = spread
+                    if spread is not None and spread <= threshold:
+                        bench_conf['adaptive']['converged'] = True
+                        break
+                    # Keep concurrent batches the same size, so that runs share the host alike
+                    runs = min(runs + (min_runs if repetition_mode == 'concurrent' else 1),
+                               max_runs)
+                    logger.info("Score spread of %s above %s: extending to %d runs",
+                                benchmark, threshold, runs)
+
+                if repetition_mode == 'concurrent':
+                    # Split the CPUs among the runs still needed
+                    cpusets = partition_cpus(cpus if cpus is not None else available_cpus(),
+                                             runs - successful_runs)
+                    batch = list(range(i, i + len(cpusets)))
+                    self._record_interference(benchmark, batch, cpusets)
+                    statuses = await asyncio.gather(
+                        *[self._run_once(benchmark, run, benchmark_complete, env, lfile,
+                                         mock, cpusets[n]) for n, run in enumerate(batch)])
+                    i += len(batch)
+                else:
+                    statuses = [await self._run_once(benchmark, i, benchmark_complete, env,
+                                                     lfile, mock, cpus)]
+                    i += 1
+
+                successful_runs += statuses.count(True)
+                if not mock and True in statuses:
+                    self._journal(benchmark, False)
+                if False in statuses:
+                    retry_count += statuses.count(False)
+                    if retries <= 0 or retry_count > retries:
+                        result = -1
+                        break
+                    logger.warning("Retrying...")
+                    self._emit('retry', benchmark=benchmark, failed_runs=retry_count,
+                               retries=retries)
+        except asyncio.CancelledError:
+            logger.error("running %s cancelled", benchmark)
+            result = -1
 
-            if self.confobj['settings']['replay'] is False:
-                os.makedirs(run_dir)
-                if self.cec == 'docker':
-                    os.chmod(run_dir, stat.S_ISVTX | stat.S_IRWXU |
-                             stat.S_IRWXG | stat.S_IRWXO)
+        lfile.close()
+        logger.info("")
 
-            commands = {'docker': "docker run --rm --network=host -v " + run_dir
-                                  + ":/results " + gpu_flag,
-                        'singularity': "singularity run -i -c -e -B " + run_dir
-                                       + ":/results -B /tmp "
-                                       + self._get_unsquash_flag()
-                                       + self._get_usernamespace_flag() + gpu_flag}
+        with self._phase('results_parse', benchmark):
+            proc_result = self._proc_results(benchmark)
+        result = proc_result if result != -1 else result
+        if cache_fields is not None and result >= 0:
+            self._cache.store(cache_key(cache_fields), cache_fields,
+                              self._run_summaries(benchmark), self.resultsdir)
+        # Overlapped with the next benchmarks, until _join_background()
+        self._in_background(benchmark, self._finish_files, benchmark_name, benchmark, mock)
+        self._emit('benchmark_end', benchmark=benchmark, score=result,
+                   status='success' if result >= 0 else 'failed')
+        return result
+
+    def _cache_fields(self, benchmark, repetition_mode):
+        """Return the fields identifying the runs of benchmark in the result cache"""
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        sysinfo = os.uname()
+        try:
+            mem_total_gb = round(read_memory()[0] / 1024)
+        except (OSError, KeyError, ValueError):
+            mem_total_gb = None
+        return {'benchmark': benchmark, 'version': bench_conf['version'],
+                'image': self._benchmark_image(benchmark),
+                'args': bench_conf.get('args', {}), 'gpu': bench_conf.get('gpu', False),
+                'repetitions': list(self._repetition_bounds()),
+                'repetition_mode': repetition_mode,
+                'arch': sysinfo.machine, 'engine': self.get_version(),
+                'host': {'name': sysinfo.nodename, 'cpu_model': cpu_model(),
+                         'cpus': len(available_cpus()), 'mem_total_gb': mem_total_gb}}
+
+    def _restore_cached(self, benchmark, cache_fields, start=0):
+        """Reuse the cached results of benchmark, if any are valid.
 
-            command_string = commands[self.cec] + benchmark_complete
-            command = command_string.split(' ')
+        Args:
+            benchmark (str): benchmark name
+            cache_fields (dict): fields identifying the runs of benchmark
+            start (int): index of the first run restored, after those on disk
 
-            runstr = 'run' + str(i)
+        Returns:
+            float: benchmark score, or None if no valid results are cached
+        """
+        key = cache_key(cache_fields)
+        meta = self._cache.lookup(key)
+        if meta is None:
+            return None
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        try:
+            runs = self._cache.restore(key, self.resultsdir + '/' + benchmark,
+                                       self._summary_name(benchmark), start)
+        except OSError as err:
+            logger.warning("Failed to restore cached results of %s: %s", benchmark, err)
+            return None
+        bench_conf['result_cache'] = {'key': key, 'cached_at': meta['created_at'],
+                                      'age': round(meta['age']), 'runs': runs,
+                                      'source': meta['source']}
+        logger.warning("Reusing %d cached runs of %s from %s: NOT VALID FOR OFFICIAL SCORES",
+                       runs, benchmark, meta['created_at'])
+        with self._phase('results_parse', benchmark):
+            result = self._proc_results(benchmark)
+        self._emit('benchmark_end', benchmark=benchmark, score=result,
+                   status='success' if result >= 0 else 'failed', cached=True)
+        return result
+
+    def _record_interference(self, benchmark, batch, cpusets):
+        """Document in the output which runs of benchmark ran at the same time"""
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        if 'interference' not in bench_conf:
+            bench_conf['interference'] = {
+                'repetition_mode': 'concurrent',
+                'note': "Runs in the same batch ran simultaneously on disjoint CPU sets, "
+                        "sharing caches, memory bandwidth and I/O: their scores are not "
+                        "comparable with sequentially run benchmarks",
+                'batches': []}
+        bench_conf['interference']['batches'].append(
+            {'runs': ['run' + str(run) for run in batch],
+             'cpusets': [cpuset_string(c) for c in cpusets]})
+
+    async def _run_once(self, benchmark, i, benchmark_complete, env, lfile, mock, cpus=None):
+        """Execute run i of benchmark, recording it under 'run<i>' in its configuration.
 
-            logger.info("Starting %s", runstr)
-            logger.debug("Running  %s", command)
+        Args:
+            benchmark (str): benchmark name
+            i (int): run index
+            benchmark_complete (str): image name and benchmark options
+            env (dict): container command environment
+            lfile (file): global log, opened in unbuffered binary append mode
+            mock (bool): Replay prior results rather than running containers
+            cpus (list[int], optional): CPUs to pin the container to
 
-            bench_conf[runstr] = {}
-            starttime = time.time()
-            bench_conf[runstr]['start_at'] = time.ctime(starttime)
+        Returns:
+            bool: True if the run succeeded
+        """
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        timeout = bench_conf.get('timeout')
 
-            if not mock:
-                try:
-                    cmdf = subprocess.Popen(command, stdout=subprocess.PIPE,
-                                            stderr=subprocess.STDOUT)
-                except (subprocess.SubprocessError, OSError):
-                    if self.cec == 'docker':
-                        os.chmod(run_dir, stat.S_IRWXU | stat.S_IRGRP |
-                                 stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
-
-                    logger.error("failure to execute: %s", command_string)
-                    bench_conf['run' + str(i)]['end_at'] = bench_conf['run' + str(i)]['start_at']
-                    bench_conf['run' + str(i)]['duration'] = 0
-                    retry_count += 1
-                    if retries <= 0 or retry_count > retries:
-                        result = -1
-                        break
-                    logger.error("Retrying...")
-                    continue
+        run_dir = self.resultsdir + "/" + benchmark + "/run" + str(i)
+        log_filepath = run_dir + "/" + self.cec + "_logs"
 
-                line = cmdf.stdout.readline()
-                while line:
-                    output_logs.insert(0, line)
-                    try:
-                        lfile.write(line.decode('utf-8'))
-                    except UnicodeEncodeError:
-                        # Ignore decode errors, for example from special characters
-                        pass
-                    lfile.flush()
-                    line = cmdf.stdout.readline()
-                    if line[-25:] == "no space left on device.\n":
-                        logger.error("Docker: No space left on device.")
-
-                cmdf.wait()
-
-                if self.cec == 'docker':
-                    os.chmod(run_dir, stat.S_IRWXU | stat.S_IRGRP |
-                             stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
-
-                self._check_return_code(cmdf.returncode)
-                if cmdf.returncode > 0:
-                    logger.error("%s output logs:", self.cec)
-                    for line in list(reversed(output_logs))[-10:]:
-                        logger.error(line)
-                else:
-                    successful_runs += 1
+        if self.confobj['settings']['replay'] is False:
+            os.makedirs(run_dir)
+            self.runtime.prepare_run_dir(run_dir)
 
-                try:
-                    with open(log_filepath, 'w') as log_file:
-                        for line in reversed(output_logs):
-                            log_file.write('%s' % line)
-                except OSError:
-                    logger.warning("Failed to write logs to file!")
+        # The container is pinned to a CPU set when sharing the host
+        image, *options = benchmark_complete.split(' ')
+        command = self.runtime.run_command(image, options, run_dir, cpus, bench_conf)
+        command_string = ' '.join(command)
 
-            else:
-                time.sleep(1)
-                successful_runs += 1
+        runstr = 'run' + str(i)
 
-            endtime = time.time()
-            bench_conf[runstr]['end_at'] = time.ctime(endtime)
-            bench_conf[runstr]['duration'] = math.floor(endtime) - math.floor(starttime)
+        logger.info("Starting %s of %s", runstr, benchmark)
+        logger.debug("Running  %s", command)
 
-            if not mock and cmdf.returncode != 0:
-                logger.error("running %s failed.  Exit status %s", benchmark, cmdf.returncode)
+        bench_conf[runstr] = {}
+        starttime = time.time()
+        runstart = time.monotonic()
+        bench_conf[runstr]['start_at'] = time.ctime(starttime)
+        if cpus is not None:
+            bench_conf[runstr]['cpuset'] = cpuset_string(cpus)
+        returncode = 0
 
-                retry_count += 1
-                if retries <= 0 or retry_count > retries:
-                    result = -1
-                    break
-                logger.warning("Retrying...")
+        if not mock:
+            try:
+                run_log = open(log_filepath, mode='w', encoding='utf-8')
+            except OSError:
+                logger.warning("Failed to write logs to file!")
+                run_log = None
 
-        lfile.close()
-        self._container_rm(benchmark_name)
-        logger.info("")
+            sampler = None
+            if self.telemetry:
+                sampler = TelemetrySampler(float(self.telemetry_interval))
+                sampler.start()
+
+            output_tail = collections.deque(maxlen=LOG_TAIL_LINES)
+            timing = {}
+            try:
+                returncode, timed_out = await self._exec_container(
+                    command, env, lfile, run_log, output_tail, timeout, timing)
+            except (subprocess.SubprocessError, OSError):
+                self.runtime.finish_run_dir(run_dir)
+                logger.error("failure to execute: %s", command_string)
+                bench_conf[runstr]['end_at'] = bench_conf[runstr]['start_at']
+                bench_conf[runstr]['duration'] = 0
+                self._emit_run_end(benchmark, i, None, time.monotonic() - runstart)
+                return False
+            finally:
+                if run_log is not None:
+                    run_log.close()
+                if sampler is not None:
+                    sampler.stop()
+                    bench_conf[runstr]['telemetry'] = sampler.report()
+                self._record_run_phases(benchmark, i, timing)
+
+            self.runtime.finish_run_dir(run_dir)
+
+            if timed_out:
+                logger.error("%s did not finish within %s seconds", runstr, timeout)
+                bench_conf[runstr]['timed_out'] = True
+
+            self._check_return_code(returncode)
+            if returncode != 0:
+                logger.error("%s output logs:", self.cec)
+                for line in output_tail:
+                    logger.error(line.rstrip('\n'))
+        else:
+            await asyncio.sleep(1)
+
+        endtime = time.time()
+        bench_conf[runstr]['end_at'] = time.ctime(endtime)
+        bench_conf[runstr]['duration'] = math.floor(endtime) - math.floor(starttime)
+        self._emit_run_end(benchmark, i, returncode, time.monotonic() - runstart)
+
+        if returncode != 0:
+            logger.error("running %s failed.  Exit status %s", benchmark, returncode)
+            return False
+
+        return True
+
+    def _emit_run_end(self, benchmark, i, returncode, elapsed):
+        """Notify the hooks of the end of run i of benchmark, with its score if it succeeded"""
+        if not self._hooks:
+            return
+        runstr = 'run' + str(i)
+        score = None
+        if returncode == 0:
+            jscore = read_summary(self.resultsdir + '/' + benchmark + '/' + runstr + '/' +
+                                  self._summary_name(benchmark), self.scorekey)
+            if jscore is not None:
+                score = self._score_run(benchmark, jscore, runstr)
+        self._emit('run_end', benchmark=benchmark, run=i, returncode=returncode,
+                   status='success' if returncode == 0 else 'failed',
+                   elapsed=round(elapsed, 6), score=score)
+
+    def _record_run_phases(self, benchmark, i, timing):
+        """Record the 'container_start' and 'run' phases of run i from its timing"""
+        if 'start' not in timing:
+            return
+        end = timing.get('end', time.monotonic())
+        first_output = timing.get('first_output')
+        if first_output is not None:
+            self.record_phase('container_start', first_output - timing['start'], benchmark, i)
+            self.record_phase('run', end - first_output, benchmark, i)
+        else:
+            self.record_phase('run', end - timing['start'], benchmark, i)
+
+    async def _exec_container(self, command, env, lfile, run_log, tail, timeout=None,
+                              timing=None):
+        """Execute a container command, streaming its output to the logs.
+
+        The container is terminated if it runs for longer than timeout seconds,
+        or if the calling task is cancelled.  The monotonic times of the start of
+        the command, of its first output line, and of its end are recorded in
+        timing, under 'start', 'first_output' and 'end'.
+
+        Args:
+            command (list[str]): command and arguments
+            env (dict): command environment
+            lfile (file): global log, opened in unbuffered binary append mode
+            run_log (file): per-run log, or None
+            tail (collections.deque): bounded buffer receiving the latest output lines
+            timeout (float, optional): seconds to allow the container to run
+            timing (dict, optional): receives the monotonic times of the command
+
+        Returns:
+            2-tuple (int return code, bool timed out)
+        """
+        if timing is None:
+            timing = {}
+        timing['start'] = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            env=env, limit=STREAM_LIMIT)
+
+        async def complete():
+            await self._capture_output(proc.stdout, lfile, run_log, tail, timing)
+            return await proc.wait()
 
-        proc_result = self._proc_results(benchmark)
-        return proc_result if result != -1 else result
+        try:
+            return await asyncio.wait_for(complete(), timeout), False
+        except asyncio.TimeoutError:
+            await terminate_process(proc)
+            return proc.returncode, True
+        except asyncio.CancelledError:
+            await terminate_process(proc)
+            raise
+        finally:
+            timing['end'] = time.monotonic()
+
+    async def _capture_output(self, stream, lfile, run_log, tail, timing=None):
+        """Stream container output to the benchmark logs.
+
+        Lines are written to the per-run log as they arrive, and appended to the
+        global log in whole-line chunks at most every 'log_flush_interval' seconds.
+
+        Args:
+            stream (asyncio.StreamReader): container output
+            lfile (file): global log, opened in unbuffered binary append mode
+            run_log (file): per-run log, or None
+            tail (collections.deque): bounded buffer receiving the latest lines
+            timing (dict, optional): receives the monotonic time of the first line,
+                                     under 'first_output'
+        """
+        pending = []
+        last_flush = time.time()
+
+        try:
+            while True:
+                try:
+                    line = await stream.readline()
+                except ValueError:
+                    line = b"[hepscore: overlong output line discarded]\n"
+                if not line:
+                    break
+                if timing is not None and 'first_output' not in timing:
+                    timing['first_output'] = time.monotonic()
+
+                dline = line.decode('utf-8', errors='replace')
+                tail.append(dline)
+                pending.append(dline)
+                if run_log is not None:
+                    run_log.write(dline)
+                if dline.endswith("no space left on device.\n"):
+                    logger.error("%s: No space left on device.", self.cec)
+
+                now = time.time()
+                if now - last_flush >= self.log_flush_interval:
+                    lfile.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    last_flush = now
+        finally:
+            if pending:
+                lfile.write(''.join(pending).encode('utf-8'))
 
     def _check_return_code(self, return_code):
-        if return_code == 137 and self.cec == 'docker':
+        if return_code == 137 and self.runtime.family == 'docker':
             logger.error("%s returned code 137: OOM-kill or intervention", self.cec)
         elif return_code != 0:
             logger.error("%s returned code %s", self.cec, return_code)
@@ -678,6 +1328,7 @@ class HEPscore():
         else:
             self.confobj['score'] = float(fres)
             self.confobj['status'] = 'success'
+        self._emit('score', score=self.confobj['score'], status=self.confobj['status'])
 
     def write_output(self, outtype, outfile=None):
         """Writes summary results in selected `outtype` to `outfile`.
@@ -698,6 +1349,11 @@ class HEPscore():
         if outtype != outfile[-4:]:
             logging.warning("%s output requested, but %s does not match!", outtype, outfile)
 
+        # The output_write phase itself is only reported to the hooks
+        if 'app_info' in self.confobj:
+            self.confobj['app_info']['phases'] = {phase: round(elapsed, 6)
+                                                  for phase, elapsed in self.phases.items()}
+
         outobj = {}
         if outtype == 'yaml':
             outobj['hepscore_benchmark'] = self.confobj
@@ -706,30 +1362,72 @@ class HEPscore():
         else:
             raise ValueError("outtype must be 'json' or 'yaml'")
 
-        try:
-            jfile = open(outfile, mode='w')
-            if outtype == 'yaml':
-                jfile.write(yaml.safe_dump(outobj, sort_keys=False))
-            else:
-                jfile.write(json.dumps(outobj))
-            jfile.close()
-        except OSError:
-            logging.error("Failed to create summary output %s", outfile)
-            sys.exit(2)
-        except (TypeError, yaml.representer.RepresenterError):
-            logging.error("Invalid output object")
-            sys.exit(2)
+        with self._phase('output_write'):
+            try:
+                jfile = open(outfile, mode='w')
+                if outtype == 'yaml':
+                    jfile.write(dump_yaml(outobj))
+                else:
+                    jfile.write(json.dumps(outobj))
+                jfile.close()
+            except OSError:
+                logging.error("Failed to create summary output %s", outfile)
+                sys.exit(2)
+            except (TypeError, yaml.representer.RepresenterError):
+                logging.error("Invalid output object")
+                sys.exit(2)
+
+        self._emit('output', outfile=os.path.abspath(outfile))
+        if self._events is not None:
+            # Superseded by the summary output
+            try:
+                os.remove(self._partial_path())
+            except OSError:
+                pass
+            self._events.close()
 
         if len(self.results) == 0 or self.results[-1] < 0:
             logger.error("Results = %s.", self.results)
             sys.exit(2)
 
+    def _check_float(self, key, minimum=None, strict=True):
+        """Exits unless the setting key is a float, above minimum if given.
+
+        Args:
+            key (str): name of the setting
+            minimum (float, optional): lower bound of the setting
+            strict (bool, optional): whether minimum itself is out of bounds
+        """
+        try:
+            value = float(self.confobj['settings'][key])
+        except (TypeError, ValueError):
+            value = None
+        if value is not None and (minimum is None or value > minimum or
+                                  (not strict and value == minimum)):
+            return
+        if minimum is None:
+            requirement = "a float"
+        else:
+            requirement = "%s %s" % ("greater than" if strict else "at least", minimum)
+        logger.error("Configuration: '%s' configuration parameter must be %s", key, requirement)
+        sys.exit(1)
+
     def validate_conf(self):
         """Parses constructor configuration dict for valid values.
 
+        Configurations identical to one already validated by this process are
+        not checked again; their commented out benchmarks are still removed.
+
         Returns:
             dict: a valid dict (constructor dict if valid)
         """
+        conf_hash = config_hash(self.confobj)
+        if conf_hash in _valid_confs:
+            for benchmark in list(self.confobj['benchmarks']):
+                if benchmark[0] == ".":
+                    self.confobj['benchmarks'].pop(benchmark, None)
+            return self.confobj
+
         hep_settings = ['settings', 'benchmarks']
         required_keys = {'settings': ['method',
                                       'repetitions',
@@ -764,26 +1462,65 @@ class HEPscore():
                             logger.error("Configuration: only 'geometric_mean' method is "
                                          "currently supported")
                             sys.exit(1)
-                    if subkey in ('repetitions', 'retries'):
+                    if subkey in ('repetitions', 'retries', 'min_repetitions',
+                                  'max_repetitions'):
                         val = self.confobj[key][subkey]
                         if (not isinstance(val, int)) or val < 0:
                             logger.error("Configuration: '%s' configuration parameter must "
                                          "be a positive integer", subkey)
                             sys.exit(1)
-                    if subkey == 'addarch':
+                    if subkey == 'parallelism':
+                        val = self.confobj[key][subkey]
+                        if (not isinstance(val, int)) or val < 1:
+                            logger.error("Configuration: 'parallelism' configuration parameter "
+                                         "must be an integer of at least 1")
+                            sys.exit(1)
+                    if subkey in ('addarch', 'prefetch', 'telemetry', 'incremental_output',
+                                  'result_cache', 'reject_flagged_runs', 'compress_logs',
+                                  'archive_results'):
                         try:
                             bool(self.confobj[key][subkey])
                         except ValueError:
-                            logger.error("Configuration: 'addarch' configuration parameter "
-                                         "must be a bool")
+                            logger.error("Configuration: '%s' configuration parameter "
+                                         "must be a bool", subkey)
                             sys.exit(1)
                     if subkey == 'scaling':
-                        try:
-                            float(self.confobj[key][subkey])
-                        except ValueError:
-                            logger.error("Configuration: 'scaling' configuration parameter "
-                                         "must be a float")
+                        self._check_float(subkey)
+                    if subkey == 'repetition_mode':
+                        if self.confobj[key][subkey] not in ('sequential', 'concurrent'):
+                            logger.error("Configuration: 'repetition_mode' must be "
+                                         "'sequential' or 'concurrent'")
+                            sys.exit(1)
+                    if subkey == 'arch':
+                        val = self.confobj[key][subkey]
+                        if not isinstance(val, list) or \
+                                not all(isinstance(arch, str) for arch in val):
+                            logger.error("Configuration: 'arch' configuration parameter "
+                                         "must be a list of architectures")
+                            sys.exit(1)
+                    if subkey == 'history':
+                        val = self.confobj[key][subkey]
+                        if not isinstance(val, list) or \
+                                not all(isinstance(path, str) for path in val):
+                            logger.error("Configuration: 'history' configuration parameter "
+                                         "must be a list of paths")
+                            sys.exit(1)
+                    if subkey == 'preflight':
+                        if self.confobj[key][subkey] not in ('warn', 'abort', 'fit', 'off'):
+                            logger.error("Configuration: 'preflight' must be 'warn', 'abort', "
+                                         "'fit' or 'off'")
                             sys.exit(1)
+                    if subkey in ('telemetry_interval', 'result_cache_ttl',
+                                  'copy_spread_threshold', 'spread_threshold'):
+                        self._check_float(subkey, minimum=0)
+                    if subkey == 'log_flush_interval':
+                        self._check_float(subkey, minimum=0, strict=False)
+
+        min_runs, max_runs, _ = self._repetition_bounds()
+        if not 1 <= min_runs <= max_runs:
+            logger.error("Configuration: 'min_repetitions' must be at least 1, and no more "
+                         "than 'max_repetitions'")
+            sys.exit(1)
 
         bcount = 0
         for benchmark in list(self.confobj['benchmarks']):
@@ -814,6 +1551,22 @@ class HEPscore():
                     logger.error("Configuration: invalid 'weight' specified: %s Must be a float",
                                  bmark_conf['weight'])
 
+            if bmark_conf.get('repetition_mode', 'sequential') not in ('sequential',
+                                                                       'concurrent'):
+                logger.error("Configuration: 'repetition_mode' must be 'sequential' or "
+                             "'concurrent' for %s", benchmark)
+                sys.exit(1)
+
+            if 'timeout' in bmark_conf.keys():
+                try:
+                    if float(bmark_conf['timeout']) <= 0:
+                        raise ValueError
+                except (TypeError, ValueError):
+                    logger.error("Configuration: invalid 'timeout' specified for %s: %s "
+                                 "Must be a positive number of seconds",
+                                 benchmark, bmark_conf['timeout'])
+                    sys.exit(1)
+
             if 'ref_scores' in bmark_conf.keys():
                 for score in bmark_conf['ref_scores']:
                     try:
@@ -838,10 +1591,224 @@ class HEPscore():
             logger.error("Configuration: no benchmarks specified")
             sys.exit(1)
 
-        logger.debug("The parsed config is: \n %s", yaml.safe_dump(self.confobj, sort_keys=False))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("The parsed config is: \n %s", dump_yaml(self.confobj))
 
+        _valid_confs.add(conf_hash)
         return self.confobj
 
+    def _partial_path(self):
+        return self.resultsdir + '/' + self.confobj['settings']['name'] + '.partial.json'
+
+    def _open_event_log(self):
+        """Start logging events to BENCHMARK_NAME.events.jsonl, for 'incremental_output'"""
+        path = self.resultsdir + '/' + self.confobj['settings']['name'] + '.events.jsonl'
+        try:
+            self._events = EventLog(path)
+        except OSError:
+            logger.warning("Failed to open event log %s", path)
+            return
+        self.add_hook(self._events)
+
+    def _write_partial(self, status='running'):
+        """Atomically rewrite the partial summary output, for 'incremental_output'"""
+        if self._events is None:
+            return
+        try:
+            write_json_atomic(self._partial_path(), dict(self.confobj, status=status))
+        except (OSError, TypeError):
+            logger.warning("Failed to write partial summary %s", self._partial_path())
+
+    def _progress_path(self):
+        return self.resultsdir + '/' + self.confobj['settings']['name'] + '.progress.json'
+
+    def _journal(self, benchmark, complete):
+        """Record the progress of benchmark in the journal used to resume runs"""
+        bench_conf = self.confobj['benchmarks'][benchmark]
+        self._progress[benchmark] = {'complete': complete,
+                                     'conf': json.loads(json.dumps(bench_conf))}
+        progress = {'config_hash': self.confobj['app_info']['config_hash'],
+                    'environment': self.confobj['environment'],
+                    'benchmarks': self._progress}
+        try:
+            write_json_atomic(self._progress_path(), progress)
+        except (OSError, TypeError):
+            logger.warning("Failed to write progress journal %s", self._progress_path())
+
+    def _load_progress(self):
+        """Load the progress journal of an interrupted run.
+
+        Returns:
+            dict: environment of the interrupted run
+        """
+        self._progress = {}
+        try:
+            with open(self._progress_path(), mode='r') as jfile:
+                progress = json.load(jfile)
+        except (OSError, ValueError):
+            logger.warning("No readable progress journal in %s: resuming from the run "
+                           "summaries found", self.resultsdir)
+            return {}
+
+        if progress.get('config_hash') != self.confobj['app_info']['config_hash']:
+            logger.error("Configuration differs from the one of the run to resume in %s",
+                         self.resultsdir)
+            sys.exit(1)
+
+        self._progress = progress.get('benchmarks', {})
+        logger.info("Resuming run: %d benchmarks already complete",
+                    len([b for b in self._progress.values() if b['complete']]))
+        return progress.get('environment', {})
+
+    def _preflight(self):
+        """Estimate the needs of the benchmarks to run, and check the host can meet them.
+
+        Shortfalls of image cache or output space, or of memory, are logged.
+        With the 'preflight' setting 'abort', no benchmark is then run.  With
+        'fit', the images of singularity runtimes are pulled to a cache of
+        their own and removed after each benchmark, and then images are no
+        longer prefetched, if that makes the image cache fit; no benchmark is
+        run if shortfalls remain.  Images are not removed from the shared
+        store of docker and podman, which may hold images of the host.  Concurrent benchmarks are started longest first.
+        The estimates, needs and shortfalls are recorded under 'preflight' in
+        app_info.
+
+        Returns:
+            bool: whether to run the benchmarks
+        """
+        benchmarks = [bmk for bmk in self.confobj['benchmarks']
+                      if not self._progress.get(bmk, {}).get('complete')]
+        if not benchmarks:
+            return True
+        history = run_history(self.history) if self.history else {}
+        _, max_runs, _ = self._repetition_bounds()
+        ncores = max(1, len(available_cpus()) // max(1, min(self.parallelism, len(benchmarks))))
+        images = self.runtime.image_cache() is not None
+        estimates = {}
+        for bmk in benchmarks:
+            bench_conf = self.confobj['benchmarks'][bmk]
+            estimates[bmk] = estimate(bench_conf,
+                                      bench_conf.get('registry', self.settings['registry']),
+                                      max_runs, ncores, history.get(bmk), images)
+
+        actions = []
+        for action in ('clean', 'no_prefetch', None):
+            needs = peak_needs(estimates, self.parallelism, self.clean, self.clean_files,
+                               self.prefetch)
+            image_cache = self.scache or self.runtime.image_cache()
+            disk = {self.resultsdir: needs['output_mb']}
+            if image_cache is not None and needs['image_cache_mb'] > 0:
+                disk[image_cache] = disk.get(image_cache, 0) + needs['image_cache_mb']
+            short_disks = disk_shortfalls(disk)
+            if self.preflight != 'fit' or action is None or \
+                    not any(image_cache in fs['paths'] for fs in short_disks):
+                break
+            if action == 'clean' and not self.clean and self.runtime.family == 'singularity':
+                self.clean = True
+                self.scache = os.path.abspath(self.resultsdir + '/scache')
+                actions.append('clean')
+            elif action == 'no_prefetch' and self.prefetch:
+                self.prefetch = False
+                actions.append('no_prefetch')
+
+        shortfalls = ["%d MB of disk space needed for %s, %d MB free"
+                      % (fs['needed'], ' and '.join(fs['paths']), fs['free'])
+                      for fs in short_disks]
+        try:
+            available_mem = read_memory()[1]
+            if needs['memory_mb'] > available_mem:
+                shortfalls.append("%d MB of memory needed, %d MB available"
+                                  % (needs['memory_mb'], available_mem))
+        except (OSError, KeyError, ValueError):
+            pass
+
+        if self.parallelism > 1:
+            self._order = order_longest_first(estimates)
+
+        self.confobj['app_info']['preflight'] = {'benchmarks': estimates, 'needs': needs,
+                                                 'shortfalls': shortfalls, 'actions': actions}
+        logger.info("Estimated duration %.1f hours, until %s; peak image cache %d MB, "
+                    "output %d MB, memory %d MB", needs['duration'] / 3600.0,
+                    time.ctime(time.time() + needs['duration']), needs['image_cache_mb'],
+                    needs['output_mb'], needs['memory_mb'])
+        for action in actions:
+            logger.warning("Preflight: %s", {'clean': "removing images after each benchmark",
+                                              'no_prefetch': "not prefetching images"}[action])
+        for shortfall in shortfalls:
+            logger.warning("Preflight: %s", shortfall)
+        return not shortfalls or self.preflight == 'warn'
+
+    def _schedule(self, mock):
+        """Run the configured benchmarks, yielding results in configuration order.
+
+        With 'parallelism' > 1, up to that many benchmarks run concurrently, each
+        pinned to its own disjoint set of CPUs, and all run as tasks of a single
+        event loop, started in the order planned by _preflight.  Benchmarks
+        still running are cancelled if the caller stops iterating.  Images of
+        upcoming benchmarks are fetched in the background while the current
+        ones run.
+
+        Args:
+            mock (bool): Replay prior results rather than running containers
+
+        Yields:
+            2-tuple (benchmark name, benchmark result)
+        """
+        benchmarks = list(self.confobj['benchmarks'])
+
+        if self.parallelism <= 1:
+            for i, benchmark in enumerate(benchmarks):
+                if self._cancelled:
+                    return
+                if not mock:
+                    # Fetch the next image while this benchmark runs
+                    self._prefetch(benchmarks[i:i + 2])
+                yield benchmark, self._run_benchmark(benchmark, mock)
+            return
+
+        cpusets = partition_cpus(available_cpus(), self.parallelism)
+        logger.info("Running up to %d benchmarks concurrently on CPU sets: %s",
+                    len(cpusets), ' '.join(cpuset_string(c) for c in cpusets))
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        slots = asyncio.Queue()
+        for cpus in cpusets:
+            slots.put_nowait(cpus)
+
+        order = [bmk for bmk in self._order or [] if bmk in benchmarks]
+        order += [bmk for bmk in benchmarks if bmk not in order]
+
+        async def pinned_run(i, benchmark):
+            cpus = await slots.get()
+            if not mock:
+                self._prefetch(order[i:i + 1 + len(cpusets)])
+            try:
+                return await self._run_benchmark_async(benchmark, mock, cpus)
+            finally:
+                slots.put_nowait(cpus)
+
+        # Tasks take the CPU sets in the order they are created
+        tasks = {benchmark: loop.create_task(pinned_run(i, benchmark))
+                 for i, benchmark in enumerate(order)}
+        try:
+            for benchmark in benchmarks:
+                task = tasks[benchmark]
+                # Other benchmarks keep running while waiting for this one
+                try:
+                    res = loop.run_until_complete(task)
+                except asyncio.CancelledError:
+                    res = -1
+                yield benchmark, res
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks.values(), return_exceptions=True))
+            self._loop = None
+            asyncio.set_event_loop(None)
+            loop.close()
+
     def run(self, mock=False):
         """Run the benchmarks defined in the constructor config dict.
 
@@ -853,28 +1820,38 @@ class HEPscore():
             int: 0 on success, -1 on error
         """
 
-        # check rundir is empty
-        if os.listdir(self.resultsdir) and not mock:
-            logger.error("Results directory is not empty!")
-            sys.exit(1)
-
         # Creating a hash representation of the configuration object
         # to be included in the final report
-        conf_hash = hashlib.sha256()
-        hashable_conf = {k: v for k, v in self.confobj.items() if k not in 'options'}
-        conf_hash.update(json.dumps(hashable_conf, sort_keys=True).encode('utf-8'))
+        conf_hash = config_hash(self.confobj)
         self.confobj['app_info'] = {}
-        self.confobj['app_info']['config_hash'] = conf_hash.hexdigest()
+        self.confobj['app_info']['config_hash'] = conf_hash
+
+        # check rundir is empty, unless resuming a previous run in it
+        resumed_env = {}
+        if self.resume and not mock:
+            resumed_env = self._load_progress()
+        elif os.listdir(self.resultsdir) and not mock:
+            logger.error("Results directory is not empty!")
+            sys.exit(1)
 
         sysinfo = os.uname()
         sysname = ' '.join(sysinfo)
         curtime = time.asctime()
 
-        impl,ver = self.get_version()
+        with self._phase('engine_probe'):
+            impl,ver = self.get_version()
         exec_ver = impl + "_version"
 
-        self.confobj['environment'] = {'system': sysname, 'arch': sysinfo.machine,
+        self.confobj['environment'] = {'system': sysname, 'host': sysinfo.nodename,
+                                       'arch': sysinfo.machine, 'cpu_model': cpu_model(),
                                        'start_at': curtime, exec_ver: ver}
+        if sysinfo.machine not in self.settings.get('arch', [sysinfo.machine]):
+            logger.warning("%s does not support %s, only %s", self.confobj['settings']['name'],
+                           sysinfo.machine, ', '.join(self.settings['arch']))
+        if resumed_env:
+            self.confobj['environment']['start_at'] = resumed_env['start_at']
+            self.confobj['environment']['resumed_at'] = \
+                resumed_env.get('resumed_at', []) + [curtime]
 
         logger.info("%s Benchmark", self.confobj['settings']['name'])
         logger.info("Config Hash:         %s", self.confobj['app_info']['config_hash'])
@@ -889,11 +1866,28 @@ class HEPscore():
         self.confobj['wl-scores'] = {}
         self.confobj['app_info']['hepscore_ver'] = __version__
 
-        if self.cec == 'singularity' and not mock:
+        if self.preflight != 'off' and not mock:
+            with self._phase('preflight'):
+                ready = self._preflight()
+            if not ready:
+                logger.error("Preflight checks failed: no benchmark run")
+                self.confobj['error'] = 'preflight'
+                self.confobj['score'] = -1
+                self.confobj['status'] = 'failed'
+                return -1
+
+        if self.incremental_output and not mock:
+            self._open_event_log()
+        self._emit('start', name=self.confobj['settings']['name'],
+                   config_hash=self.confobj['app_info']['config_hash'],
+                   benchmarks=list(self.confobj['benchmarks']), resultsdir=self.resultsdir)
+        self._write_partial()
+
+        if self.runtime.family == 'singularity' and not mock:
             try:
                 self.unpack = self.resultsdir + '/unpack'
                 logger.debug("Creating singularity unpack directory %s", self.unpack)
-                os.makedirs(self.unpack)
+                os.makedirs(self.unpack, exist_ok=self.resume)
                 os.environ['SINGULARITY_TMPDIR'] = os.environ['APPTAINER_TMPDIR'] = self.unpack
             except OSError:
                 logger.error("Failed to create Singularity unpack dir %s", self.unpack)
@@ -904,8 +1898,8 @@ class HEPscore():
 
         res = 0
         have_failure = False
-        for benchmark in self.confobj['benchmarks']:
-            res = self._run_benchmark(benchmark, mock)
+        schedule = self._schedule(mock)
+        for benchmark, res in schedule:
             if res < 0:
                 have_failure = True
                 # set error to first benchmark encountered
@@ -914,6 +1908,8 @@ class HEPscore():
                 if 'continue_fail' not in self.confobj['settings'].keys() or \
                         self.confobj['settings']['continue_fail'] is False:
                     break
+            if not mock:
+                self._journal(benchmark, res >= 0)
             self.results.append(res)
             bench_conf = self.confobj['benchmarks'][benchmark]
             if 'weight' in bench_conf:
@@ -921,15 +1917,46 @@ class HEPscore():
             else:
                 self.weights.append(1.0)
                 bench_conf['weight'] = 1.0
+            self._write_partial()
+        schedule.close()
+
+        if self._puller is not None:
+            for future in self._pulls.values():
+                future.cancel()
+            self._puller.shutdown(wait=True)
+            self._pulls = self._puller = None
+
+        log = self.resultsdir + "/" + self.confobj['settings']['name'] + ".log"
+        if self.compress_logs and not mock and os.path.isfile(log):
+            self._in_background(None, self._compress_log, log)
+        self._join_background()
 
         self.confobj['environment']['end_at'] = time.asctime()
 
-        if self.cec == 'singularity' and not mock:
-            logger.debug("Removing singularity unpack directory %s", self.unpack)
-            try:
-                os.rmdir(self.unpack)
-            except OSError:
-                logger.error("Failed to remove Singularity unpack dir %s", self.unpack)
+        with self._phase('cleanup'):
+            if self.clean and self.runtime.family == 'singularity' and \
+                    os.path.isdir(self.scache):
+                self._scache_rm(self.scache)
+
+            if self.runtime.family == 'singularity' and not mock:
+                logger.debug("Removing singularity unpack directory %s", self.unpack)
+                try:
+                    os.rmdir(self.unpack)
+                except OSError:
+                    logger.error("Failed to remove Singularity unpack dir %s", self.unpack)
+
+        cached = [benchmark for benchmark, bench_conf in self.confobj['benchmarks'].items()
+                  if 'result_cache' in bench_conf]
+        if cached:
+            self.confobj['app_info']['result_cache'] = {
+                'benchmarks': cached,
+                'note': "Results of these benchmarks were reused from the result cache, not "
+                        "run: this score is not valid as an official HEPscore result"}
+            logger.warning("Cached results used for %s: score NOT VALID FOR OFFICIAL USE",
+                           ', '.join(cached))
+
+        self._emit('end', status='failed' if have_failure else 'success')
+        self._write_partial('failed' if have_failure else 'finished')
 
         if have_failure:
             logger.error("BENCHMARK FAILURE")
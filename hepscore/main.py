@@ -8,13 +8,18 @@ the top-level directory of this distribution.
 
 
 import argparse
+import json
 import logging
 import os
 import sys
 import textwrap
 import time
-import yaml
-import hepscore.hepscore as hepscore
+from hepscore import __version__
+import hepscore.config as configs
+from hepscore.runtime import RUNTIMES
+
+# The modules running benchmarks and handling results are imported by the
+# commands using them, so that 'hep-score -l', '-p' and '-V' start fast
 
 logger = logging.getLogger()
 
@@ -44,23 +49,42 @@ def parse_args(args):
         Run using Singularity (default) with a custom benchmark configuration:
         $ hep-score -f /tmp/my-custom-bmk.yml /tmp
 
+        Load results into a database, and query the score distribution of a workload:
+        $ hep-score ingest results.db /tmp/HEPscore_*
+        $ hep-score query results.db atlas-gen-bmk --cpu_model "AMD EPYC 7302 16-Core Processor"
+
+        Re-score many result directories with new reference scores:
+        $ hep-score rescore -f /tmp/new-refs.yml -o scores.csv /data/results
+
+        Export the runs of many results for analysis:
+        $ hep-score export runs.parquet /data/results
+
+        Run a campaign on two hosts sharing /shared, with a worker started on each:
+        $ hep-score campaign create /shared/rack42 node01 node02
+        $ hep-score campaign work /shared/rack42
+        $ hep-score campaign collect /shared/rack42
+
         List built-in benchmark configurations:
         $ hep-score -l
 
         Run with a specified built-in benchmark configuration:
         $ hep-score -n hepscore_testkv /tmp
 
+        Resume an interrupted run, with the same configuration:
+        $ hep-score -f /tmp/my-custom-bmk.yml -R /tmp/HEPscore_01Jan2023_120000
+
         Included benchmark configuraton files available in:
-        ''' + hepscore.config_path)
+        ''' + configs.config_path)
     )
 
     # required argument
     parser.add_argument("OUTDIR", type=str, nargs='?', help="Base output directory.")
     # optionals
-    parser.add_argument("-m", "--container_exec", choices=['singularity', 'docker'],
+    parser.add_argument("-m", "--container_exec", choices=list(RUNTIMES),
                         nargs='?', default=False,
                         help="specify container platform for benchmark execution "
-                             "(singularity [default], or docker).")
+                             "(singularity [default], apptainer, docker, podman, or fake "
+                             "to run a stand-in workload without containers).")
     parser.add_argument("-S", "--userns", action='store_true',
                         help="enable user namespace for Singularity, if supported.")
     parser.add_argument("-c", "--clean", action='store_true',
@@ -71,10 +95,15 @@ def parse_args(args):
                         help="custom config yaml to use instead of default.")
     parser.add_argument("-l", "--list", action='store_true',
                         help="list built-in benchmark configurations and exit.")
+    parser.add_argument("--arch", default=False,
+                        help="with -l, only list the configurations supporting this "
+                             "architecture (eg aarch64).")
     parser.add_argument("-n", "--namedconf", nargs='?', default='',
                         help="use specified named built-in benchmark configuration.")
     parser.add_argument("-r", "--replay", action='store_true',
                         help="replay output using existing results directory OUTDIR.")
+    parser.add_argument("-R", "--resume", action='store_true',
+                        help="resume an interrupted run in existing results directory OUTDIR.")
     parser.add_argument("-o", "--outfile", nargs='?', default=False,
                         help="specify summary output file path/name.")
     parser.add_argument("-y", "--yaml", action='store_true',
@@ -82,9 +111,12 @@ def parse_args(args):
     parser.add_argument("-p", "--print", action='store_true',
                         help="print configuration and exit.")
     parser.add_argument("-V", "--version", action='version',
-                        version="%(prog)s " + hepscore.__version__)
+                        version="%(prog)s " + __version__)
     parser.add_argument("-v", "--verbose", action='store_true',
                         help="enables verbose mode. Display debug messages.")
+    parser.add_argument("--profile", metavar='FILE', default=False,
+                        help="profile the HEPscore process itself with cProfile, and write "
+                             "the statistics to FILE (view with 'python -m pstats FILE').")
 
     arg_dict = vars(parser.parse_args(args))
 
@@ -93,27 +125,243 @@ def parse_args(args):
               "See usage: 'hep-score --help'")
         sys.exit(2)
 
+    if arg_dict['replay'] and arg_dict['resume']:
+        print("Cannot both replay and resume a run. See usage: 'hep-score --help'")
+        sys.exit(2)
+
     return arg_dict
 
 
+def _setup_logging(verbose=False):
+    """Log to stderr, at DEBUG level and with the calling function if verbose"""
+    vstring = '.%(funcName)s() ' if verbose else ' '
+    logging.basicConfig(format='%(asctime)s hepscore' + vstring + '[%(levelname)s] %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S',
+                        level=logging.DEBUG if verbose else logging.INFO)
+
+
+def ingest(args):
+    """`hep-score ingest`: load HEPscore outputs into a results database."""
+    parser = argparse.ArgumentParser(
+        prog="hep-score ingest",
+        description="Load HEPscore JSON outputs, or the output directories containing "
+                    "them, into a SQLite results database (created if needed).")
+    parser.add_argument("DB", type=str, help="results database file.")
+    parser.add_argument("PATH", type=str, nargs='+',
+                        help="HEPscore JSON output, or directory to search for them.")
+    args = parser.parse_args(args)
+
+    import hepscore.store as store
+    _setup_logging()
+    with store.ResultsStore(args.DB) as db:
+        loaded = db.ingest(args.PATH)
+    logger.info("Loaded %d results into %s", loaded, args.DB)
+    return 0
+
+
+def query(args):
+    """`hep-score query`: print score distributions from a results database."""
+    import hepscore.store as store
+    parser = argparse.ArgumentParser(
+        prog="hep-score query",
+        description="Print the distribution of the scores of a workload, or of all "
+                    "workloads, in a results database filled by 'hep-score ingest'.")
+    parser.add_argument("DB", type=str, help="results database file.")
+    parser.add_argument("WORKLOAD", type=str, nargs='?', help="benchmark name.")
+    parser.add_argument("-s", "--sub_score", help="only consider this sub-score.")
+    for key in store.FILTERS:
+        parser.add_argument("--" + key, help="only consider results with this " + key + ".")
+    args = vars(parser.parse_args(args))
+
+    _setup_logging()
+    if not os.path.isfile(args['DB']):
+        print("No results database at " + args['DB'])
+        return 1
+    filters = {key: args[key] for key in store.FILTERS}
+    with store.ResultsStore(args['DB']) as db:
+        workloads = [args['WORKLOAD']] if args['WORKLOAD'] else db.workloads()
+        for workload in workloads:
+            print(workload + ": " + json.dumps(
+                db.workload_distribution(workload, args['sub_score'], **filters)))
+    return 0
+
+
+def export(args):
+    """`hep-score export`: export the runs of many results in a columnar format."""
+    import hepscore.export as exporter
+    parser = argparse.ArgumentParser(
+        prog="hep-score export",
+        description="Export a record for each run and sub-score of each workload of many "
+                    "HEPscore summary outputs (host, workload, run, score, wl-stats and "
+                    "duration) to a Parquet, Arrow IPC or CSV file.")
+    parser.add_argument("OUTFILE", type=str,
+                        help="file to write; its extension (.parquet, .arrow, .feather or "
+                             ".csv) sets the format.")
+    parser.add_argument("PATH", type=str, nargs='+',
+                        help="summary output JSON, or directory to search for them.")
+    parser.add_argument("--format", choices=['parquet', 'arrow', 'csv'], default=None,
+                        help="output format, instead of the one of the OUTFILE extension.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of processes parsing outputs (default: number of CPUs).")
+    args = parser.parse_args(args)
+
+    _setup_logging()
+    try:
+        outfile, count = exporter.export(args.PATH, args.OUTFILE, args.format, args.jobs)
+    except OSError as err:
+        logger.error("%s", err)
+        return 1
+    logger.info("Exported %d run records to %s", count, outfile)
+    return 0
+
+
+def find_conffile(conffile, namedconf):
+    """Return the configuration file to use, given the -f and -n options, or None on error"""
+    if conffile != '' and namedconf != '':
+        logger.error('Cannot specify both a configuration file and a built-in configuration')
+        return None
+    if conffile != '':
+        return conffile
+    if namedconf != '':
+        if namedconf not in configs.conf_index():
+            logger.error("%s not an available built-in configuration", namedconf)
+            return None
+        return configs.named_conf(namedconf)
+    return configs.config_path + "/hepscore-default.yaml"
+
+
+def rescore(args):
+    """`hep-score rescore`: re-score many result directories with a configuration."""
+    parser = argparse.ArgumentParser(
+        prog="hep-score rescore",
+        description="Recompute the scores of existing HEPscore result directories, using "
+                    "the ref_scores, weights and scaling of a (possibly different) "
+                    "configuration, and print them as a table.")
+    parser.add_argument("PATH", type=str, nargs='+',
+                        help="result directory, or directory to search for them.")
+    parser.add_argument("-f", "--conffile", default='',
+                        help="custom config yaml to use instead of default.")
+    parser.add_argument("-n", "--namedconf", default='',
+                        help="use specified named built-in benchmark configuration.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of processes parsing results (default: number of CPUs).")
+    parser.add_argument("-o", "--outfile", default='',
+                        help="write the table to this CSV file instead of stdout.")
+    args = parser.parse_args(args)
+
+    _setup_logging()
+    conffile = find_conffile(args.conffile, args.namedconf)
+    if conffile is None:
+        return 1
+
+    import hepscore.rescore as rescorer
+    confobj = configs.read_yaml(conffile)['hepscore_benchmark']
+    for benchmark in rescorer.active_benchmarks(confobj):
+        if 'ref_scores' not in confobj['benchmarks'][benchmark]:
+            logger.error("Configuration: ref_scores missing for %s", benchmark)
+            return 1
+
+    rows = rescorer.rescore(args.PATH, confobj, args.jobs)
+    if args.outfile:
+        rescorer.write_csv(rows, confobj, args.outfile)
+        logger.info("Wrote %d scores to %s", len(rows), args.outfile)
+    else:
+        print(rescorer.format_table(rows, confobj))
+    return 0 if all(row['status'] == 'success' for row in rows) else 2
+
+
+def campaign(args):
+    """`hep-score campaign`: run benchmarks on many hosts, through a shared directory."""
+    import hepscore.campaign as campaigns
+    parser = argparse.ArgumentParser(
+        prog="hep-score campaign",
+        description="Run a benchmark campaign over many hosts: the benchmarks are queued "
+                    "for each host in a campaign directory on a shared filesystem, run by "
+                    "a worker on each host, and scored per host once collected.")
+    actions = parser.add_subparsers(dest='action', metavar='ACTION')
+    actions.required = True
+    create = actions.add_parser('create', help="queue the benchmarks of a configuration "
+                                               "for hosts.")
+    create.add_argument("DIR", type=str, help="campaign directory.")
+    create.add_argument("HOST", type=str, nargs='+', help="host names.")
+    create.add_argument("-f", "--conffile", default='',
+                        help="custom config yaml to use instead of default.")
+    create.add_argument("-n", "--namedconf", default='',
+                        help="use specified named built-in benchmark configuration.")
+    create.add_argument("-m", "--container_exec", choices=list(RUNTIMES), default=None,
+                        help="container platform for benchmark execution.")
+    work = actions.add_parser('work', help="run the benchmarks queued for a host.")
+    work.add_argument("DIR", type=str, help="campaign directory.")
+    work.add_argument("--host", default=None,
+                      help="host name in the campaign (default: the node name).")
+    status = actions.add_parser('status', help="show the progress of each host.")
+    status.add_argument("DIR", type=str, help="campaign directory.")
+    requeue = actions.add_parser('requeue', help="requeue the benchmarks left running by "
+                                                 "workers that died.")
+    requeue.add_argument("DIR", type=str, help="campaign directory.")
+    requeue.add_argument("HOST", type=str, nargs='*', help="host names (default: all).")
+    collect = actions.add_parser('collect', help="score each host, writing "
+                                                 "DIR/reports/HOST.json.")
+    collect.add_argument("DIR", type=str, help="campaign directory.")
+    args = parser.parse_args(args)
+
+    _setup_logging()
+
+    try:
+        if args.action == 'create':
+            conffile = find_conffile(args.conffile, args.namedconf)
+            if conffile is None:
+                return 1
+            config = configs.read_yaml(conffile)
+            if args.container_exec is not None:
+                config['hepscore_benchmark']['settings']['container_exec'] = \
+                    args.container_exec
+            campaigns.create(args.DIR, config, args.HOST)
+        elif args.action == 'work':
+            campaigns.work(args.DIR, args.host)
+        elif args.action == 'status':
+            for host, counts in campaigns.Campaign(args.DIR).status().items():
+                print("%-32s pending %3d  running %3d  done %3d"
+                      % (host, counts['pending'], counts['running'], counts['done']))
+        elif args.action == 'requeue':
+            logger.info("Requeued %d benchmarks",
+                        campaigns.Campaign(args.DIR).requeue(args.HOST))
+        else:
+            reports = campaigns.Campaign(args.DIR).collect()
+            for host, report in reports.items():
+                print("%-32s %-10s %s" % (host, report['status'], report['score']))
+            return 0 if all(report['status'] == 'success' for report in reports.values()) \
+                else 2
+    except (OSError, ValueError) as err:
+        logger.error("%s", err)
+        return 1
+    return 0
+
+
+# Commands run as 'hep-score COMMAND ...', rather than running benchmarks
+SUBCOMMANDS = {'ingest': ingest, 'query': query, 'rescore': rescore, 'export': export,
+               'campaign': campaign}
+
+
 def main():
     """Command-line entry point. Parses arguments to construct configuration dict."""
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        sys.exit(SUBCOMMANDS[sys.argv[1]](sys.argv[2:]))
+
     args = parse_args(sys.argv[1:])
-    default_config = hepscore.config_path + "/hepscore-default.yaml"
+    default_config = configs.config_path + "/hepscore-default.yaml"
 
     user_args = {k: v for k, v in args.items() if v is not False}
-    vstring = ' '
-    vlevel = logging.INFO
-    if 'verbose' in user_args:
-        vstring = '.%(funcName)s() '
-        vlevel = logging.DEBUG
-    logging.basicConfig(format='%(asctime)s hepscore' + vstring + '[%(levelname)s] %(message)s',
-                        datefmt='%Y-%m-%d %H:%M:%S', level=vlevel)
+    _setup_logging('verbose' in user_args)
 
     if args['list']:
         print("Available built-in HEPscore benchmark configurations:")
-        for f in hepscore.list_named_confs():
-            print(f)
+        for name, entry in configs.conf_index(args['arch'] or None).items():
+            needs = entry['needs']
+            print("%-24s %-16s %d workloads, %d+ cores, %.0f GB image cache, "
+                  "%d MB/core output" % (name, entry['settings_name'], len(entry['workloads']),
+                                         needs['cores'], needs['image_cache_gb'],
+                                         needs['output_mb_per_core']))
         sys.exit(0)
 
     if args['conffile']!='' and args['namedconf']!='':
@@ -123,18 +371,29 @@ def main():
     if args['conffile']!='':
         conffile = args.pop('conffile')
     elif args['namedconf']!='':
-        if args['namedconf'] not in hepscore.list_named_confs():
+        if args['namedconf'] not in configs.conf_index():
             logging.error("%s not an available built-in configuration", args['namedconf'])
-        conffile = hepscore.named_conf(args.pop('namedconf'))
+        conffile = configs.named_conf(args.pop('namedconf'))
     else:
         conffile = default_config
 
-    active_config = hepscore.read_yaml(conffile)
+    profiler = None
+    if args['profile']:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    starttime = time.monotonic()
+    active_config = configs.read_yaml(conffile)
+    read_time = time.monotonic() - starttime
 
     if args['print']:
-        print(yaml.safe_dump(active_config, sort_keys=False))
+        print(configs.dump_yaml(active_config))
         sys.exit(0)
 
+    import signal
+    from hepscore.hepscore import HEPscore
+
     # Don't let users pass their dirs in conf object
     outdir = args.pop('OUTDIR', None)
 
@@ -145,6 +404,8 @@ def main():
 
     outtype = 'yaml' if 'yaml' in user_args else 'json'
     user_args.pop('yaml', None)
+    user_args.pop('profile', None)
+    user_args.pop('arch', None)
 
     # Populate active config with cli override
     if 'options' not in active_config['hepscore_benchmark']:
@@ -153,16 +414,17 @@ def main():
         active_config['hepscore_benchmark']['options'][arg] = user_args[arg]
 
 
-    # check replay outdir actually contains a run...
-    if args['replay']:
+    # check replay/resume outdir actually contains a run...
+    if args['replay'] or args['resume']:
         if not os.path.isdir(outdir):
-            print("Replay did not find a valid directory at " + outdir)
+            print(("Replay" if args['replay'] else "Resume") +
+                  " did not find a valid directory at " + outdir)
             sys.exit(1)
         else:
             resultsdir = outdir
     else:
         try:
-            resultsdir = os.path.join(outdir, hepscore.HEPscore.__name__ + '_' + \
+            resultsdir = os.path.join(outdir, HEPscore.__name__ + '_' + \
                 time.strftime("%d%b%Y_%H%M%S"))
             os.makedirs(resultsdir)
         except NotADirectoryError:
@@ -173,11 +435,20 @@ def main():
                          resultsdir)
             sys.exit(1)
 
-    hep_score = hepscore.HEPscore(active_config, resultsdir)
-
-    if hep_score.run(args['replay']) >= 0:
-        hep_score.gen_score()
-    hep_score.write_output(outtype, args['outfile'])
+    hep_score = HEPscore(active_config, resultsdir)
+    hep_score.record_phase('config', read_time)
+    # Terminate running containers and still report results on SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: hep_score.cancel())
+
+    try:
+        if hep_score.run(args['replay']) >= 0:
+            hep_score.gen_score()
+        hep_score.write_output(outtype, args['outfile'])
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args['profile'])
+            logger.info("Profile written to %s", args['profile'])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+planner.py - Preflight planning of HEPscore runs
+
+Before benchmarks run, their image cache space, output space, memory and
+duration needs are estimated from their args (threads, copies and events),
+and from the durations of the runs recorded in previous HEPscore outputs
+when given.  Needs are checked against the free space of the filesystems
+holding the image cache and the results, and against the available memory.
+
+Estimates are rough: disk space is scaled from the needs of HEPscore23 (see
+hepscore.config), and memory from a typical use per workload thread.
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import heapq
+import json
+import logging
+import os
+import re
+import shutil
+from hepscore.config import IMAGE_CACHE_GB, OUTPUT_MB_PER_CORE_RUN
+from hepscore.scoring import medians
+from hepscore.store import find_outputs, is_hepscore_output
+
+logger = logging.getLogger(__name__)
+
+# Memory used per workload thread, in MB
+MEMORY_MB_PER_THREAD = 1024
+# Duration of a run without previous runs to go by, in seconds: HEPscore23 takes
+# over 5 hours to run its 7 workloads 3 times
+DEFAULT_RUN_DURATION = 5 * 3600 / 21
+
+
+def run_history(paths):
+    """Return the runs of each workload recorded in the HEPscore outputs under paths
+
+    Returns:
+        dict: list of (duration in seconds, version, events arg) of the runs of
+        each workload, by workload
+    """
+    history = {}
+    for path in find_outputs(paths):
+        try:
+            with open(path) as jfile:
+                obj = json.load(jfile)
+        except (OSError, ValueError):
+            continue
+        if not is_hepscore_output(obj):
+            continue
+        for workload, bench_conf in obj['benchmarks'].items():
+            if not isinstance(bench_conf, dict) or 'result_cache' in bench_conf:
+                continue
+            events = bench_conf.get('args', {}).get('events')
+            for runstr, run in bench_conf.items():
+                if re.match(r'^run[0-9]+$', runstr) is None or not isinstance(run, dict):
+                    continue
+                phases = run.get('phases', {})
+                if 'run' in phases:
+                    duration = phases['run'] + phases.get('container_start', 0.0)
+                else:
+                    duration = run.get('duration')
+                if duration:
+                    history.setdefault(workload, []).append(
+                        (float(duration), bench_conf.get('version'), events))
+    return history
+
+
+def run_duration(bench_conf, runs):
+    """Return the median duration of previous runs of a benchmark, or None
+
+    Runs of the same version are preferred, and durations are scaled to the
+    number of events of bench_conf when both are known.
+
+    Args:
+        bench_conf (dict): benchmark configuration
+        runs (list): (duration, version, events) of previous runs, see run_history()
+    """
+    same_version = [run for run in runs if run[1] == bench_conf.get('version')]
+    durations = []
+    events = bench_conf.get('args', {}).get('events')
+    for duration, _, run_events in same_version or runs:
+        try:
+            if events and run_events:
+                duration *= float(events) / float(run_events)
+        except (TypeError, ValueError):
+            pass
+        durations.append(duration)
+    return medians([durations])[0] if durations else None
+
+
+def _int_arg(args, name, default):
+    """Return the integer value of args[name], or default if unset or not an integer"""
+    try:
+        return int(args[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def estimate(bench_conf, registry, runs, ncores, history=None, images=True):
+    """Return the estimated needs of a benchmark
+
+    Args:
+        bench_conf (dict): benchmark configuration
+        registry (str): registry the image of the benchmark comes from
+        runs (int): maximum number of runs of the benchmark
+        ncores (int): number of cores the benchmark runs on
+        history (list, optional): previous runs of the benchmark, see run_history()
+        images (bool): whether the runtime caches images, see
+                       ContainerRuntime.image_cache()
+
+    Returns:
+        dict: 'cores' used, space for its 'image_cache_mb' and 'output_mb',
+        'memory_mb', and 'duration' in seconds, with the 'duration_source'
+        ('history' or 'default')
+    """
+    args = bench_conf.get('args', {})
+    threads = max(1, _int_arg(args, 'threads', 1))
+    copies = max(1, _int_arg(args, 'copies', ncores // threads))
+    cores = copies * threads
+
+    per_run = run_duration(bench_conf, history) if history else None
+    source = 'history'
+    if per_run is None:
+        per_run = DEFAULT_RUN_DURATION
+        source = 'default'
+    if bench_conf.get('repetition_mode') != 'concurrent':
+        per_run *= runs
+
+    image = 0 if registry.startswith('dir://') or not images else IMAGE_CACHE_GB * 1024
+    return {'cores': cores,
+            'image_cache_mb': round(image),
+            'output_mb': round(OUTPUT_MB_PER_CORE_RUN * cores * runs),
+            'memory_mb': MEMORY_MB_PER_THREAD * cores,
+            'duration': round(per_run),
+            'duration_source': source}
+
+
+def _largest(estimates, key, count):
+    return sum(sorted((est[key] for est in estimates.values()), reverse=True)[:count])
+
+
+def makespan(durations, slots=1):
+    """Return the time taken to run jobs of durations on slots, longest first"""
+    ends = [0.0] * max(1, slots)
+    for duration in sorted(durations, reverse=True):
+        heapq.heapreplace(ends, ends[0] + duration)
+    return max(ends)
+
+
+def peak_needs(estimates, parallelism=1, clean_images=False, clean_files=False,
+               prefetch=True):
+    """Return the peak needs of running benchmarks
+
+    Images are kept until the end of the run, unless clean_images, when only
+    those of the running benchmarks (and of the next one, with prefetch) are.
+    Outputs are kept, unless clean_files, when only those of the running
+    benchmarks take significant space.
+
+    Args:
+        estimates (dict): estimate() of each benchmark, by name
+        parallelism (int): number of benchmarks run concurrently
+
+    Returns:
+        dict: 'image_cache_mb', 'output_mb', 'memory_mb', and 'duration' in seconds
+    """
+    slots = max(1, min(parallelism, len(estimates)))
+    images = _largest(estimates, 'image_cache_mb', len(estimates))
+    if clean_images:
+        images = _largest(estimates, 'image_cache_mb', slots + (1 if prefetch else 0))
+    outputs = _largest(estimates, 'output_mb', slots if clean_files else len(estimates))
+    return {'image_cache_mb': images,
+            'output_mb': outputs,
+            'memory_mb': _largest(estimates, 'memory_mb', slots),
+            'duration': round(makespan([est['duration'] for est in estimates.values()], slots))}
+
+
+def disk_shortfalls(needs):
+    """Return the filesystems without enough free space for needs
+
+    Needs of paths on the same filesystem add up.  Paths that do not exist yet
+    are on the filesystem of their closest existing parent.
+
+    Args:
+        needs (dict): MB needed, by path
+
+    Returns:
+        list[dict]: 'paths', MB 'needed' and 'free' of each filesystem short of space
+    """
+    filesystems = {}
+    for path, need in needs.items():
+        existing = os.path.abspath(path)
+        while not os.path.exists(existing):
+            existing = os.path.dirname(existing)
+        try:
+            device = os.stat(existing).st_dev
+            if device not in filesystems:
+                filesystems[device] = {'paths': [], 'needed': 0,
+                                       'free': shutil.disk_usage(existing).free // 2 ** 20}
+        except OSError as err:
+            logger.debug("Cannot check free space of %s: %s", path, err)
+            continue
+        filesystems[device]['paths'].append(path)
+        filesystems[device]['needed'] += need
+    return [fs for fs in filesystems.values() if fs['needed'] > fs['free']]
+
+
+def order_longest_first(estimates):
+    """Return the benchmarks, longest first: run concurrently, they finish soonest"""
+    return sorted(estimates, key=lambda bmk: estimates[bmk]['duration'], reverse=True)
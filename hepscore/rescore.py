@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+rescore.py - Batch re-scoring of HEPscore result directories
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import csv
+import glob
+import itertools
+import json
+import logging
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from hepscore.analysis import COPY_SPREAD_THRESHOLD, analyse_runs, reject_flagged
+from hepscore.hepscore import read_summary, repetition_bounds, run_score
+from hepscore.scoring import medians, weighted_geometric_means
+from hepscore.store import is_hepscore_output, result_record
+
+logger = logging.getLogger(__name__)
+
+
+def active_benchmarks(confobj):
+    """Return the benchmarks of a configuration that are not commented out"""
+    return [bmk for bmk in confobj['benchmarks'] if bmk[0] != '.']
+
+
+def find_resultsdirs(paths, benchmarks):
+    """Yield the HEPscore result directories under paths
+
+    A result directory is one containing a directory named after one of
+    benchmarks; result directories are not searched further.
+
+    Args:
+        paths (list[str]): result directories, or directories to search
+        benchmarks (list[str]): benchmark names
+
+    Yields:
+        str: path to a result directory
+    """
+    for path in paths:
+        for dirpath, dirnames, _ in os.walk(path):
+            if any(bmk in dirnames for bmk in benchmarks):
+                dirnames[:] = []
+                yield dirpath
+                continue
+            dirnames[:] = sorted(d for d in dirnames
+                                 if d != 'scache' and re.match(r'^run[0-9]+$', d) is None)
+
+
+def result_host(resultsdir):
+    """Return the host recorded in the HEPscore output of resultsdir, or None"""
+    for path in sorted(glob.glob(resultsdir + "/*.json")):
+        if path.endswith('.progress.json'):
+            continue
+        try:
+            with open(path) as jfile:
+                obj = json.load(jfile)
+        except (OSError, ValueError):
+            continue
+        if is_hepscore_output(obj):
+            return result_record(obj)['host']
+    return None
+
+
+def rescore_dir(resultsdir, confobj, scorekey='wl-scores'):
+    """Score the runs of each benchmark of confobj from the summaries in resultsdir
+
+    With the reject_flagged_runs setting, the flagged runs of each benchmark
+    are left out, as in a HEPscore run.
+
+    Args:
+        resultsdir (str): HEPscore result directory
+        confobj (dict): 'hepscore_benchmark' section of the configuration
+        scorekey (str): key of the scores in the summary reports
+
+    Returns:
+        dict: 'resultsdir', 'host', and under 'runs' the list of run scores of
+        each benchmark, or None if it does not have the configured number of runs
+    """
+    min_runs, max_runs, _ = repetition_bounds(confobj['settings'])
+    reject = confobj['settings'].get('reject_flagged_runs', False)
+    spread_threshold = float(confobj['settings'].get('copy_spread_threshold',
+                                                     COPY_SPREAD_THRESHOLD))
+    runs = {}
+    for benchmark in active_benchmarks(confobj):
+        bench_conf = confobj['benchmarks'][benchmark]
+        summary = bench_conf.get('results_file', benchmark + '_summary.json')
+
+        results = {}
+        stats = {}
+        for gpath in glob.glob(resultsdir + "/" + benchmark + "/run*/" + summary):
+            rundir = os.path.basename(os.path.dirname(gpath))
+            if re.match(r'^run[0-9]+$', rundir) is None:
+                continue
+            jscore = read_summary(gpath, scorekey)
+            if jscore is None:
+                continue
+            run = int(rundir[3:])
+            try:
+                results[run] = run_score(jscore['report'][scorekey], bench_conf['ref_scores'])
+            except KeyError as sub_bmk:
+                logger.error("Sub-score not reported for %s in %s", sub_bmk.args[0], gpath)
+                continue
+            stats[run] = jscore['report'].get('wl-stats')
+
+        if results and min_runs <= len(results) <= max_runs:
+            if reject:
+                _, flagged = analyse_runs(results, stats, spread_threshold)
+                results = reject_flagged(results, flagged)
+            runs[benchmark] = [results[run] for run in sorted(results)]
+        else:
+            logger.warning("%s: expected %d to %d valid runs of %s, found %d", resultsdir,
+                           min_runs, max_runs, benchmark, len(results))
+            runs[benchmark] = None
+
+    return {'resultsdir': resultsdir, 'host': result_host(resultsdir), 'runs': runs}
+
+
+def score_rows(rows, confobj):
+    """Compute the benchmark and final scores of rows returned by rescore_dir(), in place
+
+    The median run score of each benchmark is added under 'wl-scores', and
+    the final score and status under 'score' and 'status'.  All rows are
+    scored at once.
+
+    Args:
+        rows (list[dict]): rescore_dir() results
+        confobj (dict): 'hepscore_benchmark' section of the configuration
+    """
+    benchmarks = active_benchmarks(confobj)
+    weights = [float(confobj['benchmarks'][bmk].get('weight', 1.0)) for bmk in benchmarks]
+    scaling = float(confobj['settings'].get('scaling', 1.0))
+
+    runs = [row['runs'][bmk] or [] for row in rows for bmk in benchmarks]
+    wl_scores = medians(runs)
+    matrix = [[None if math.isnan(val) else val
+               for val in wl_scores[i * len(benchmarks):(i + 1) * len(benchmarks)]]
+              for i in range(len(rows))]
+
+    for row, scores, score in zip(rows, matrix, weighted_geometric_means(matrix, weights)):
+        row['wl-scores'] = dict(zip(benchmarks, scores))
+        if math.isnan(score):
+            row['score'] = -1
+            row['status'] = 'failed'
+        else:
+            row['score'] = round(score * scaling, 4)
+            row['status'] = 'success'
+
+
+def rescore(paths, confobj, jobs=None):
+    """Re-score all the HEPscore result directories under paths with confobj
+
+    Summaries are parsed by a pool of jobs processes.
+
+    Args:
+        paths (list[str]): result directories, or directories to search
+        confobj (dict): 'hepscore_benchmark' section of the configuration,
+                        providing ref_scores, weights and scaling
+        jobs (int, optional): number of processes. Defaults to the number of CPUs.
+
+    Returns:
+        list[dict]: 'resultsdir', 'host', 'wl-scores', 'score' and 'status' of
+        each result directory, ordered by directory
+    """
+    resultsdirs = sorted(set(find_resultsdirs(paths, active_benchmarks(confobj))))
+    if not resultsdirs:
+        return []
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunksize = max(1, len(resultsdirs) // (4 * (jobs or os.cpu_count() or 1)))
+        rows = list(pool.map(rescore_dir, resultsdirs, itertools.repeat(confobj),
+                             chunksize=chunksize))
+
+    score_rows(rows, confobj)
+    return rows
+
+
+def table(rows, confobj):
+    """Return rescore() results as a list of table rows, starting with the header"""
+    benchmarks = active_benchmarks(confobj)
+    lines = [['resultsdir', 'host', 'score', 'status'] + benchmarks]
+    for row in rows:
+        lines.append([row['resultsdir'], row['host'] or '', row['score'], row['status']]
+                     + ['' if row['wl-scores'][bmk] is None else row['wl-scores'][bmk]
+                        for bmk in benchmarks])
+    return lines
+
+
+def write_csv(rows, confobj, outfile):
+    """Write rescore() results to outfile as CSV"""
+    with open(outfile, mode='w', newline='') as cfile:
+        csv.writer(cfile).writerows(table(rows, confobj))
+
+
+def format_table(rows, confobj):
+    """Return rescore() results as a text table, with aligned columns"""
+    lines = [[str(val) for val in line] for line in table(rows, confobj)]
+    widths = [max(len(line[col]) for line in lines) for col in range(len(lines[0]))]
+    return '\n'.join('  '.join(val.ljust(widths[col]) for col, val in enumerate(line)).rstrip()
+                     for line in lines)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+resultcache.py - Cache of benchmark results, to skip re-running identical workloads
+
+Entries are directories named after the digest of the fields identifying a
+workload run (see HEPscore._cache_fields), holding the summary JSON of each
+run, as run<N>.json, and the entry metadata, as meta.json.
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from hepscore import __version__
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                            'hepscore', 'results')
+
+
+def cache_key(fields):
+    """Return the cache key of the JSON-serializable fields identifying a workload run"""
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache():
+    """Directory of cached benchmark run summaries, valid for ttl seconds."""
+
+    def __init__(self, path=RESULT_CACHE, ttl=86400.0):
+        self.path = path
+        self.ttl = ttl
+
+    def lookup(self, key):
+        """Return the metadata of the entry for key, or None if missing or expired
+
+        Returns:
+            dict: entry metadata, with its 'age' in seconds
+        """
+        try:
+            with open(os.path.join(self.path, key, 'meta.json'), mode='r') as mfile:
+                meta = json.load(mfile)
+        except (OSError, ValueError):
+            return None
+        meta['age'] = time.time() - meta['created']
+        if not 0 <= meta['age'] <= self.ttl:
+            logger.debug("Cached results %s expired", key)
+            return None
+        return meta
+
+    def restore(self, key, destdir, summary, start=0):
+        """Copy the run summaries of the entry for key to destdir/run<N>/summary
+
+        Runs are numbered from start, so that the run directories already in
+        destdir, such as those of failed runs being resumed, are left alone.
+        Nothing is left in destdir if a summary fails to be copied.
+
+        Raises:
+            OSError: if the entry cannot be read, or a summary copied
+
+        Returns:
+            int: number of runs restored
+        """
+        entry = os.path.join(self.path, key)
+        rundirs = []
+        try:
+            for filename in sorted(os.listdir(entry)):
+                if filename.startswith('run') and filename.endswith('.json'):
+                    rundir = os.path.join(destdir, 'run' + str(start + len(rundirs)))
+                    os.makedirs(rundir)
+                    rundirs.append(rundir)
+                    shutil.copyfile(os.path.join(entry, filename),
+                                    os.path.join(rundir, summary))
+        except OSError:
+            for rundir in rundirs:
+                shutil.rmtree(rundir, ignore_errors=True)
+            raise
+        return len(rundirs)
+
+    def store(self, key, fields, summaries, source):
+        """Cache the run summaries of a workload, replacing any previous entry for key
+
+        Args:
+            key (str): cache key of fields
+            fields (dict): fields identifying the workload run
+            summaries (dict): summary JSON paths, by run index
+            source (str): result directory the summaries come from
+        """
+        entry = os.path.join(self.path, key)
+        tmp_entry = entry + '.' + str(os.getpid())
+        try:
+            os.makedirs(tmp_entry)
+            for i, path in summaries.items():
+                shutil.copyfile(path, os.path.join(tmp_entry, 'run' + str(i) + '.json'))
+            now = time.time()
+            with open(os.path.join(tmp_entry, 'meta.json'), mode='w') as mfile:
+                json.dump({'created': now, 'created_at': time.ctime(now), 'source': source,
+                           'hepscore_ver': __version__, 'fields': fields}, mfile)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            os.rename(tmp_entry, entry)
+        except OSError as err:
+            logger.warning("Failed to cache results in %s: %s", entry, err)
+            shutil.rmtree(tmp_entry, ignore_errors=True)
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+runtime.py - Container runtimes used to run HEPscore benchmarks
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import sys
+from hepscore import __version__
+
+logger = logging.getLogger(__name__)
+
+# Cached container engine capabilities
+ENGINE_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                            'hepscore', 'engines.json')
+
+UNKNOWN_ENGINE = {'implementation': 'unknown', 'version': '0.0', 'unsquash': False}
+
+
+def _engine_command(command):
+    """Return the output lines of a container engine command"""
+    # Imported here, as it is only needed when probing engines
+    import subprocess
+    proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          check=False)
+    return proc.stdout.decode('utf-8', errors='replace').splitlines()
+
+
+def _probe_engine(cec):
+    """Run the container engine commands determining its capabilities"""
+    caps = dict(UNKNOWN_ENGINE)
+    for line in _engine_command([cec, '--version']):
+        dline_ver = re.sub(r'^[^0-9]*', '', line)
+        if len(dline_ver) > 0 and dline_ver[0].isdigit():
+            caps['implementation'] = cec
+            caps['version'] = dline_ver.strip()
+            if cec == 'singularity' and 'apptainer' in line:
+                caps['implementation'] = 'apptainer'
+            break
+    else:
+        return caps
+
+    if cec == 'docker':
+        if any('podman' in line for line in _engine_command(['docker', '--help'])):
+            caps['implementation'] = 'podman'
+    elif caps['implementation'] == 'apptainer':
+        caps['unsquash'] = any('--unsquash' in line
+                               for line in _engine_command([cec, 'run', '--help']))
+    return caps
+
+
+def probe_engine(cec):
+    """Return the implementation, version and capabilities of a container engine
+
+    Probing runs the engine several times, so results are cached in
+    ENGINE_CACHE, keyed by the path and modification time of the engine binary.
+
+    Args:
+        cec (str): container engine command, eg 'singularity' or 'docker'
+
+    Returns:
+        dict: 'implementation' (eg 'apptainer' or 'podman'), 'version', and
+        whether the --unsquash option is supported under 'unsquash'
+    """
+    binary = shutil.which(cec)
+    if binary is None:
+        logger.error("Could not locate %s on the system. Please check your path!", cec)
+        return dict(UNKNOWN_ENGINE)
+
+    binary = os.path.realpath(binary)
+    try:
+        key = cec + ':' + binary + ':' + str(os.stat(binary).st_mtime)
+    except OSError:
+        key = None
+
+    cache = {}
+    try:
+        with open(ENGINE_CACHE, mode='r') as cfile:
+            cache = json.load(cfile)
+    except (OSError, ValueError):
+        pass
+    if key in cache:
+        logger.debug("Using cached %s capabilities: %s", cec, cache[key])
+        return cache[key]
+
+    import subprocess
+    try:
+        caps = _probe_engine(cec)
+    except (OSError, subprocess.SubprocessError):
+        logger.error("Error fetching %s version", cec)
+        return dict(UNKNOWN_ENGINE)
+
+    if key is not None and caps['implementation'] != 'unknown':
+        # Drop entries for replaced binaries
+        cache = {k: v for k, v in cache.items() if not k.startswith(cec + ':' + binary + ':')}
+        cache[key] = caps
+        tmp_path = ENGINE_CACHE + '.' + str(os.getpid())
+        try:
+            os.makedirs(os.path.dirname(ENGINE_CACHE), exist_ok=True)
+            with open(tmp_path, mode='w') as cfile:
+                json.dump(cache, cfile)
+            os.replace(tmp_path, ENGINE_CACHE)
+        except OSError:
+            logger.debug("Cannot write container engine cache %s", ENGINE_CACHE)
+    return caps
+
+
+def userns_supported():
+    """Checks for user namespace support for Singularity.
+
+    Returns:
+        bool: singularity namespace support
+    """
+    proc_muns = "/proc/sys/user/max_user_namespaces"
+    dockerenv = "/.dockerenv"
+    podmanenv = "/run/.containerenv"
+
+    if os.path.isfile(dockerenv) or os.path.isfile(podmanenv):
+        logger.debug("Running inside of Docker. Not enabling user namespaces.")
+        return False
+
+    try:
+        with open(proc_muns, mode='r') as userns_file:
+            max_usrns = int(userns_file.read())
+        return bool(max_usrns)
+    except OSError:
+        logger.debug("Cannot open/read from %s, assuming user namespace support disabled",
+                     proc_muns)
+        return False
+
+
+def cpuset_string(cpus):
+    """Format CPU ids as a cpuset list, as accepted by taskset and docker
+
+    Args:
+        cpus (list[int]): CPU ids
+
+    Returns:
+        str: ranges of consecutive ids, eg "0-3,8"
+    """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(lo) if lo == hi else str(lo) + '-' + str(hi) for lo, hi in ranges)
+
+
+class ContainerRuntime:
+    """A container engine benchmarks are run with.
+
+    Attributes:
+        name (str): 'container_exec' setting selecting the runtime
+        family (str): 'singularity' for engines running SIF images from a local
+            cache, 'docker' for OCI engines, 'local' for runtimes without images
+        registry_uris (tuple): registry URIs images can be fetched from
+    """
+    name = None
+    family = None
+    registry_uris = ('docker', 'shub', 'dir', 'oras', 'https')
+
+    def __init__(self, userns=False):
+        """
+        Args:
+            userns (bool): Run containers in a user namespace, if supported
+        """
+        self.userns = userns
+        self._caps = None
+        self._userns_support = None
+
+    def probe(self):
+        """Return the capabilities of the engine (see probe_engine), probing it only once"""
+        if self._caps is None:
+            self._caps = probe_engine(self.name)
+        return self._caps
+
+    def version(self):
+        """Return the implementation and version of the engine
+
+        Returns:
+            list[str]: implementation (eg 'apptainer') and version
+        """
+        caps = self.probe()
+        return [caps['implementation'], caps['version']]
+
+    def check_userns(self):
+        """Return whether the host supports user namespaces, checking it only once"""
+        if self._userns_support is None:
+            self._userns_support = userns_supported()
+        return self._userns_support
+
+    def registry(self, uri, reg_url, reg_path):
+        """Return the registry prefix of image names.
+
+        Args:
+            uri (str): registry URI, eg 'docker'
+            reg_url (str): registry, with URI
+            reg_path (str): registry, without URI
+
+        Returns:
+            str: registry prefix
+        """
+        return reg_path if uri == 'dir' else reg_url
+
+    def pull_command(self, image, pulldir):
+        """Return the command fetching image into the local cache, or None if not needed
+
+        Args:
+            image (str): full image name
+            pulldir (str): directory the command may write (and is then removed)
+        """
+        return None
+
+    def rm_command(self, image):
+        """Return the command removing image from the local cache, or None"""
+        return None
+
+    def image_cache(self):
+        """Return the directory images are stored in by default, or None without images"""
+        return None
+
+    def run_command(self, image, options, run_dir, cpus=None, bench_conf=None):
+        """Return the command running a benchmark container.
+
+        Args:
+            image (str): full image name
+            options (list[str]): benchmark options
+            run_dir (str): directory the benchmark writes its results to
+            cpus (list[int], optional): CPUs to pin the container to
+            bench_conf (dict, optional): benchmark configuration
+
+        Returns:
+            list[str]: command
+        """
+        raise NotImplementedError
+
+    def prepare_run_dir(self, run_dir):
+        """Make run_dir usable by the container, before it runs"""
+
+    def finish_run_dir(self, run_dir):
+        """Restore run_dir permissions, after the container ran"""
+
+
+class SingularityRuntime(ContainerRuntime):
+    name = 'singularity'
+    family = 'singularity'
+
+    def unsquash(self):
+        """Return whether --unsquash is used: apptainer supporting it, with user namespaces"""
+        caps = self.probe()
+        return caps['implementation'] == 'apptainer' and caps['unsquash'] and \
+            self.check_userns()
+
+    def pull_command(self, image, pulldir):
+        if image.find('://') <= 0:
+            return None
+        # Pull to a throwaway file: the run then finds the image in the cache
+        return [self.name, 'pull', '--force', '--dir', pulldir, image]
+
+    def image_cache(self):
+        for var in ('APPTAINER_CACHEDIR', 'SINGULARITY_CACHEDIR'):
+            if os.environ.get(var):
+                return os.environ[var]
+        return os.path.expanduser('~/.' + self.name + '/cache')
+
+    def run_command(self, image, options, run_dir, cpus=None, bench_conf=None):
+        bench_conf = bench_conf or {}
+        command = []
+        if cpus is not None:
+            command += ['taskset', '-c', cpuset_string(cpus)]
+        command += [self.name, 'run', '-i', '-c', '-e', '-B', run_dir + ':/results', '-B', '/tmp']
+        if self.unsquash():
+            logger.debug("Enabling --unsquash flag in singularity call")
+            command.append('--unsquash')
+        if self.userns is True and self.check_userns():
+            logger.debug("System supports user namespaces, enabling in singularity call")
+            command.append('-u')
+        if bench_conf.get('gpu') is True:
+            command.append('--nv')
+        return command + [image] + options
+
+
+class ApptainerRuntime(SingularityRuntime):
+    name = 'apptainer'
+
+
+class DockerRuntime(ContainerRuntime):
+    name = 'docker'
+    family = 'docker'
+    registry_uris = ('docker',)
+
+    def registry(self, uri, reg_url, reg_path):
+        return reg_path
+
+    def pull_command(self, image, pulldir):
+        return [self.name, 'pull', image]
+
+    def rm_command(self, image):
+        return [self.name, 'rmi', '-f', image]
+
+    def image_cache(self):
+        return '/var/lib/docker'
+
+    def run_command(self, image, options, run_dir, cpus=None, bench_conf=None):
+        bench_conf = bench_conf or {}
+        command = [self.name, 'run', '--rm', '--network=host', '-v', run_dir + ':/results']
+        if cpus is not None:
+            command.append('--cpuset-cpus=' + cpuset_string(cpus))
+        if bench_conf.get('gpu') is True:
+            command += ['--gpus', 'all']
+        return command + [image] + options
+
+    def prepare_run_dir(self, run_dir):
+        os.chmod(run_dir, stat.S_ISVTX | stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+
+    def finish_run_dir(self, run_dir):
+        os.chmod(run_dir, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP |
+                 stat.S_IROTH | stat.S_IXOTH)
+
+
+class PodmanRuntime(DockerRuntime):
+    name = 'podman'
+
+    def image_cache(self):
+        if os.geteuid() == 0:
+            return '/var/lib/containers/storage'
+        return os.path.expanduser('~/.local/share/containers/storage')
+
+
+class FakeRuntime(ContainerRuntime):
+    """Runs hepscore.fake_workload instead of containers, to exercise HEPscore itself.
+
+    The benchmark 'args' select the behaviour of the fake workload: see
+    hepscore.fake_workload for the options.
+    """
+    name = 'fake'
+    family = 'local'
+
+    def probe(self):
+        return {'implementation': 'fake', 'version': __version__, 'unsquash': False}
+
+    def registry(self, uri, reg_url, reg_path):
+        return reg_url
+
+    def run_command(self, image, options, run_dir, cpus=None, bench_conf=None):
+        bench_conf = bench_conf or {}
+        benchmark = image.rsplit('/', 1)[-1].split(':')[0]
+        command = [sys.executable, '-m', 'hepscore.fake_workload',
+                   '--resultsdir', run_dir,
+                   '--summary', bench_conf.get('results_file', benchmark + '_summary.json'),
+                   '--ref-scores', json.dumps(bench_conf.get('ref_scores', {}))]
+        if cpus is not None:
+            command += ['--cpus', cpuset_string(cpus)]
+        return command + [image] + options
+
+
+# Runtimes, by 'container_exec' setting
+RUNTIMES = {runtime.name: runtime for runtime in (SingularityRuntime, ApptainerRuntime,
+                                                   DockerRuntime, PodmanRuntime, FakeRuntime)}
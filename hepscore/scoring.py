@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+scoring.py - HEPscore score computation
+
+Weighted geometric means are computed in log-space, so that many scores or
+large weights do not overflow or underflow.  Scores of many hosts are
+computed at once with NumPy when it is installed, and in pure Python
+otherwise.
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import math
+import operator
+import warnings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def median_tuple(vals):
+    """Return median of vals
+
+    Args:
+        vals (dict): A dict of benchmark scores
+
+    Returns:
+        2-tuple (result final, result run): median, and the key of the median
+        value, or the keys of the two values averaged for an even count
+    """
+    sorted_vals = sorted(vals.items(), key=operator.itemgetter(1))
+
+    med_ind = int(len(sorted_vals) / 2)
+    if len(sorted_vals) % 2 == 1:
+        return sorted_vals[med_ind][::-1]
+    val1 = sorted_vals[med_ind - 1][1]
+    val2 = sorted_vals[med_ind][1]
+    return ((val1 + val2) / 2.0), (sorted_vals[med_ind - 1][0], sorted_vals[med_ind][0])
+
+
+def _log_mean(vals, weights, total_weight):
+    """Return the weighted mean of the logarithms of vals, or None if a value is not positive"""
+    total = 0.0
+    for val, weight in zip(vals, weights):
+        if val is None or math.isnan(val) or val < 0:
+            return None
+        if weight == 0:
+            continue
+        if val == 0:
+            return -math.inf
+        total += weight * math.log(val)
+    return total / total_weight
+
+
+def weighted_geometric_mean(vals, weights=None):
+    """Return geometric mean of floats, with optional weighting
+
+    Args:
+        vals (list[float]): List of float(scores)
+        weights (list[float], optional): Weight of each score. Defaults to None (equal weights).
+
+    Returns:
+        float: the weighted geometric mean; 0 if the lengths of vals and
+        weights differ or the weights sum to 0, and NaN if a score is negative
+    """
+    if weights is None:
+        weights = [1.0] * len(vals)
+
+    if len(vals) != len(weights):
+        return 0
+
+    vals = [float(x) for x in vals]
+    weights = [float(x) for x in weights]
+
+    total_weight = sum(weights)
+    if total_weight == 0:
+        return 0
+
+    log_mean = _log_mean(vals, weights, total_weight)
+    if log_mean is None:
+        return math.nan
+    return math.exp(log_mean)
+
+
+def weighted_geometric_means(matrix, weights=None):
+    """Return the weighted geometric mean of each row of a hosts x workloads matrix
+
+    Args:
+        matrix (list[list[float]]): scores of each host; None marks a missing score
+        weights (list[float], optional): Weight of each workload. Defaults to None
+                                         (equal weights).
+
+    Returns:
+        list[float]: geometric mean of each row, NaN for rows with missing or
+        negative scores
+    """
+    if not matrix:
+        return []
+    nworkloads = len(matrix[0])
+    if weights is None:
+        weights = [1.0] * nworkloads
+    if any(len(row) != nworkloads for row in matrix) or len(weights) != nworkloads:
+        raise ValueError("Every row must have one score per weight")
+    total_weight = float(sum(weights))
+    if total_weight == 0:
+        return [0.0] * len(matrix)
+
+    if numpy is not None:
+        scores = numpy.array([[numpy.nan if val is None else val for val in row]
+                              for row in matrix], dtype=float)
+        weights = numpy.array(weights, dtype=float)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            invalid = numpy.isnan(scores).any(axis=1) | (scores < 0).any(axis=1)
+            logs = numpy.where(weights > 0, numpy.log(scores), 0.0)
+            means = numpy.exp(logs @ weights / total_weight)
+        means[invalid] = numpy.nan
+        return means.tolist()
+
+    weights = [float(weight) for weight in weights]
+    means = []
+    for row in matrix:
+        log_mean = _log_mean(row, weights, total_weight)
+        means.append(math.nan if log_mean is None else math.exp(log_mean))
+    return means
+
+
+def medians(runs):
+    """Return the median of each list of run scores
+
+    Args:
+        runs (list[list[float]]): run scores of each host (or workload); lists may differ
+                                  in length
+
+    Returns:
+        list[float]: median of each list, NaN for empty lists
+    """
+    if numpy is not None and runs:
+        width = max(len(row) for row in runs)
+        if width == 0:
+            return [math.nan] * len(runs)
+        scores = numpy.full((len(runs), width), numpy.nan)
+        for i, row in enumerate(runs):
+            scores[i, :len(row)] = row
+        with warnings.catch_warnings():
+            # All-NaN rows
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return numpy.nanmedian(scores, axis=1).tolist()
+
+    return [median_tuple(dict(enumerate(row)))[0] if row else math.nan for row in runs]
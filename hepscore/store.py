@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+store.py - Indexed store of HEPscore results
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL,
+    name TEXT,
+    host TEXT,
+    cpu_model TEXT,
+    arch TEXT,
+    config_hash TEXT,
+    hepscore_ver TEXT,
+    start_at TEXT,
+    score REAL,
+    status TEXT,
+    ingested_at REAL
+);
+CREATE TABLE IF NOT EXISTS wl_scores (
+    result_id INTEGER NOT NULL REFERENCES results(id) ON DELETE CASCADE,
+    workload TEXT NOT NULL,
+    sub_score TEXT NOT NULL,
+    score REAL,
+    reference REAL
+);
+CREATE INDEX IF NOT EXISTS results_host ON results(host);
+CREATE INDEX IF NOT EXISTS results_cpu_model ON results(cpu_model);
+CREATE INDEX IF NOT EXISTS results_config_hash ON results(config_hash);
+CREATE INDEX IF NOT EXISTS results_hepscore_ver ON results(hepscore_ver);
+CREATE INDEX IF NOT EXISTS wl_scores_workload ON wl_scores(workload, sub_score);
+CREATE INDEX IF NOT EXISTS wl_scores_result ON wl_scores(result_id);
+"""
+
+# Columns of the results table that queries can be filtered on
+FILTERS = ('host', 'cpu_model', 'config_hash', 'hepscore_ver', 'name', 'status')
+
+
+def is_hepscore_output(obj):
+    """Return whether obj is a HEPscore output, as written by HEPscore.write_output()"""
+    return isinstance(obj, dict) and \
+        all(isinstance(obj.get(key), dict) for key in ('benchmarks', 'settings', 'app_info'))
+
+
+def result_record(obj):
+    """Extract the indexed fields from a HEPscore output
+
+    Args:
+        obj (dict): HEPscore output
+
+    Returns:
+        dict: values of the results table columns, and the list of
+        (workload, sub_score, score, reference) tuples under 'wl_scores'
+    """
+    env = obj.get('environment', {})
+    host = env.get('host')
+    if host is None:
+        # Older outputs only record the joined uname fields
+        system = env.get('system', '').split(' ')
+        host = system[1] if len(system) > 1 else None
+
+    wl_scores = []
+    for workload, scores in obj.get('wl-scores', {}).items():
+        for sub_score, val in scores.items():
+            if sub_score.endswith('_ref'):
+                continue
+            wl_scores.append((workload, sub_score, val, scores.get(sub_score + '_ref')))
+
+    return {'name': obj['settings'].get('name'),
+            'host': host,
+            'cpu_model': env.get('cpu_model'),
+            'arch': env.get('arch'),
+            'config_hash': obj['app_info'].get('config_hash'),
+            'hepscore_ver': obj['app_info'].get('hepscore_ver'),
+            'start_at': env.get('start_at', env.get('date')),
+            'score': obj.get('score'),
+            'status': obj.get('status'),
+            'wl_scores': wl_scores}
+
+
+def find_outputs(paths):
+    """Yield the JSON files under paths that may be HEPscore outputs
+
+    Benchmark run directories, the Singularity cache, progress journals and
+    partial summaries are skipped.
+
+    Args:
+        paths (list[str]): output files, or directories to search
+
+    Yields:
+        str: path to a JSON file
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames
+                           if d != 'scache' and re.match(r'^run[0-9]+$', d) is None]
+            for filename in sorted(filenames):
+                if filename.endswith('.json') and \
+                        not filename.endswith(('.progress.json', '.partial.json')):
+                    yield os.path.join(dirpath, filename)
+
+
+class ResultsStore:
+    """SQLite database of HEPscore results, indexed for fleet-wide queries."""
+
+    def __init__(self, dbpath):
+        """Open, creating if needed, the results database at dbpath.
+
+        Args:
+            dbpath (str): Path to the SQLite database file
+        """
+        self.dbpath = dbpath
+        self.conn = sqlite3.connect(dbpath)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingest(self, paths):
+        """Load the HEPscore outputs found under paths.
+
+        Outputs already in the store are only reloaded if modified since.
+
+        Args:
+            paths (list[str]): output files, or directories to search
+
+        Returns:
+            int: number of outputs loaded
+        """
+        loaded = 0
+        known = dict(self.conn.execute("SELECT path, mtime FROM results"))
+        with self.conn:
+            for path in find_outputs(paths):
+                path = os.path.abspath(path)
+                try:
+                    mtime = os.path.getmtime(path)
+                    if known.get(path) == mtime:
+                        continue
+                    with open(path) as jfile:
+                        obj = json.load(jfile)
+                except (OSError, ValueError):
+                    logger.warning("Skipping unreadable file %s", path)
+                    continue
+                if not is_hepscore_output(obj):
+                    logger.debug("Skipping %s: not a HEPscore output", path)
+                    continue
+
+                record = result_record(obj)
+                wl_scores = record.pop('wl_scores')
+                self.conn.execute("DELETE FROM results WHERE path = ?", (path,))
+                cur = self.conn.execute(
+                    "INSERT INTO results (path, mtime, ingested_at, " + ', '.join(record)
+                    + ") VALUES (?, ?, ?" + ", ?" * len(record) + ")",
+                    [path, mtime, time.time()] + list(record.values()))
+                self.conn.executemany(
+                    "INSERT INTO wl_scores (result_id, workload, sub_score, score, reference) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(cur.lastrowid,) + row for row in wl_scores])
+                loaded += 1
+        return loaded
+
+    def workload_scores(self, workload, sub_score=None, **filters):
+        """Return the scores recorded for a workload.
+
+        Args:
+            workload (str): benchmark name
+            sub_score (str, optional): restrict to this sub-score
+            **filters: restrict to results with these column values (see FILTERS)
+
+        Returns:
+            list[float]: scores, in ascending order
+        """
+        query = "SELECT w.score FROM wl_scores w JOIN results r ON w.result_id = r.id " \
+                "WHERE w.workload = ? AND w.score IS NOT NULL"
+        params = [workload]
+        if sub_score is not None:
+            query += " AND w.sub_score = ?"
+            params.append(sub_score)
+        for key, val in filters.items():
+            if key not in FILTERS:
+                raise ValueError("Cannot filter on " + key)
+            if val is not None:
+                query += " AND r." + key + " = ?"
+                params.append(val)
+        query += " ORDER BY w.score"
+        return [row[0] for row in self.conn.execute(query, params)]
+
+    def workload_distribution(self, workload, sub_score=None, **filters):
+        """Return summary statistics of the scores recorded for a workload.
+
+        Args: as for workload_scores()
+
+        Returns:
+            dict: count, min, median, max and avg of the scores
+        """
+        scores = self.workload_scores(workload, sub_score, **filters)
+        if not scores:
+            return {'count': 0}
+        mid = len(scores) // 2
+        median = scores[mid] if len(scores) % 2 else (scores[mid - 1] + scores[mid]) / 2.0
+        return {'count': len(scores), 'min': scores[0], 'median': median,
+                'max': scores[-1], 'avg': sum(scores) / len(scores)}
+
+    def workloads(self):
+        """Return the names of the workloads in the store"""
+        return [row[0] for row in
+                self.conn.execute("SELECT DISTINCT workload FROM wl_scores ORDER BY workload")]
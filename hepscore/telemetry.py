@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+telemetry.py - Host resource sampling during benchmark runs
+
+Copyright 2019-2021 CERN. See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+
+
+import glob
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fields of each sample of the recorded series
+FIELDS = ['t', 'cpu_util_pct', 'cpu_freq_mhz', 'mem_used_mb', 'disk_read_mb_s',
+          'disk_write_mb_s']
+# Maximum number of points kept in the recorded series
+MAX_POINTS = 120
+SECTOR_BYTES = 512
+
+
+def read_cpu_times():
+    """Return the busy and total CPU time of the host, in clock ticks, from /proc/stat"""
+    with open('/proc/stat') as stat:
+        fields = [int(val) for val in stat.readline().split()[1:]]
+    # user nice system idle iowait irq softirq steal (guest times are included in user)
+    total = sum(fields[:8])
+    return total - fields[3] - fields[4], total
+
+
+def read_cpu_freqs():
+    """Return the current frequency of each core, in MHz"""
+    freqs = []
+    for path in glob.glob('/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq'):
+        try:
+            with open(path) as freq:
+                freqs.append(int(freq.read()) / 1000.0)
+        except (OSError, ValueError):
+            continue
+    if freqs:
+        return freqs
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            return [float(line.split(':')[1]) for line in cpuinfo
+                    if line.startswith('cpu MHz')]
+    except (OSError, ValueError):
+        return []
+
+
+def read_memory():
+    """Return the total and available memory of the host, in MB, from /proc/meminfo"""
+    mem = {}
+    with open('/proc/meminfo') as meminfo:
+        for line in meminfo:
+            key, val = line.split(':', 1)
+            mem[key] = int(val.split()[0]) / 1024.0
+    return mem['MemTotal'], mem.get('MemAvailable', mem.get('MemFree', 0))
+
+
+def read_disk_sectors():
+    """Return the sectors read and written by the whole disks of the host"""
+    read = written = 0
+    with open('/proc/diskstats') as diskstats:
+        for line in diskstats:
+            fields = line.split()
+            # Partitions are included in their disk's counters
+            if len(fields) < 10 or not os.path.isdir('/sys/block/' + fields[2]):
+                continue
+            read += int(fields[5])
+            written += int(fields[9])
+    return read, written
+
+
+def downsample(series, points=MAX_POINTS):
+    """Average consecutive samples of series so that at most points remain"""
+    if len(series) <= points:
+        return series
+    size = len(series) / float(points)
+    result = []
+    for i in range(points):
+        bucket = series[int(i * size):int((i + 1) * size)]
+        result.append([round(sum(col) / len(bucket), 2) for col in zip(*bucket)])
+    return result
+
+
+class TelemetrySampler(threading.Thread):
+    """Thread sampling host CPU utilization and frequency, memory and disk I/O.
+
+    Samples are taken every interval seconds between start() and stop(); report()
+    returns a downsampled series and summary statistics.
+    """
+
+    def __init__(self, interval=10.0):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.disk_read_mb = 0.0
+        self.disk_write_mb = 0.0
+        self.freq_min = float('inf')
+        self.freq_max = 0.0
+        self.mem_available_min = float('inf')
+        self._stop_event = threading.Event()
+        self._start_time = None
+
+    def _sample(self, previous):
+        """Take a sample, returning the counters used to compute the next one"""
+        now = time.monotonic()
+        busy, total = read_cpu_times()
+        read, written = read_disk_sectors()
+        mem_total, mem_available = read_memory()
+        freqs = read_cpu_freqs()
+
+        if previous is not None:
+            p_now, p_busy, p_total, p_read, p_written = previous
+            elapsed = max(now - p_now, 1e-6)
+            read_mb = (read - p_read) * SECTOR_BYTES / 1e6
+            write_mb = (written - p_written) * SECTOR_BYTES / 1e6
+            self.disk_read_mb += read_mb
+            self.disk_write_mb += write_mb
+            self.samples.append([
+                round(now - self._start_time, 2),
+                round(100.0 * (busy - p_busy) / max(total - p_total, 1), 2),
+                round(sum(freqs) / len(freqs), 1) if freqs else None,
+                round(mem_total - mem_available, 1),
+                round(read_mb / elapsed, 3),
+                round(write_mb / elapsed, 3)])
+            if freqs:
+                self.freq_min = min(self.freq_min, min(freqs))
+                self.freq_max = max(self.freq_max, max(freqs))
+        self.mem_available_min = min(self.mem_available_min, mem_available)
+        return now, busy, total, read, written
+
+    def run(self):
+        self._start_time = time.monotonic()
+        previous = None
+        try:
+            while True:
+                previous = self._sample(previous)
+                if self._stop_event.wait(self.interval):
+                    break
+            self._sample(previous)
+        except (OSError, ValueError, IndexError, KeyError) as err:
+            logger.warning("Telemetry sampling stopped: %s", err)
+
+    def stop(self):
+        """Stop sampling, after a last sample, and wait for the thread"""
+        self._stop_event.set()
+        self.join()
+
+    def report(self):
+        """Return the recorded series and summary statistics
+
+        Returns:
+            dict: 'interval', 'fields' and 'series' of samples (downsampled to at most
+            MAX_POINTS), and 'summary' statistics
+        """
+        report = {'interval': self.interval, 'fields': FIELDS,
+                  'series': downsample([[val if val is not None else 0 for val in sample]
+                                        for sample in self.samples])}
+        summary = {'samples': len(self.samples),
+                   'disk_read_mb': round(self.disk_read_mb, 3),
+                   'disk_write_mb': round(self.disk_write_mb, 3)}
+        if self.samples:
+            columns = list(zip(*self.samples))
+            cpu = columns[1]
+            mem = columns[3]
+            freqs = [val for val in columns[2] if val is not None]
+            summary['cpu_util_pct'] = {'avg': round(sum(cpu) / len(cpu), 2),
+                                       'max': max(cpu)}
+            summary['mem_used_mb'] = {'avg': round(sum(mem) / len(mem), 1), 'max': max(mem)}
+            summary['mem_available_min_mb'] = round(self.mem_available_min, 1)
+            if freqs:
+                summary['cpu_freq_mhz'] = {'avg': round(sum(freqs) / len(freqs), 1),
+                                           'min': round(self.freq_min, 1),
+                                           'max': round(self.freq_max, 1)}
+        report['summary'] = summary
+        return report
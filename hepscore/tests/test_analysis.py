@@ -0,0 +1,66 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import analysis
+import json
+import os
+import re
+import unittest
+
+head, _ = os.path.split(__file__)
+
+
+class Test_analysis(unittest.TestCase):
+
+    def test_copy_spread(self):
+        """The largest copy spread of the sub-scores of a run is reported."""
+        self.assertEqual(analysis.copy_spread({'min': 8, 'median': 10, 'max': 12, 'count': 4}),
+                         0.4)
+        self.assertEqual(analysis.copy_spread({'gen': {'min': 9, 'median': 10, 'max': 10},
+                                               'sim': {'min': 1, 'median': 2, 'max': 3}}), 1.0)
+        self.assertIsNone(analysis.copy_spread(None))
+        self.assertIsNone(analysis.copy_spread({'gen': {'median': 0, 'min': 0, 'max': 0}}))
+
+    def test_unperturbed_runs(self):
+        """The runs of a healthy host are not flagged, despite the copy spread of ATLAS."""
+        with open(os.path.join(head, "data/HEPscore_ci_allWLs/"
+                               "hepscore_result_expected_output.json")) as jfile:
+            output = json.load(jfile)
+        for workload, bench_conf in output['benchmarks'].items():
+            reports = {int(run[3:]): bench_conf[run]['report'] for run in bench_conf
+                       if re.match(r'^run[0-9]+$', run)}
+            scores = {i: sum(report['wl-scores'].values()) for i, report in reports.items()}
+            stats = {i: report['wl-stats'] for i, report in reports.items()}
+            self.assertEqual(analysis.analyse_runs(scores, stats)[1], {}, workload)
+        self.assertEqual(round(analysis.copy_spread(output['benchmarks']['atlas-gen-bmk']
+                                                    ['run1']['report']['wl-stats']), 4), 0.496)
+
+    def test_reject_flagged(self):
+        """Flagged runs are rejected, unless all runs are flagged."""
+        scores = {0: 1.0, 1: 1.01, 2: 0.6}
+        self.assertEqual(analysis.reject_flagged(scores, {2: ['outlier']}), {0: 1.0, 1: 1.01})
+        self.assertEqual(analysis.reject_flagged(scores, dict.fromkeys(scores, ['outlier'])),
+                         scores)
+
+    def test_outliers(self):
+        """Outlying run scores are found among three runs or more."""
+        self.assertEqual(analysis.outliers({0: 1.0, 1: 1.01, 2: 0.6}), [2])
+        self.assertEqual(analysis.outliers({0: 1.0, 1: 1.0, 2: 1.03}), [])
+        self.assertEqual(analysis.outliers({0: 1.0, 1: 0.5}), [])
+
+    def test_robust_interval(self):
+        """Intervals are centered on the median, and barely moved by an outlier."""
+        interval = analysis.robust_interval({0: 1.0, 1: 1.02, 2: 0.98})
+        self.assertEqual(interval['median'], 1.0)
+        self.assertEqual(interval['mad'], 0.02)
+        self.assertEqual(interval['interval'], [0.9579, 1.0421])
+        self.assertEqual(analysis.robust_interval({0: 1.0, 1: 1.02, 2: 0.5})['interval'],
+                         interval['interval'])
+        self.assertIsNone(analysis.robust_interval({0: 1.0})['interval'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import campaign
+from hepscore.hepscore import HEPscore
+import copy
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+class Test_campaign(unittest.TestCase):
+
+    def setUp(self):
+        self.campaigndir = tempfile.mkdtemp()
+        self.config = {'hepscore_benchmark':
+                       {'benchmarks': {'atlas-gen-bmk': {'version': 'v2.1',
+                                                         'ref_scores': {'gen': 100},
+                                                         'args': {'score': 150}},
+                                       'cms-reco-bmk': {'version': 'v2.1',
+                                                        'ref_scores': {'reco': 10}},
+                                       'lhcb-gen-sim-bmk': {'version': 'v2.1',
+                                                            'ref_scores': {'gensim': 10}}},
+                        'settings': {'name': 'test',
+                                     'registry': 'oras://gitlab-registry.cern.ch/hep-workloads',
+                                     'reference_machine': 'unknown',
+                                     'method': 'geometric_mean',
+                                     'repetitions': 1,
+                                     'container_exec': 'fake'}}}
+
+    def tearDown(self):
+        shutil.rmtree(self.campaigndir)
+
+    def test_campaign(self):
+        """Local worker processes run each queued benchmark once, and hosts are scored."""
+        campaign.create(self.campaigndir, self.config, ['node1', 'node2'])
+        with self.assertRaises(ValueError):
+            campaign.create(self.campaigndir, self.config, ['node1'])
+
+        workers = [multiprocessing.Process(target=campaign.work, args=(self.campaigndir, host))
+                   for host in ['node1', 'node1', 'node2']]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        camp = campaign.Campaign(self.campaigndir)
+        self.assertEqual(camp.status()['node1'], {'pending': 0, 'running': 0, 'done': 3})
+        for host in camp.hosts:
+            self.assertEqual(sorted(os.listdir(self.campaigndir + '/work/' + host)),
+                             camp.tasks())
+
+        reports = camp.collect()
+        self.assertEqual(reports['node1']['status'], 'success')
+        self.assertEqual(reports['node2']['score'], round(1.5 ** (1 / 3.0), 4))
+        self.assertEqual(reports['node2']['app_info']['campaign_host'], 'node2')
+        self.assertTrue(os.path.isfile(self.campaigndir + '/reports/node1.json'))
+
+        # Reports have the shape of the output of a local run
+        hs = HEPscore(copy.deepcopy(self.config), tempfile.mkdtemp(dir=self.campaigndir))
+        self.assertEqual(hs.run(), 0)
+        hs.gen_score()
+        for benchmark, bench_conf in hs.confobj['benchmarks'].items():
+            self.assertEqual(set(reports['node1']['benchmarks'][benchmark]), set(bench_conf))
+        self.assertEqual(reports['node1']['wl-scores'], hs.confobj['wl-scores'])
+
+    def test_exit(self):
+        """Benchmarks whose HEPscore run exits fail, and workers go on to the next ones."""
+        camp = campaign.create(self.campaigndir, self.config, ['node1'])
+        with patch.object(HEPscore, 'run', side_effect=SystemExit(1)):
+            self.assertEqual(campaign.work(self.campaigndir, 'node1'), 3)
+
+        self.assertEqual(camp.status()['node1'], {'pending': 0, 'running': 0, 'done': 3})
+        report = camp.host_report('node1')
+        self.assertEqual(report['status'], 'failed')
+        self.assertEqual(report['error'], 'atlas-gen-bmk')
+
+    def test_incomplete(self):
+        """Hosts with benchmarks left to run, or left running by a worker, are incomplete."""
+        camp = campaign.create(self.campaigndir, self.config, ['node1'])
+        self.assertEqual(camp.claim('node1'), '000_atlas-gen-bmk')
+        self.assertEqual(camp.status()['node1'], {'pending': 2, 'running': 1, 'done': 0})
+
+        report = camp.host_report('node1')
+        self.assertEqual(report['status'], 'incomplete')
+        self.assertEqual(len(report['missing']), 3)
+
+        self.assertEqual(camp.requeue(), 1)
+        self.assertEqual(camp.status()['node1']['pending'], 3)
+        with self.assertRaises(ValueError):
+            campaign.work(self.campaigndir, 'node2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -111,9 +111,10 @@ class testOutput(unittest.TestCase):
         hs = HEPscore(test_config, resDir)
 
         ignored_keys = ['app_info.hash', 'environment', 'settings.replay',
-                        'app_info.hepscore_ver', 'score_per_core', 'score']
+                        'app_info.hepscore_ver', 'app_info.phases', 'score_per_core', 'score']
 
         for benchmark in benchmarks:
+            ignored_keys.append("benchmarks." + benchmark + ".phases")
             ignored_keys.append("benchmarks." + benchmark + ".run0")
             ignored_keys.append("benchmarks." + benchmark + ".run1")
             ignored_keys.append("benchmarks." + benchmark + ".run2")
@@ -140,6 +141,67 @@ class testOutput(unittest.TestCase):
         os.remove(resDir + "/HEPscore2X.json")
         os.remove(resDir + "/HEPscore2X.log")
 
+    def test_parse_results_concurrent(self):
+        head, _ = os.path.split(__file__)
+
+        resDir = os.path.join(head, "data/HEPscore_ci_allWLs")
+
+        conf = os.path.normpath(os.path.join(head, "etc/hepscore_conf.yaml"))
+
+        with open(conf, 'r') as yam:
+            test_config = yaml.full_load(yam)
+
+        test_config['hepscore_benchmark']['settings']['parallelism'] = 3
+
+        hs = HEPscore(test_config, resDir)
+
+        with patch('hepscore.hepscore.available_cpus', return_value=list(range(6))):
+            self.assertEqual(hs.run(True), 0)
+        hs.gen_score()
+
+        expected_res = json.load(
+            open(resDir + "/hepscore_result_expected_output.json"))
+
+        self.assertEqual(hs.confobj['wl-scores'], expected_res['wl-scores'])
+        self.assertEqual(hs.confobj['score'], expected_res['score'])
+        self.assertEqual(list(hs.confobj['benchmarks']), list(expected_res['benchmarks']))
+
+        cpusets = set()
+        for bench_conf in hs.confobj['benchmarks'].values():
+            cpusets.add(bench_conf['run0']['cpuset'])
+        self.assertTrue(cpusets <= {'0-1', '2-3', '4-5'})
+
+        os.remove(resDir + "/HEPscore2X.log")
+
+    def test_parse_results_concurrent_repetitions(self):
+        head, _ = os.path.split(__file__)
+
+        resDir = os.path.join(head, "data/HEPscore_ci_allWLs")
+
+        conf = os.path.normpath(os.path.join(head, "etc/hepscore_conf.yaml"))
+
+        with open(conf, 'r') as yam:
+            test_config = yaml.full_load(yam)
+
+        test_config['hepscore_benchmark']['settings']['repetition_mode'] = 'concurrent'
+
+        hs = HEPscore(test_config, resDir)
+
+        with patch('hepscore.hepscore.available_cpus', return_value=list(range(6))):
+            self.assertEqual(hs.run(True), 0)
+
+        expected_res = json.load(
+            open(resDir + "/hepscore_result_expected_output.json"))
+
+        self.assertEqual(hs.confobj['wl-scores'], expected_res['wl-scores'])
+        for bench_conf in hs.confobj['benchmarks'].values():
+            self.assertEqual(bench_conf['interference']['batches'],
+                             [{'runs': ['run0', 'run1', 'run2'],
+                               'cpusets': ['0-1', '2-3', '4-5']}])
+            self.assertEqual(bench_conf['run2']['cpuset'], '4-5')
+
+        os.remove(resDir + "/HEPscore2X.log")
+
     def test_parse_corrupt_results(self):
         head, _ = os.path.split(__file__)
 
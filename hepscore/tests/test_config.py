@@ -0,0 +1,65 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import config
+from hepscore.hepscore import HEPscore
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+class Test_conf_index(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        config._conf_index = None
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        config._conf_index = None
+
+    def test_index_current(self):
+        """The shipped index describes the built-in configurations: regenerate it if not."""
+        with open(config.INDEX) as ifile:
+            self.assertEqual(json.load(ifile), config.build_index(),
+                             "run 'python -m hepscore.config' to update " + config.INDEX)
+
+    def test_config_hash(self):
+        """Indexed config hashes are those recorded by runs of the configuration."""
+        entry = config.conf_index()['hepscore_testkv']
+        hs = HEPscore(config.read_yaml(config.named_conf('hepscore_testkv')), "/tmp")
+        self.assertEqual(entry['config_hash'], config.config_hash(hs.confobj))
+        self.assertEqual(entry['workloads'], {'atlas-kv-bmk': 'ci2.0'})
+
+    def test_stale_index(self):
+        """Entries of modified configurations are recomputed, and filtered by arch."""
+        etc = self.tmpdir + '/etc'
+        shutil.copytree(config.config_path, etc)
+        with open(etc + '/hepscore_testkv.yaml') as yam:
+            conf = yam.read()
+        with open(etc + '/hepscore_testkv.yaml', 'w') as yam:
+            yam.write(conf.replace("  settings:\n", "  settings:\n    arch: [x86_64]\n"))
+
+        with patch.object(config, 'config_path', etc), \
+                patch.object(config, 'INDEX', etc + '/index.json'):
+            index = config.conf_index()
+            self.assertEqual(index['hepscore_testkv']['arch'], ['x86_64'])
+            self.assertNotEqual(index['hepscore_testkv']['file_hash'],
+                                config.conf_index()['hepscore-default']['file_hash'])
+            self.assertIn('hepscore_testkv', config.conf_index('x86_64'))
+            self.assertNotIn('hepscore_testkv', config.conf_index('aarch64'))
+            self.assertIn('hepscore-default', config.conf_index('aarch64'))
+
+            os.remove(etc + '/index.json')
+            config._conf_index = None
+            self.assertEqual(sorted(config.conf_index()), sorted(config.list_named_confs()))
+
+
+if __name__ == '__main__':
+    unittest.main()
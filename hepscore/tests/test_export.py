@@ -0,0 +1,79 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import export
+import copy
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+head, _ = os.path.split(__file__)
+
+
+class Test_export(unittest.TestCase):
+
+    def setUp(self):
+        self.output = os.path.normpath(os.path.join(
+            head, "data/HEPscore_ci_allWLs/hepscore_result_expected_output.json"))
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_collect(self):
+        """A record is collected for each run and sub-score, with its statistics."""
+        columns = export.collect([self.output], jobs=1)
+        records = list(zip(*(columns[name] for name, _ in export.COLUMNS)))
+
+        self.assertEqual(len(records), len(set(records)))
+        self.assertEqual(len(records), 33)
+        self.assertIn(('atlas-gen-bmk', 0, 'gen', 1044.6459, 384, 11.655, 17.1381, 16.3226,
+                       19.1571, 64, 1492), [record[6:] for record in records])
+        self.assertEqual(set(columns['path']), {self.output})
+
+    def test_run_records_stats(self):
+        """CMS workloads report the statistics of their sub-score as throughput_score."""
+        with open(self.output) as jfile:
+            obj = json.load(jfile)
+        records = [record[6:] for record in export.run_records(obj)]
+        self.assertIn(('cms-gen-sim-bmk', 0, 'gen-sim', 1.7114, 0.726, 0.1045, 0.1072,
+                       0.107, 0.1088, 16, 1032), records)
+        for record in records:
+            self.assertIsNotNone(record[6], record[:3])
+
+        # Counts are integers, even when reported as floats
+        obj = copy.deepcopy(obj)
+        obj['benchmarks']['atlas-gen-bmk']['run0']['report']['wl-stats']['count'] = 64.0
+        count = next(export.run_records(obj))[15]
+        self.assertEqual(count, 64)
+        self.assertIsInstance(count, int)
+
+    def test_csv_fallback(self):
+        """CSV is written when pyarrow is not installed."""
+        with patch.object(export, 'pyarrow', None):
+            outfile, count = export.export([self.output], self.tmpdir + '/runs.parquet', jobs=1)
+
+        self.assertEqual(outfile, self.tmpdir + '/runs.csv')
+        with open(outfile, newline='') as cfile:
+            rows = list(csv.reader(cfile))
+        self.assertEqual(rows[0], [name for name, _ in export.COLUMNS])
+        self.assertEqual(len(rows), count + 1)
+
+    @unittest.skipIf(export.pyarrow is None, "pyarrow not installed")
+    def test_arrow(self):
+        outfile, count = export.export([self.output], self.tmpdir + '/runs.arrow', jobs=1)
+        with export.pyarrow.memory_map(outfile) as source:
+            table = export.pyarrow.ipc.open_file(source).read_all()
+        self.assertEqual(table.num_rows, count)
+        self.assertEqual(table.column_names, [name for name, _ in export.COLUMNS])
+
+
+if __name__ == '__main__':
+    unittest.main()
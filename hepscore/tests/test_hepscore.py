@@ -4,9 +4,18 @@ See the COPYRIGHT file at the top-level directory
 of this distribution. For licensing information, see the COPYING file at
 the top-level directory of this distribution.
 """
-from hepscore.hepscore import HEPscore
+from hepscore.hepscore import HEPscore, partition_cpus, cpuset_string, read_yaml, LOG_TAIL_LINES
+from hepscore.runtime import probe_engine
+import asyncio
+import collections
+import io
 import json
 import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
 import unittest
 from unittest.mock import MagicMock, patch, mock_open
 import yaml
@@ -42,6 +51,19 @@ class test_arithmetic_methods(unittest.TestCase):
 
         self.assertEqual(json.dumps(test_yaml), '[{"B": 2}, {"C": 3}, {"A": 1}]')
         self.assertNotEqual(json.dumps(test_yaml), '[{"A": 1}, {"B": 2}, {"C": 3}]')
+
+    def test_partition_cpus(self):
+        """CPU sets are disjoint, contiguous and cover all CPUs."""
+        parts = partition_cpus(list(range(10)), 3)
+        self.assertEqual(parts, [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        self.assertEqual(partition_cpus([0, 1], 4), [[0], [1]])
+        self.assertEqual(partition_cpus([0, 1, 2], 1), [[0, 1, 2]])
+
+    def test_cpuset_string(self):
+        self.assertEqual(cpuset_string([0, 1, 2, 3]), "0-3")
+        self.assertEqual(cpuset_string([8, 0, 1, 5]), "0-1,5,8")
+        self.assertEqual(cpuset_string([4]), "4")
+
     # def test_median_tuple(self):
     
     # def test_weighted_geometric_mean(self):
@@ -104,5 +126,88 @@ class test_HEPscore(unittest.TestCase):
             HEPscore.write_output(fixture, 'json', 'out.json')
         self.assertEqual(context.exception.code, 2)
 
+    def test_capture_output(self):
+        """Container output is streamed to both logs, keeping a bounded tail."""
+        lines = ["line %d\n" % i for i in range(1000)] + ["caf\u00e9\n"]
+        fixture = MagicMock()
+        fixture.cec = 'docker'
+        fixture.log_flush_interval = 0
+        lfile = io.BytesIO()
+        run_log = io.StringIO()
+        tail = collections.deque(maxlen=LOG_TAIL_LINES)
+
+        loop = asyncio.new_event_loop()
+        stream = asyncio.StreamReader(loop=loop)
+        stream.feed_data(''.join(lines).encode('utf-8'))
+        stream.feed_eof()
+        loop.run_until_complete(
+            HEPscore._capture_output(fixture, stream, lfile, run_log, tail))
+        loop.close()
+
+        self.assertEqual(list(tail), lines[-LOG_TAIL_LINES:])
+        self.assertEqual(run_log.getvalue(), ''.join(lines))
+        self.assertEqual(lfile.getvalue().decode('utf-8'), ''.join(lines))
+
+    def test_exec_container_timeout(self):
+        """Containers exceeding their timeout are terminated."""
+        hs = HEPscore.__new__(HEPscore)
+        lfile = io.BytesIO()
+        tail = collections.deque(maxlen=LOG_TAIL_LINES)
+
+        command = [sys.executable, '-c', 'print("started", flush=True); import time; time.sleep(60)']
+        start = time.time()
+        returncode, timed_out = hs._run_async(
+            hs._exec_container(command, None, lfile, None, tail, timeout=1))
+        self.assertTrue(timed_out)
+        self.assertNotEqual(returncode, 0)
+        self.assertLess(time.time() - start, 30)
+        self.assertEqual(list(tail), ["started\n"])
+
+        command = [sys.executable, '-c', 'import sys; sys.exit(3)']
+        returncode, timed_out = hs._run_async(
+            hs._exec_container(command, None, lfile, None, tail, timeout=30))
+        self.assertFalse(timed_out)
+        self.assertEqual(returncode, 3)
+
+    def test_probe_engine_cache(self):
+        """Engine capabilities are probed once per binary, and cached on disk."""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        binary = tmpdir + "/singularity"
+        open(binary, 'w').close()
+        outputs = {'--version': ["apptainer version 1.1.9-1.el9"],
+                   'run': ["  -u, --userns", "      --unsquash   Convert SIF file"]}
+
+        with patch('hepscore.runtime.ENGINE_CACHE', tmpdir + "/cache/engines.json"), \
+                patch('hepscore.runtime.shutil.which', return_value=binary), \
+                patch('hepscore.runtime._engine_command',
+                      side_effect=lambda command: outputs[command[1]]) as mock_command:
+            caps = probe_engine('singularity')
+            self.assertEqual(caps, {'implementation': 'apptainer', 'version': '1.1.9-1.el9',
+                                    'unsquash': True})
+            self.assertEqual(mock_command.call_count, 2)
+            self.assertEqual(probe_engine('singularity'), caps)
+            self.assertEqual(mock_command.call_count, 2)
+
+            # A new binary is probed again
+            os.utime(binary, (0, 0))
+            probe_engine('singularity')
+            self.assertEqual(mock_command.call_count, 4)
+            with open(tmpdir + "/cache/engines.json") as jfile:
+                self.assertEqual(len(json.load(jfile)), 1)
+
+    def test_read_yaml_cache(self):
+        """Configuration files are parsed once, and their data copied."""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml') as yam:
+            yam.write("hepscore_benchmark:\n  benchmarks:\n    .%s: {}\n" % yam.name[-8:])
+            yam.flush()
+            with patch('hepscore.config.yaml.load', wraps=yaml.load) as mock_load:
+                first = read_yaml(yam.name)
+                first['hepscore_benchmark']['benchmarks'].clear()
+                second = read_yaml(yam.name)
+            mock_load.assert_called_once()
+            self.assertEqual(len(second['hepscore_benchmark']['benchmarks']), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
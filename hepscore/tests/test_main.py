@@ -6,7 +6,11 @@ the top-level directory of this distribution.
 """
 from hepscore import main
 import io
+import json
 import logging
+import os
+import subprocess
+import sys
 import unittest
 from unittest.mock import patch
 
@@ -38,6 +42,11 @@ class Test_parse_args(unittest.TestCase):
             main.main()
         self.assertEqual(cm.exception.code, 2)
 
+    def test_replay_resume_exclusive(self):
+        with self.assertRaises(SystemExit) as cm:
+            main.parse_args(["-r", "-R", "/tmp"])
+        self.assertEqual(cm.exception.code, 2)
+
     def test_return_type(self):
         res = main.parse_args(["/tmp"])
         self.assertIsInstance(res, dict)
@@ -57,12 +66,14 @@ class Test_main(unittest.TestCase):
                          'conffile': self.mock_bad_path,
                          'namedconf': '',
                          'replay': False,
+                         'resume': False,
                          'resultsdir': False,
                          'outfile': False,
                          'yaml': False,
                          'print': False,
                          'list': False,
-                         'verbose': False}
+                         'verbose': False,
+                         'profile': False}
         self.mock_parse.return_value = self.mock_args
 
     @patch.object(main, 'parse_args')
@@ -75,5 +86,33 @@ class Test_main(unittest.TestCase):
         self.assertEqual(exit_code.exception.code, 1)
 
 
+class Test_startup(unittest.TestCase):
+    """Guard the start-up time of the configuration commands."""
+
+    # Imported to run benchmarks or handle results, but not to list or print configurations
+    heavy_modules = ['hepscore.hepscore', 'hepscore.store', 'hepscore.campaign',
+                     'hepscore.export', 'hepscore.rescore', 'asyncio', 'multiprocessing',
+                     'concurrent.futures', 'sqlite3', 'cProfile']
+
+    def test_config_commands_imports(self):
+        script = '''
+import json, sys
+import hepscore.main
+for args in (['-l'], ['-p'], ['-V']):
+    sys.argv = ['hep-score'] + args
+    try:
+        hepscore.main.main()
+    except SystemExit:
+        pass
+print(json.dumps(sorted(sys.modules)))
+'''
+        head, _ = os.path.split(__file__)
+        proc = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE,
+                              cwd=os.path.join(head, '..', '..'), check=True)
+        modules = json.loads(proc.stdout.decode().splitlines()[-1])
+        self.assertIn('hepscore.config', modules)
+        self.assertEqual([mod for mod in self.heavy_modules if mod in modules], [])
+
+
 if __name__ == '__main__':
     unittest.main()
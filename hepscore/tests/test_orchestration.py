@@ -0,0 +1,204 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore.hepscore import HEPscore
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+class Test_orchestration(unittest.TestCase):
+    """Orchestration of a docker benchmark, with containers stubbed out."""
+
+    def setUp(self):
+        self.resultsdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.resultsdir)
+        self.config = {'hepscore_benchmark':
+                       {'benchmarks': {'atlas-gen-bmk': {'version': 'v2.1',
+                                                         'ref_scores': {'gen': 100}}},
+                        'settings': {'name': 'test',
+                                     'registry': 'docker://gitlab-registry.cern.ch/hep-workloads',
+                                     'reference_machine': 'unknown',
+                                     'method': 'geometric_mean',
+                                     'repetitions': 1,
+                                     'container_exec': 'docker',
+                                     'prefetch': False}}}
+        self.settings = self.config['hepscore_benchmark']['settings']
+
+    def hepscore(self):
+        """Return a HEPscore instance running a copy of the configuration"""
+        return HEPscore(copy.deepcopy(self.config), self.resultsdir)
+
+    def write_summary(self, run, score, stats=None):
+        """Write the summary of run of atlas-gen-bmk, reporting score"""
+        run_dir = self.resultsdir + "/atlas-gen-bmk/run" + str(run)
+        os.makedirs(run_dir, exist_ok=True)
+        report = {'wl-scores': {'gen': score}}
+        if stats is not None:
+            report['wl-stats'] = stats
+        with open(run_dir + "/atlas-gen-bmk_summary.json", 'w') as jfile:
+            json.dump({'app': {}, 'run_info': {}, 'report': report}, jfile)
+
+    @staticmethod
+    def fake_exec(scores):
+        """Return a stand-in for HEPscore._exec_container, reporting each of scores in turn"""
+        scores = iter(scores)
+
+        async def exec_container(command, env, lfile, run_log, tail, timeout=None,
+                                 timing=None):
+            run_dir = command[command.index('-v') + 1].split(':')[0]
+            with open(run_dir + "/atlas-gen-bmk_summary.json", 'w') as jfile:
+                json.dump({'app': {}, 'run_info': {},
+                           'report': {'wl-scores': {'gen': next(scores)}}}, jfile)
+            return 0, False
+        return exec_container
+
+    @patch('hepscore.hepscore.subprocess.Popen')
+    def test_pull_image(self, mock_popen):
+        """Images are fetched ahead of running, and the pull recorded."""
+        mock_popen.return_value.communicate.return_value = (b'', None)
+        mock_popen.return_value.returncode = 0
+        self.settings['prefetch'] = True
+
+        hs = self.hepscore()
+        hs._run_async(hs._await_image('atlas-gen-bmk'))
+        hs._puller.shutdown()
+
+        self.assertEqual(mock_popen.call_args[0][0],
+                         ['docker', 'pull',
+                          'gitlab-registry.cern.ch/hep-workloads/atlas-gen-bmk:v2.1'])
+        pull = hs.confobj['benchmarks']['atlas-gen-bmk']['image_pull']
+        self.assertEqual(pull['status'], 'success')
+        self.assertIn('duration', pull)
+
+    def test_pull_image_local(self):
+        """Images in dir:// registries are not fetched."""
+        self.settings['registry'] = 'dir:///cvmfs/unpacked.cern.ch'
+        del self.settings['container_exec']
+
+        hs = self.hepscore()
+        with patch('hepscore.hepscore.subprocess.Popen') as mock_popen:
+            self.assertEqual(hs._pull_image('atlas-gen-bmk')['status'], 'local')
+            mock_popen.assert_not_called()
+
+    def test_validate_conf_cache(self):
+        """Identical configurations are validated once."""
+        self.settings['name'] = 'test-validate-cache'
+        self.config['hepscore_benchmark']['benchmarks']['.cms-reco-bmk'] = {'version': 'v2.1'}
+
+        self.hepscore()
+        with patch('hepscore.hepscore.repetition_bounds') as mock_bounds:
+            hs = self.hepscore()
+            mock_bounds.assert_not_called()
+        self.assertEqual(list(hs.confobj['benchmarks']), ['atlas-gen-bmk'])
+
+    def test_proc_results_run_index(self):
+        """Scores are attributed to the runs whose directories they were found in."""
+        self.settings['repetitions'] = 3
+        # run0 failed, and left no summary
+        os.makedirs(self.resultsdir + "/atlas-gen-bmk/run0")
+        for run, score in ((1, 150.0), (2, 100.0), (10, 200.0)):
+            self.write_summary(run, score)
+
+        hs = self.hepscore()
+        self.assertEqual(hs._proc_results('atlas-gen-bmk'), 1.5)
+        bench_conf = hs.confobj['benchmarks']['atlas-gen-bmk']
+        self.assertNotIn('run0', bench_conf)
+        self.assertEqual(bench_conf['run10']['report']['wl-scores']['gen'], 200.0)
+        self.assertEqual(hs.confobj['wl-scores']['atlas-gen-bmk']['gen'], 150.0)
+
+    def test_proc_results_flagged_runs(self):
+        """Runs with spread copy scores or outlying scores are flagged, and rejected."""
+        self.settings['repetitions'] = 4
+        self.settings['reject_flagged_runs'] = True
+        for run, score, spread in ((0, 100.0, 0.1), (1, 101.0, 1.5), (2, 102.0, 0.1),
+                                   (3, 60.0, 0.1)):
+            self.write_summary(run, score, {'min': 1.0, 'median': 1.0, 'avg': 1.0,
+                                            'max': 1.0 + spread, 'count': 4})
+
+        hs = self.hepscore()
+        self.assertEqual(hs._proc_results('atlas-gen-bmk'), 1.01)
+        analysis = hs.confobj['benchmarks']['atlas-gen-bmk']['analysis']
+        self.assertEqual(analysis['flagged'], {'run1': ['copy_spread'], 'run3': ['outlier']})
+        self.assertEqual(analysis['rejected'], ['run1', 'run3'])
+        self.assertEqual(analysis['copy_spread']['run1'], 1.5)
+        self.assertEqual(analysis['median'], 1.01)
+        self.assertLess(analysis['interval'][0], 1.01)
+        self.assertGreater(analysis['interval'][1], 1.01)
+
+    @patch.object(HEPscore, 'get_version', return_value=['docker', '20.10'])
+    def test_resume(self, mock_version):
+        """Resuming a run only executes the runs missing valid results."""
+        self.settings['repetitions'] = 2
+        self.config['hepscore_benchmark']['options'] = {'resume': True}
+        # Interrupted during run1
+        self.write_summary(0, 200.0)
+        os.makedirs(self.resultsdir + "/atlas-gen-bmk/run1")
+
+        hs = self.hepscore()
+        with patch.object(hs, '_exec_container',
+                          side_effect=self.fake_exec([200.0])) as mock_exec:
+            self.assertEqual(hs.run(), 0)
+
+        mock_exec.assert_called_once()
+        self.assertTrue(os.path.isdir(self.resultsdir + "/atlas-gen-bmk/run2"))
+        self.assertEqual(hs.results, [2.0])
+        with open(self.resultsdir + "/test.progress.json") as jfile:
+            progress = json.load(jfile)
+        self.assertTrue(progress['benchmarks']['atlas-gen-bmk']['complete'])
+
+    def test_state_per_instance(self):
+        """The progress and scores of a run are not shared with other instances."""
+        first = self.hepscore()
+        first.confobj['app_info'] = {'config_hash': 'hash'}
+        first.confobj['environment'] = {}
+        first._journal('atlas-gen-bmk', True)
+        first.results.append(1.0)
+        first.weights.append(1.0)
+        first.history.append('/tmp/output.json')
+        second = self.hepscore()
+        self.assertEqual(second._progress, {})
+        self.assertEqual((second.results, second.weights, second.history), ([], [], []))
+
+    def test_preflight_fit(self):
+        """Fitting the image cache does not remove the images of the docker store."""
+        self.settings['preflight'] = 'fit'
+        self.settings['prefetch'] = True
+        shortfall = [{'paths': ['/var/lib/docker'], 'needed': 100, 'free': 10}]
+
+        hs = self.hepscore()
+        hs.confobj['app_info'] = {}
+        with patch('hepscore.hepscore.disk_shortfalls', return_value=shortfall):
+            self.assertFalse(hs._preflight())
+        self.assertEqual(hs.confobj['app_info']['preflight']['actions'], ['no_prefetch'])
+        self.assertFalse(hs.clean)
+        self.assertFalse(hs.prefetch)
+
+    @patch.object(HEPscore, 'get_version', return_value=['docker', '20.10'])
+    def test_adaptive_repetitions(self, mock_version):
+        """Runs stop once scores converge, and are extended up to the cap otherwise."""
+        self.settings.update({'repetitions': 3, 'min_repetitions': 2, 'max_repetitions': 4,
+                              'spread_threshold': 0.05})
+        for scores, expected in (([200, 202, 100], 2), ([100, 200, 150, 180, 120], 4)):
+            with self.subTest(scores=scores):
+                shutil.rmtree(self.resultsdir)
+                os.makedirs(self.resultsdir)
+                hs = self.hepscore()
+                with patch.object(hs, '_exec_container',
+                                  side_effect=self.fake_exec(scores)) as mock_exec:
+                    self.assertEqual(hs.run(), 0)
+
+                self.assertEqual(mock_exec.call_count, expected)
+                adaptive = hs.confobj['benchmarks']['atlas-gen-bmk']['adaptive']
+                self.assertEqual(adaptive['converged'], expected == 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import planner
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+head, _ = os.path.split(__file__)
+
+
+class Test_planner(unittest.TestCase):
+
+    def setUp(self):
+        self.output = os.path.normpath(os.path.join(
+            head, "data/HEPscore_ci_allWLs/hepscore_result_expected_output.json"))
+
+    def test_run_history(self):
+        history = planner.run_history([self.output])
+        self.assertEqual(len(history), 6)
+        self.assertEqual(history['atlas-gen-bmk'],
+                         [(1492.0, 'v2.1', 200), (1498.0, 'v2.1', 200), (1497.0, 'v2.1', 200)])
+
+    def test_estimate(self):
+        """Durations come from previous runs, scaled to the events, or default."""
+        history = planner.run_history([self.output])
+        bench_conf = {'version': 'v2.1', 'args': {'threads': 4, 'events': 100}}
+        est = planner.estimate(bench_conf, 'oras://reg', 3, 64, history['atlas-gen-bmk'])
+        self.assertEqual(est['cores'], 64)
+        self.assertEqual(est['memory_mb'], 64 * planner.MEMORY_MB_PER_THREAD)
+        self.assertEqual(est['duration'], round(3 * 1497 / 2))
+        self.assertEqual(est['duration_source'], 'history')
+
+        bench_conf['args']['copies'] = 2
+        bench_conf['repetition_mode'] = 'concurrent'
+        est = planner.estimate(bench_conf, 'dir:///cvmfs/unpacked', 3, 64)
+        self.assertEqual(est['cores'], 8)
+        self.assertEqual(est['image_cache_mb'], 0)
+        self.assertEqual(est['duration'], round(planner.DEFAULT_RUN_DURATION))
+        self.assertEqual(est['duration_source'], 'default')
+
+        # Args which are not integers, and runtimes without an image cache
+        bench_conf['args'] = {'threads': 'auto', 'copies': '$COPIES'}
+        est = planner.estimate(bench_conf, 'oras://reg', 3, 64, images=False)
+        self.assertEqual(est['cores'], 64)
+        self.assertEqual(est['image_cache_mb'], 0)
+
+    def test_peak_needs(self):
+        """Cleaning keeps only the images and outputs of the running benchmarks."""
+        estimates = {bmk: {'image_cache_mb': size, 'output_mb': 10 * size,
+                           'memory_mb': size, 'duration': size}
+                     for bmk, size in (('a', 1), ('b', 2), ('c', 3), ('d', 4))}
+        self.assertEqual(planner.peak_needs(estimates),
+                         {'image_cache_mb': 10, 'output_mb': 100, 'memory_mb': 4,
+                          'duration': 10})
+        self.assertEqual(planner.peak_needs(estimates, 2, clean_images=True, clean_files=True),
+                         {'image_cache_mb': 9, 'output_mb': 70, 'memory_mb': 7, 'duration': 5})
+        self.assertEqual(planner.peak_needs(estimates, 2, True, prefetch=False)['image_cache_mb'],
+                         7)
+        self.assertEqual(planner.makespan([3, 3, 2, 2, 2], 2), 7)
+
+    def test_disk_shortfalls(self):
+        """Needs on the same filesystem add up, including for paths not created yet."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with patch('hepscore.planner.shutil.disk_usage') as usage:
+                usage.return_value.free = 100 * 2 ** 20
+                needs = {tmpdir: 60, tmpdir + '/new/scache': 60}
+                self.assertEqual(planner.disk_shortfalls(needs),
+                                 [{'paths': [tmpdir, tmpdir + '/new/scache'],
+                                   'needed': 120, 'free': 100}])
+                self.assertEqual(planner.disk_shortfalls({tmpdir: 60}), [])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
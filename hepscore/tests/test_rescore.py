@@ -0,0 +1,69 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import rescore
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+
+head, _ = os.path.split(__file__)
+
+
+class Test_rescore(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(head, "etc/hepscore_conf.yaml")) as yam:
+            self.confobj = yaml.safe_load(yam)['hepscore_benchmark']
+        self.resdir = os.path.normpath(os.path.join(head, "data/HEPscore_ci_allWLs"))
+        with open(self.resdir + "/hepscore_result_expected_output.json") as jfile:
+            self.expected = json.load(jfile)
+
+    def test_rescore_matches_replay(self):
+        """Batch re-scoring gives the score computed when replaying a run."""
+        rows = rescore.rescore([os.path.join(head, "data")], self.confobj, jobs=2)
+
+        self.assertEqual([row['resultsdir'] for row in rows], [self.resdir])
+        self.assertEqual(rows[0]['score'], self.expected['score'])
+        self.assertEqual(rows[0]['status'], 'success')
+
+    def test_rescore_new_config(self):
+        """New scaling and reference scores are applied, and failures reported per directory."""
+        tmpdir = tempfile.mkdtemp()
+        shutil.copytree(self.resdir, tmpdir + "/host1")
+        shutil.copytree(self.resdir, tmpdir + "/host2")
+        shutil.rmtree(tmpdir + "/host2/cms-reco-bmk/run2")
+        self.confobj['settings']['scaling'] = 1
+        self.confobj['benchmarks']['atlas-gen-bmk']['ref_scores']['gen'] /= 2
+
+        rows = rescore.rescore([tmpdir], self.confobj)
+        shutil.rmtree(tmpdir)
+
+        self.assertEqual(len(rows), 2)
+        self.assertAlmostEqual(rows[0]['wl-scores']['atlas-gen-bmk'], 2 * 2.7204, places=3)
+        self.assertAlmostEqual(rows[0]['score'],
+                               self.expected['score'] / 355 * 2 ** (1 / 6.0), places=3)
+        self.assertEqual(rows[1]['status'], 'failed')
+        self.assertIsNone(rows[1]['wl-scores']['cms-reco-bmk'])
+        self.assertEqual(len(rescore.table(rows, self.confobj)), 3)
+
+    def test_rescore_reject_flagged(self):
+        """With reject_flagged_runs, the flagged runs are left out of the scores."""
+        self.confobj['settings']['reject_flagged_runs'] = True
+        rows = rescore.rescore([self.resdir], self.confobj)
+        self.assertEqual(rows[0]['score'], self.expected['score'])
+
+        # The copy scores of run1 of atlas-gen-bmk spread by 0.496
+        self.confobj['settings']['copy_spread_threshold'] = 0.47
+        rows = rescore.rescore([self.resdir], self.confobj)
+        self.assertAlmostEqual(rows[0]['wl-scores']['atlas-gen-bmk'],
+                               (1044.6459 + 1061.4133) / 2 / 384, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
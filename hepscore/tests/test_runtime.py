@@ -0,0 +1,271 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore.config import OUTPUT_MB_PER_CORE_RUN
+from hepscore.events import read_events
+from hepscore.hepscore import HEPscore
+from hepscore.runtime import RUNTIMES
+import copy
+import gzip
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+class Test_runtime_commands(unittest.TestCase):
+
+    def test_docker(self):
+        runtime = RUNTIMES['docker']()
+        self.assertEqual(runtime.run_command('reg/atlas-gen-bmk:v2.1', ['-W'], '/out/run0',
+                                             [0, 1, 2], {'gpu': True}),
+                         ['docker', 'run', '--rm', '--network=host', '-v', '/out/run0:/results',
+                          '--cpuset-cpus=0-2', '--gpus', 'all', 'reg/atlas-gen-bmk:v2.1', '-W'])
+        self.assertEqual(runtime.rm_command('img'), ['docker', 'rmi', '-f', 'img'])
+        self.assertEqual(RUNTIMES['podman']().pull_command('img', '/out/pull'),
+                         ['podman', 'pull', 'img'])
+        self.assertEqual(runtime.registry('docker', 'docker://reg/path', 'reg/path'), 'reg/path')
+
+    def test_singularity(self):
+        runtime = RUNTIMES['apptainer']()
+        with patch.object(runtime, 'unsquash', return_value=False):
+            self.assertEqual(runtime.run_command('oras://reg/atlas-gen-bmk:v2.1', ['-W'],
+                                                 '/out/run0', [4, 5]),
+                             ['taskset', '-c', '4-5', 'apptainer', 'run', '-i', '-c', '-e',
+                              '-B', '/out/run0:/results', '-B', '/tmp',
+                              'oras://reg/atlas-gen-bmk:v2.1', '-W'])
+        self.assertIsNone(runtime.pull_command('/cvmfs/unpacked/atlas-gen-bmk:v2.1', '/pull'))
+        self.assertEqual(runtime.registry('dir', 'dir:///cvmfs/unpacked', '/cvmfs/unpacked'),
+                         '/cvmfs/unpacked')
+
+
+class Test_fake_runtime(unittest.TestCase):
+
+    def setUp(self):
+        self.resultsdir = tempfile.mkdtemp()
+        self.config = {'hepscore_benchmark':
+                       {'benchmarks': {'atlas-gen-bmk': {'version': 'v2.1',
+                                                         'ref_scores': {'gen': 100},
+                                                         'args': {'score': 150, 'lines': 50}},
+                                       'cms-reco-bmk': {'version': 'v2.1',
+                                                        'ref_scores': {'reco': 10}}},
+                        'settings': {'name': 'test',
+                                     'registry': 'oras://gitlab-registry.cern.ch/hep-workloads',
+                                     'reference_machine': 'unknown',
+                                     'method': 'geometric_mean',
+                                     'repetitions': 2,
+                                     'container_exec': 'fake'}}}
+
+    def tearDown(self):
+        shutil.rmtree(self.resultsdir)
+
+    def test_run(self):
+        """Benchmarks run without a container engine."""
+        hs = HEPscore(self.config, self.resultsdir)
+        self.assertEqual(hs.run(), 0)
+        hs.gen_score()
+
+        self.assertEqual(hs.results, [1.5, 1.0])
+        self.assertEqual(hs.confobj['score'], round(1.5 ** 0.5, 4))
+        self.assertEqual(hs.confobj['environment']['fake_version'], hs.get_version()[1])
+        with open(self.resultsdir + "/atlas-gen-bmk/run1/fake_logs") as logfile:
+            self.assertEqual(len(logfile.readlines()), 50)
+
+    def test_phases(self):
+        """Phase times are recorded in the report, and notified to hooks."""
+        events = []
+        hs = HEPscore(self.config, self.resultsdir)
+        hs.add_hook(lambda event, info: events.append((event, info.get('phase'))))
+        self.assertEqual(hs.run(), 0)
+        hs.gen_score()
+        hs.write_output('json', self.resultsdir + '/out.json')
+
+        bench_conf = hs.confobj['benchmarks']['atlas-gen-bmk']
+        self.assertEqual(set(bench_conf['phases']), {'image_fetch', 'cleanup', 'results_parse'})
+        self.assertEqual(set(bench_conf['run1']['phases']), {'container_start', 'run'})
+        self.assertEqual(set(hs.confobj['app_info']['phases']),
+                         {'config', 'engine_probe', 'preflight', 'image_fetch',
+                          'container_start', 'run', 'cleanup', 'results_parse'})
+        phases = [event for event in events if event[1] is not None]
+        self.assertEqual(phases[0], ('phase_start', 'engine_probe'))
+        self.assertEqual(phases[-1], ('phase_end', 'output_write'))
+        self.assertEqual(phases.count(('phase_end', 'run')), 4)
+        self.assertEqual(events[-1], ('output', None))
+
+    def test_preflight(self):
+        """Runs short of disk space are reported, and aborted on request."""
+        shortfall = [{'paths': [self.resultsdir], 'needed': 100, 'free': 10}]
+        hs = HEPscore(copy.deepcopy(self.config), self.resultsdir)
+        with patch('hepscore.hepscore.disk_shortfalls', return_value=shortfall):
+            self.assertEqual(hs.run(), 0)
+        preflight = hs.confobj['app_info']['preflight']
+        self.assertEqual(set(preflight['benchmarks']), {'atlas-gen-bmk', 'cms-reco-bmk'})
+        # The fake runtime pulls no images
+        self.assertEqual(preflight['needs']['image_cache_mb'], 0)
+        atlas = preflight['benchmarks']['atlas-gen-bmk']
+        self.assertEqual(atlas['output_mb'], round(OUTPUT_MB_PER_CORE_RUN * atlas['cores'] * 2))
+        self.assertEqual(preflight['shortfalls'][0],
+                         "100 MB of disk space needed for %s, 10 MB free" % self.resultsdir)
+
+        self.config['hepscore_benchmark']['settings']['preflight'] = 'abort'
+        hs = HEPscore(self.config, tempfile.mkdtemp(dir=self.resultsdir))
+        with patch('hepscore.hepscore.disk_shortfalls', return_value=shortfall):
+            self.assertEqual(hs.run(), -1)
+        self.assertEqual(hs.confobj['error'], 'preflight')
+        self.assertNotIn('run0', hs.confobj['benchmarks']['atlas-gen-bmk'])
+
+    def test_compress_results(self):
+        """Logs are compressed, and run files archived, in the background."""
+        settings = self.config['hepscore_benchmark']['settings']
+        settings['compress_logs'] = True
+        with patch.multiple('hepscore.archive', zstandard=None, EXTENSION='.gz'):
+            hs = HEPscore(copy.deepcopy(self.config), self.resultsdir)
+            self.assertEqual(hs.run(), 0)
+
+            with gzip.open(self.resultsdir + "/atlas-gen-bmk/run1/fake_logs.gz") as logfile:
+                self.assertEqual(len(logfile.readlines()), 50)
+            self.assertFalse(os.path.exists(self.resultsdir + "/atlas-gen-bmk/run1/fake_logs"))
+            self.assertTrue(os.path.isfile(self.resultsdir + "/test.log.gz"))
+            self.assertIn('cleanup', hs.confobj['benchmarks']['atlas-gen-bmk']['phases'])
+
+            settings['archive_results'] = True
+            resultsdir = tempfile.mkdtemp(dir=self.resultsdir)
+            hs = HEPscore(self.config, resultsdir)
+            self.assertEqual(hs.run(), 0)
+
+        self.assertEqual(sorted(os.listdir(resultsdir + "/atlas-gen-bmk/run0")),
+                         ['atlas-gen-bmk_summary.json', 'run0.tar.gz'])
+        with tarfile.open(resultsdir + "/atlas-gen-bmk/run0/run0.tar.gz") as tar:
+            self.assertIn('fake_logs', tar.getnames())
+
+    def test_result_cache_resume(self):
+        """Cached results are restored after the failed runs of a resumed benchmark."""
+        settings = self.config['hepscore_benchmark']['settings']
+        settings['result_cache'] = True
+        settings['result_cache_dir'] = self.resultsdir + '/cache'
+        first = HEPscore(copy.deepcopy(self.config), tempfile.mkdtemp(dir=self.resultsdir))
+        self.assertEqual(first.run(), 0)
+
+        # Failed runs leave no summary behind
+        resultsdir = tempfile.mkdtemp(dir=self.resultsdir)
+        os.makedirs(resultsdir + '/cms-reco-bmk/run0')
+        os.makedirs(resultsdir + '/cms-reco-bmk/run1')
+        self.config['hepscore_benchmark']['options'] = {'resume': True}
+        hs = HEPscore(copy.deepcopy(self.config), resultsdir)
+        self.assertEqual(hs.run(), 0)
+        self.assertEqual(hs.results, first.results)
+        self.assertEqual(hs.confobj['benchmarks']['cms-reco-bmk']['result_cache']['runs'], 2)
+        self.assertTrue(os.path.isfile(resultsdir + '/cms-reco-bmk/run3/'
+                                       'cms-reco-bmk_summary.json'))
+
+        # Benchmarks whose cached results cannot be restored are run
+        hs = HEPscore(copy.deepcopy(self.config), tempfile.mkdtemp(dir=self.resultsdir))
+        with patch('hepscore.hepscore.ResultCache.restore', side_effect=OSError('gone')):
+            self.assertEqual(hs.run(), 0)
+        self.assertNotIn('result_cache', hs.confobj['app_info'])
+        self.assertEqual(hs.results, first.results)
+
+    def test_invalid_settings(self):
+        """Invalid settings, including blank ones, are configuration errors."""
+        invalid = {'log_flush_interval': (None, 'fast', -1),
+                   'spread_threshold': (None, 0),
+                   'telemetry_interval': ('fast', 0),
+                   'result_cache_ttl': (-1,),
+                   'copy_spread_threshold': (None,),
+                   'scaling': (None, 'fast')}
+        for key, values in invalid.items():
+            for value in values:
+                config = copy.deepcopy(self.config)
+                config['hepscore_benchmark']['settings'][key] = value
+                with self.subTest(key=key, value=value), \
+                        self.assertRaises(SystemExit) as context:
+                    HEPscore(config, self.resultsdir)
+                self.assertEqual(context.exception.code, 1)
+
+        self.config['hepscore_benchmark']['settings']['log_flush_interval'] = 0
+        HEPscore(self.config, self.resultsdir)
+
+    def test_run_failure(self):
+        """Failing runs are retried, and then fail the benchmark."""
+        self.config['hepscore_benchmark']['benchmarks']['cms-reco-bmk']['args'] = \
+            {'exit-code': 3}
+        self.config['hepscore_benchmark']['settings']['retries'] = 1
+        hs = HEPscore(self.config, self.resultsdir)
+        self.assertEqual(hs.run(), -1)
+
+        self.assertEqual(hs.confobj['error'], 'cms-reco-bmk')
+        self.assertIn('run1', hs.confobj['benchmarks']['cms-reco-bmk'])
+        self.assertNotIn('run2', hs.confobj['benchmarks']['cms-reco-bmk'])
+
+    def test_incremental_output(self):
+        """Events are logged as they happen, and a partial summary is kept."""
+        self.config['hepscore_benchmark']['benchmarks']['cms-reco-bmk']['args'] = \
+            {'exit-code': 3}
+        self.config['hepscore_benchmark']['settings']['retries'] = 1
+        self.config['hepscore_benchmark']['settings']['incremental_output'] = True
+        hs = HEPscore(self.config, self.resultsdir)
+        self.assertEqual(hs.run(), -1)
+
+        events = read_events(self.resultsdir + "/test.events.jsonl")
+        progress = [(e['event'], e.get('benchmark'), e.get('status'), e.get('score'))
+                    for e in events if not e['event'].startswith('phase')]
+        self.assertEqual(progress[0][0], 'start')
+        self.assertIn(('run_end', 'atlas-gen-bmk', 'success', 1.5), progress)
+        self.assertIn(('benchmark_end', 'atlas-gen-bmk', 'success', 1.5), progress)
+        self.assertIn(('retry', 'cms-reco-bmk', None, None), progress)
+        self.assertEqual(progress[-3:], [('run_end', 'cms-reco-bmk', 'failed', None),
+                                         ('benchmark_end', 'cms-reco-bmk', 'failed', -1),
+                                         ('end', None, 'failed', None)])
+
+        with open(self.resultsdir + "/test.partial.json") as jfile:
+            partial = json.load(jfile)
+        self.assertEqual(partial['status'], 'failed')
+        self.assertEqual(partial['wl-scores']['atlas-gen-bmk']['gen'], 150)
+
+    def test_result_cache(self):
+        """Results of identical workloads are reused while valid, and marked in the output."""
+        settings = self.config['hepscore_benchmark']['settings']
+        settings['result_cache'] = True
+        settings['result_cache_dir'] = self.resultsdir + '/cache'
+        settings['result_cache_ttl'] = 3600
+
+        def run(config):
+            resultsdir = tempfile.mkdtemp(dir=self.resultsdir)
+            hs = HEPscore(copy.deepcopy(config), resultsdir)
+            self.assertEqual(hs.run(), 0)
+            return hs
+
+        first = run(self.config)
+        self.assertNotIn('result_cache', first.confobj['app_info'])
+        entries = os.listdir(self.resultsdir + '/cache')
+        self.assertEqual(len(entries), 2)
+
+        second = run(self.config)
+        self.assertEqual(second.results, first.results)
+        self.assertEqual(second.confobj['app_info']['result_cache']['benchmarks'],
+                         ['atlas-gen-bmk', 'cms-reco-bmk'])
+        self.assertEqual(second.confobj['benchmarks']['cms-reco-bmk']['result_cache']['runs'], 2)
+
+        # Expired entries, and workloads with other args, are run again
+        for entry in entries:
+            meta_path = self.resultsdir + '/cache/' + entry + '/meta.json'
+            with open(meta_path) as mfile:
+                meta = json.load(mfile)
+            meta['created'] -= 7200
+            with open(meta_path, 'w') as mfile:
+                json.dump(meta, mfile)
+        self.config['hepscore_benchmark']['benchmarks']['cms-reco-bmk']['args'] = {'score': 50}
+        third = run(self.config)
+        self.assertNotIn('result_cache', third.confobj['app_info'])
+        self.assertEqual(third.results, [1.5, 0.5])
+        self.assertEqual(len(os.listdir(self.resultsdir + '/cache')), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import scoring
+import math
+import unittest
+from unittest.mock import patch
+
+
+class Test_scoring(unittest.TestCase):
+
+    def test_weighted_geometric_mean(self):
+        self.assertAlmostEqual(scoring.weighted_geometric_mean([2, 8]), 4.0)
+        self.assertAlmostEqual(scoring.weighted_geometric_mean([2, 8], [3, 1]), 2 ** 1.5)
+        self.assertEqual(scoring.weighted_geometric_mean([2, 8], [1]), 0)
+        self.assertEqual(scoring.weighted_geometric_mean([2, 8], [0, 0]), 0)
+        self.assertEqual(scoring.weighted_geometric_mean([0, 8]), 0)
+        self.assertTrue(math.isnan(scoring.weighted_geometric_mean([-1, 8])))
+
+    def test_weighted_geometric_mean_range(self):
+        """Means of many large or small scores neither overflow nor underflow."""
+        self.assertAlmostEqual(scoring.weighted_geometric_mean([1e200] * 10), 1e200,
+                               delta=1e188)
+        self.assertAlmostEqual(scoring.weighted_geometric_mean([1e-200] * 10), 1e-200,
+                               delta=1e-212)
+        self.assertAlmostEqual(scoring.weighted_geometric_mean([10.0, 0.1], [400, 400]), 1.0)
+
+    def test_weighted_geometric_means(self):
+        matrix = [[2, 8, 4], [1, None, 1], [1, 1, -1], [3, 3, 3]]
+        weights = [1, 1, 2]
+        expected = [scoring.weighted_geometric_mean(matrix[0], weights), math.nan,
+                    math.nan, 3.0]
+        for numpy in (scoring.numpy, None):
+            with patch.object(scoring, 'numpy', numpy):
+                means = scoring.weighted_geometric_means(matrix, weights)
+            for mean, value in zip(means, expected):
+                if math.isnan(value):
+                    self.assertTrue(math.isnan(mean))
+                else:
+                    self.assertAlmostEqual(mean, value)
+        with self.assertRaises(ValueError):
+            scoring.weighted_geometric_means([[1, 2], [1]])
+
+    def test_medians(self):
+        runs = [[3, 1, 2], [4, 1], [], [5]]
+        for numpy in (scoring.numpy, None):
+            with patch.object(scoring, 'numpy', numpy):
+                meds = scoring.medians(runs)
+            self.assertEqual(meds[:2], [2, 2.5])
+            self.assertTrue(math.isnan(meds[2]))
+            self.assertEqual(meds[3], 5)
+
+    def test_median_tuple(self):
+        self.assertEqual(scoring.median_tuple({0: 3, 1: 1, 2: 2}), (2, 2))
+        self.assertEqual(scoring.median_tuple({0: 4, 1: 1}), (2.5, (1, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore.store import ResultsStore, result_record
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+head, _ = os.path.split(__file__)
+
+
+class Test_ResultsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = ResultsStore(self.tmpdir + "/results.db")
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_ingest_outdir(self):
+        """Only HEPscore outputs are loaded, once, from output directory trees."""
+        datadir = os.path.normpath(os.path.join(head, 'data'))
+        self.assertEqual(self.db.ingest([datadir]), 3)
+        self.assertEqual(self.db.ingest([datadir]), 0)
+
+        dist = self.db.workload_distribution('atlas-gen-bmk')
+        self.assertEqual(dist['count'], 1)
+        self.assertAlmostEqual(dist['median'], 1044.6459)
+        self.assertIn('cms-reco-bmk', self.db.workloads())
+
+    def test_query_filters(self):
+        """Queries can be restricted by host and CPU model."""
+        for n, (host, cpu, score) in enumerate((('node1', 'cpu A', 10.0),
+                                                ('node2', 'cpu A', 12.0),
+                                                ('node3', 'cpu B', 20.0))):
+            output = {'benchmarks': {}, 'settings': {'name': 'test'},
+                      'app_info': {'config_hash': 'abc', 'hepscore_ver': '1.5'},
+                      'environment': {'host': host, 'cpu_model': cpu},
+                      'wl-scores': {'atlas-gen-bmk': {'gen': score, 'gen_ref': 100}},
+                      'score': score, 'status': 'success'}
+            with open(self.tmpdir + "/out" + str(n) + ".json", 'w') as jfile:
+                json.dump(output, jfile)
+        self.db.ingest([self.tmpdir])
+
+        self.assertEqual(self.db.workload_scores('atlas-gen-bmk'), [10.0, 12.0, 20.0])
+        dist = self.db.workload_distribution('atlas-gen-bmk', cpu_model='cpu A')
+        self.assertEqual(dist, {'count': 2, 'min': 10.0, 'median': 11.0,
+                                'max': 12.0, 'avg': 11.0})
+        self.assertEqual(self.db.workload_scores('atlas-gen-bmk', 'gen', host='node3'), [20.0])
+        with self.assertRaises(ValueError):
+            self.db.workload_scores('atlas-gen-bmk', path='x')
+
+    def test_result_record_host(self):
+        """The host is taken from the uname fields of older outputs."""
+        output = {'settings': {}, 'app_info': {},
+                  'environment': {'system': 'Linux node1 5.14.0 #1 SMP x86_64'}}
+        self.assertEqual(result_record(output)['host'], 'node1')
+
+
+if __name__ == '__main__':
+    unittest.main()
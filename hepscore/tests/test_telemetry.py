@@ -0,0 +1,40 @@
+"""
+Copyright 2019-2021 CERN.
+See the COPYRIGHT file at the top-level directory
+of this distribution. For licensing information, see the COPYING file at
+the top-level directory of this distribution.
+"""
+from hepscore import telemetry
+import time
+import unittest
+
+
+class Test_telemetry(unittest.TestCase):
+
+    def test_sampler(self):
+        """Samples are recorded while running, with a summary."""
+        sampler = telemetry.TelemetrySampler(0.05)
+        sampler.start()
+        time.sleep(0.3)
+        sampler.stop()
+        report = sampler.report()
+
+        self.assertFalse(sampler.is_alive())
+        self.assertEqual(report['fields'], telemetry.FIELDS)
+        self.assertGreaterEqual(report['summary']['samples'], 3)
+        self.assertEqual(len(report['series']), report['summary']['samples'])
+        for sample in report['series']:
+            self.assertEqual(len(sample), len(telemetry.FIELDS))
+            self.assertTrue(0 <= sample[1] <= 100)
+        self.assertGreater(report['summary']['mem_used_mb']['max'], 0)
+
+    def test_downsample(self):
+        series = [[t, t * 2] for t in range(1000)]
+        points = telemetry.downsample(series, 10)
+        self.assertEqual(len(points), 10)
+        self.assertEqual(points[0], [49.5, 99.0])
+        self.assertEqual(telemetry.downsample(series[:5], 10), series[:5])
+
+
+if __name__ == '__main__':
+    unittest.main()